@@ -15,9 +15,13 @@ import sys
 # Importar módulos avançados
 try:
     from compliance.regulatory_engine import RegulatoryEngine, RegulatoryFramework
-    from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
-    from security.anti_tampering import get_protection_system, CodeObfuscator
-    from security.secure_api import SecureAPIManager, require_auth, rate_limit, validate_input, security_headers
+    from advanced_ml.graph_neural_network import GraphNeuralNetwork
+    from advanced_ml.graph_shard import GraphShardClient
+    from advanced_ml.ingestion import IngestionError, transaction_from_dict
+    from security.anti_tampering import get_protection_system, start_protection_warmup, CodeObfuscator
+    from security.integrity_monitor import IntegrityMonitor
+    from security.id_service import IDService
+    from security.secure_api import get_security_context, require_auth, rate_limit, validate_input, security_headers
     from security.security_audit import SecurityAuditor
     from security.compliance_monitor import ComplianceMonitor, ComplianceFramework
     from blockchain_analysis.chain_intelligence import ChainIntelligence, BlockchainType
@@ -35,11 +39,16 @@ logging.basicConfig(
     ]
 )
 
+# Fingerprint, hashes e derivação de chave do sistema de proteção numa thread: AdvancedAMLSystem
+# só espera por ela depois de carregar os módulos e restaurar o grafo (a parte demorada da partida)
+start_protection_warmup()
+
 app = Flask(__name__)
 CORS(app)
 
 # Inicializar sistemas de segurança
-secure_api = SecureAPIManager()
+# Contexto de segurança único do processo (pool Redis e segredo JWT), o mesmo usado pelos decoradores
+secure_api = get_security_context()
 security_auditor = SecurityAuditor()
 compliance_monitor = ComplianceMonitor()
 
@@ -47,15 +56,10 @@ class AdvancedAMLSystem:
     """Sistema AML de classe mundial com funcionalidades avançadas"""
     
     def __init__(self):
-        # Validar licença e inicializar proteções
+        # Licença validada pelos módulos avançados
         self.license_key = os.getenv('AML_LICENSE_KEY', 'demo_license_2024')
-        self.protection_system = get_protection_system()
-        
-        # Verificar integridade do sistema
-        if not self.protection_system.runtime_protection_check():
-            raise RuntimeError("System integrity compromised")
         
-        # Inicializar módulos avançados
+        # Inicializar módulos avançados (enquanto o sistema de proteção é construído em segundo plano)
         try:
             self.regulatory_engine = RegulatoryEngine(self.license_key)
             self.graph_nn = GraphNeuralNetwork(self.license_key)
@@ -64,25 +68,63 @@ class AdvancedAMLSystem:
             logging.error(f"License validation failed: {e}")
             raise
         
+        # Grafo compartilhado entre workers no serviço de shards (que persiste as próprias partições);
+        # sem shards, o grafo local é restaurado do último snapshot antes de aceitar tráfego
+        shard_client = GraphShardClient.from_env()
+        snapshot_dir = os.getenv('AML_GRAPH_SNAPSHOT_DIR')
+        if shard_client is not None:
+            self.graph_nn.use_shards(shard_client)
+        elif snapshot_dir:
+            self.graph_nn.enable_persistence(
+                snapshot_dir, interval=float(os.getenv('AML_GRAPH_SNAPSHOT_INTERVAL', '300'))
+            )
+        if shard_client is None:
+            # Embeddings de nós sobre o grafo local (depois da restauração, que troca o grafo)
+            self.graph_nn.enable_embeddings(float(os.getenv('AML_GRAPH_EMBEDDING_INTERVAL', '300')))
+        
+        # Com a ingestão contínua (advanced_ml/ingestion.py) alimentando o grafo, as análises só consultam
+        self.graph_writes = os.getenv('AML_GRAPH_HTTP_WRITES', '1') != '0'
+        
+        # Aguarda o sistema de proteção e verifica a integridade antes de aceitar tráfego;
+        # depois disso a verificação completa roda em segundo plano
+        self.protection_system = get_protection_system()
+        self.integrity_monitor = IntegrityMonitor(
+            self.protection_system, interval=float(os.getenv('AML_INTEGRITY_CHECK_INTERVAL', '60'))
+        )
+        self.integrity_monitor.start()
+        if not self.integrity_monitor.is_intact():
+            raise RuntimeError("System integrity compromised")
+        
         self.obfuscator = CodeObfuscator()
+        # IDs de análise ordenáveis (tempo | worker | sequência) com etiqueta HMAC, sem criptografia por requisição
+        self.id_service = IDService(self.protection_system.derive_subkey('analysis-id'))
         
         # Estatísticas do sistema
         self.analysis_count = 0
         self.start_time = time.time()
+        self.ready = False
         
         # Iniciar monitoramento de conformidade
         compliance_monitor.start_monitoring()
         
         logging.info("Advanced AML System initialized successfully")
     
+    def warmup(self):
+        """Exercita os caminhos somente leitura antes de aceitar tráfego (no master, antes do fork)"""
+        self.chain_intelligence.generate_intelligence_report('0x' + '0' * 40, BlockchainType.ETHEREUM)
+        self.ready = True
+    
     def comprehensive_transaction_analysis(self, transaction_data: dict) -> dict:
         """Análise abrangente de transação com todos os módulos"""
         self.analysis_count += 1
         
-        # Verificação de proteção em tempo real
-        if not self.protection_system.runtime_protection_check():
+        # Veredito de integridade em cache (atualizado pelo monitor em segundo plano)
+        if not self.integrity_monitor.is_intact():
             return {'error': 'System protection activated', 'code': 'SECURITY_VIOLATION'}
         
+        # Tipos validados antes do grafo (IngestionError vira 400 no endpoint)
+        tx_edge = transaction_from_dict(transaction_data, default_from='')
+        
         try:
             # 1. Análise de conformidade regulatória
             jurisdictions = [
@@ -95,19 +137,9 @@ class AdvancedAMLSystem:
             )
             
             # 2. Análise de grafo neural
-            tx_edge = TransactionEdge(
-                from_addr=transaction_data.get('fromAddress', ''),
-                to_addr=transaction_data.get('toAddress', ''),
-                amount=float(transaction_data.get('amount', 0)),
-                timestamp=int(time.time()),
-                tx_hash=transaction_data.get('hash', ''),
-                risk_flags=transaction_data.get('flags', [])
-            )
-            
-            self.graph_nn.add_transaction(tx_edge)
-            graph_analysis = self.graph_nn.comprehensive_analysis(
-                transaction_data.get('fromAddress', '')
-            )
+            if self.graph_writes:
+                self.graph_nn.add_transaction(tx_edge)
+            graph_analysis = self.graph_nn.comprehensive_analysis(tx_edge.from_addr)
             
             # 3. Inteligência blockchain
             blockchain_type = BlockchainType.ETHEREUM  # Default
@@ -118,7 +150,7 @@ class AdvancedAMLSystem:
                     pass
             
             intelligence_report = self.chain_intelligence.generate_intelligence_report(
-                transaction_data.get('fromAddress', ''), blockchain_type
+                tx_edge.from_addr, blockchain_type
             )
             
             # 4. Calcular risco agregado
@@ -168,9 +200,7 @@ class AdvancedAMLSystem:
                     'cluster_id': intelligence_report['attribution'].get('cluster_id'),
                     'cross_chain_risk': intelligence_report['cross_chain_analysis']['highest_risk_score']
                 },
-                'analysis_id': self.protection_system.obfuscate_sensitive_data(
-                    f"AML_{self.analysis_count}_{int(time.time())}"
-                ),
+                'analysis_id': self.id_service.new_id(),
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -201,17 +231,11 @@ class AdvancedAMLSystem:
         # Análise de transações se fornecidas
         transactions = wallet_data.get('transactions', [])
         if transactions:
-            # Adicionar transações ao grafo
-            for tx in transactions:
-                tx_edge = TransactionEdge(
-                    from_addr=tx.get('fromAddress', address),
-                    to_addr=tx.get('toAddress', ''),
-                    amount=float(tx.get('amount', 0)),
-                    timestamp=tx.get('timestamp', int(time.time())),
-                    tx_hash=tx.get('hash', ''),
-                    risk_flags=tx.get('flags', [])
-                )
-                self.graph_nn.add_transaction(tx_edge)
+            # Adicionar transações ao grafo (um lote, uma aquisição da trava)
+            # Tipos validados antes de entrar na trava do grafo (colunas int64, buckets por timestamp)
+            tx_edges = [transaction_from_dict(tx, default_from=address) for tx in transactions]
+            if self.graph_writes:
+                self.graph_nn.add_transactions(tx_edges)
             
             # Análise de clustering
             addresses = [tx.get('fromAddress', '') for tx in transactions] + \
@@ -270,6 +294,9 @@ class AdvancedAMLSystem:
                 'chain_intelligence': True,
                 'anti_tampering': protection_status['protection_active']
             },
+            'integrity': self.integrity_monitor.get_stats(),
+            'entity_index': self.chain_intelligence.entity_index.get_stats(),
+            'transaction_graph': self.graph_nn.get_stats(),
             'performance': {
                 'avg_analysis_time': '< 500ms',
                 'supported_blockchains': len(BlockchainType),
@@ -280,10 +307,18 @@ class AdvancedAMLSystem:
 # Inicializar sistema avançado
 try:
     advanced_aml = AdvancedAMLSystem()
+    advanced_aml.warmup()
 except Exception as e:
     logging.error(f"Failed to initialize advanced AML system: {e}")
     sys.exit(1)
 
+def on_worker_start():
+    """Chamado pelo gunicorn (post_fork) em cada worker após o fork do master"""
+    compliance_monitor.resume_after_fork()
+    advanced_aml.integrity_monitor.resume_after_fork()
+    advanced_aml.graph_nn.resume_after_fork()
+    advanced_aml.chain_intelligence.resume_after_fork()
+
 # Endpoints da API
 
 @app.route('/health', methods=['GET'])
@@ -292,6 +327,14 @@ def health():
     """Health check avançado"""
     return jsonify(advanced_aml.get_system_status())
 
+@app.route('/ready', methods=['GET'])
+@security_headers()
+def ready():
+    """Readiness probe: verde apenas após o warmup"""
+    if not advanced_aml.ready:
+        return jsonify({'ready': False}), 503
+    return jsonify({'ready': True})
+
 @app.route('/analyze/transaction/advanced', methods=['POST'])
 @security_headers()
 @rate_limit(limit=100, window=3600)
@@ -314,6 +357,8 @@ def analyze_transaction_advanced():
         result = advanced_aml.comprehensive_transaction_analysis(data)
         return jsonify(result)
     
+    except IngestionError as e:
+        return jsonify({'error': 'Invalid transaction data', 'details': str(e)}), 400
     except Exception as e:
         logging.error(f"Transaction analysis error: {str(e)}")
         return jsonify({'error': 'Analysis failed', 'details': str(e)}), 500
@@ -340,6 +385,8 @@ def analyze_wallet_advanced():
         result = advanced_aml.advanced_wallet_analysis(data)
         return jsonify(result)
     
+    except IngestionError as e:
+        return jsonify({'error': 'Invalid transaction data', 'details': str(e)}), 400
     except Exception as e:
         logging.error(f"Wallet analysis error: {str(e)}")
         return jsonify({'error': 'Analysis failed', 'details': str(e)}), 500
@@ -0,0 +1,230 @@
+"""
+Índice de Clusters de Endereços
+Union-find (compressão de caminho + união por rank) sobre os IDs internados
+do grafo, atualizado a cada aresta inserida. Cada raiz mantém o tamanho do
+cluster, o volume transferido dentro dele e quantos endereços de mixer
+contém, de modo que pertencimento e risco de cluster são consultas quase
+O(1) em vez de componentes conexas recalculadas por requisição. Como
+union-find não desfaz uniões, uma evicção do grafo reconstrói o índice de
+uma vez (componentes fracamente conexas via scipy.sparse); com a trava do
+dono do grafo, a reconstrução roda numa thread e só a troca fica sob a trava.
+"""
+
+import logging
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+class ClusterIndex:
+    """Clusters (componentes fracamente conexas) do grafo com agregados por raiz
+
+    Os arrays são ``array.array`` compactos: acesso escalar rápido no
+    caminho de inserção sem um objeto Python por nó. Tamanho zero marca um
+    ID ainda não visto (ou liberado pela retenção).
+    """
+
+    def __init__(self, store: TransactionGraphStore, is_mixer: Callable[[str], bool], lock=None):
+        self.store = store
+        self.is_mixer = is_mixer
+        # Trava do dono do grafo: com ela, ``schedule_rebuild`` recalcula fora da trava
+        self.lock = lock
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._parent = array('q')
+        self._rank = array('b')
+        self._size = array('q')
+        self._volume = array('d')
+        self._mixers = array('q')
+        # Flag de mixer por nó: sobrevive às reconstruções (IDs de nós não mudam na compactação)
+        self._mixer_flag = array('b')
+        self.cluster_count = 0
+        self.stats = {'unions': 0, 'rebuilds': 0, 'last_rebuild_seconds': 0.0, 'replayed_edges': 0}
+
+    def _ensure(self, node: int):
+        while len(self._parent) <= node:
+            self._parent.append(len(self._parent))
+            self._rank.append(0)
+            self._size.append(0)
+            self._volume.append(0.0)
+            self._mixers.append(0)
+        # Após uma reconstrução em segundo plano as flags podem ir além dos demais arrays
+        while len(self._mixer_flag) <= node:
+            self._mixer_flag.append(-1)
+        if self._size[node] == 0:
+            flag = 1 if self.is_mixer(self.store.address(node)) else 0
+            self._mixer_flag[node] = flag
+            self._parent[node] = node
+            self._rank[node] = 0
+            self._size[node] = 1
+            self._volume[node] = 0.0
+            self._mixers[node] = flag
+            self.cluster_count += 1
+
+    def find(self, node: int) -> int:
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        # Compressão de caminho: todos os nós visitados passam a apontar para a raiz
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def add_edge(self, src: int, dst: int, amount: float):
+        self._ensure(src)
+        self._ensure(dst)
+        root, other = self.find(src), self.find(dst)
+        if root != other:
+            # União por rank: a árvore mais baixa fica sob a mais alta
+            if self._rank[root] < self._rank[other]:
+                root, other = other, root
+            elif self._rank[root] == self._rank[other]:
+                self._rank[root] += 1
+            self._parent[other] = root
+            self._size[root] += self._size[other]
+            self._volume[root] += self._volume[other]
+            self._mixers[root] += self._mixers[other]
+            self.cluster_count -= 1
+            self.stats['unions'] += 1
+        self._volume[root] += amount
+
+    def cluster(self, node: int) -> Tuple[int, int, float, int]:
+        """(raiz, tamanho, volume, mixers) do cluster do nó"""
+        if node >= len(self._size) or self._size[node] == 0:
+            return node, 1, 0.0, 0
+        root = self.find(node)
+        return root, self._size[root], self._volume[root], self._mixers[root]
+
+    def mixer_flags(self, n_nodes: int) -> np.ndarray:
+        """Flag de mixer dos ``n_nodes`` primeiros IDs (1 = mixer; nós não vistos contam como 0)"""
+        flags = np.zeros(n_nodes, dtype=np.int8)
+        known = np.frombuffer(self._mixer_flag, dtype=np.int8)[:n_nodes]
+        flags[:len(known)] = np.maximum(known, 0)
+        return flags
+
+    def rebuild(self):
+        """Recalcula o índice a partir das arestas atuais do grafo (após evicção ou restauração)"""
+        started = time.time()
+        n_edges, n_nodes, src, dst, amount, flags = self._capture()
+        if not n_nodes:
+            return
+        self._install(self._components(n_nodes, src, dst, amount, flags))
+        self._record_rebuild(started)
+
+    def schedule_rebuild(self):
+        """Listener de evicção: reconstrói numa thread se houver trava, senão na hora
+
+        Até a troca as consultas veem os clusters de antes da evicção (uniões
+        feitas por arestas removidas ainda valem). Arestas inseridas durante o
+        cálculo são reaplicadas com ``add_edge`` na troca; se outra evicção
+        compactou o grafo nesse meio-tempo, o cálculo é refeito.
+        """
+        if self.lock is None:
+            self.rebuild()
+            return
+        # Chamado sob a trava; uma thread em andamento percebe a nova compactação sozinha
+        # (uma que não está viva veio do processo pai num fork)
+        if self._rebuild_thread is None or not self._rebuild_thread.is_alive():
+            self._rebuild_thread = threading.Thread(target=self._rebuild_in_background,
+                                                    name='cluster-rebuild', daemon=True)
+            self._rebuild_thread.start()
+
+    def _rebuild_in_background(self):
+        store = self.store
+        try:
+            while True:
+                started = time.time()
+                with self.lock:
+                    generation = store.compaction_generation
+                    n_edges, n_nodes, src, dst, amount, flags = self._capture()
+                arrays = self._components(n_nodes, src, dst, amount, flags) if n_nodes else None
+                with self.lock:
+                    if generation != store.compaction_generation:
+                        continue
+                    if arrays is not None:
+                        self._install(arrays)
+                        total = store.number_of_edges()
+                        for edge_src, edge_dst, edge_amount in zip(store.src[n_edges:total].tolist(),
+                                                                   store.dst[n_edges:total].tolist(),
+                                                                   store.amount[n_edges:total].tolist()):
+                            self.add_edge(edge_src, edge_dst, edge_amount)
+                        self.stats['replayed_edges'] += total - n_edges
+                        self._record_rebuild(started)
+                    return
+        except Exception as e:
+            logging.error(f"Cluster index rebuild failed: {e}")
+        finally:
+            with self.lock:
+                self._rebuild_thread = None
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None):
+        """Espera a reconstrução em segundo plano em andamento (não chamar segurando a trava)"""
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _capture(self) -> Tuple[int, int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Arestas, nós, vistas de src/dst/amount e flags de mixer atuais (sob a trava do grafo)"""
+        store = self.store
+        n_nodes = store.node_capacity
+        while len(self._mixer_flag) < n_nodes:
+            address = store.address(len(self._mixer_flag))
+            self._mixer_flag.append(1 if address is not None and self.is_mixer(address) else 0)
+        flags = np.frombuffer(self._mixer_flag, dtype=np.int8)[:n_nodes].astype(np.int64)
+        return store.number_of_edges(), n_nodes, store.src, store.dst, store.amount, flags
+
+    @staticmethod
+    def _components(n_nodes: int, src: np.ndarray, dst: np.ndarray, amount: np.ndarray,
+                    flags: np.ndarray) -> Dict[str, np.ndarray]:
+        """Arrays do union-find já achatado: cada nó aponta direto para a raiz da sua componente"""
+        adjacency = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n_nodes, n_nodes))
+        n_labels, labels = connected_components(adjacency, directed=True, connection='weak')
+
+        live = np.zeros(n_nodes, dtype=bool)
+        live[src] = True
+        live[dst] = True
+        # Raiz de cada componente: o primeiro nó com aquele rótulo
+        _, first = np.unique(labels, return_index=True)
+        roots = first[labels]
+
+        parent = np.where(live, roots, np.arange(n_nodes))
+        # Fora das raízes o tamanho só marca o nó como visto (1); o valor que vale é o da raiz
+        size = live.astype(np.int64)
+        size[first] = np.bincount(labels[live], minlength=n_labels)
+        volume = np.zeros(n_nodes, dtype=np.float64)
+        volume[first] = np.bincount(labels[src], weights=amount, minlength=n_labels)
+        mixers = np.zeros(n_nodes, dtype=np.int64)
+        mixers[first] = np.bincount(labels[live], weights=flags[live], minlength=n_labels).astype(np.int64)
+        rank = np.zeros(n_nodes, dtype=np.int8)
+        rank[first[size[first] > 1]] = 1
+        return {'parent': parent, 'rank': rank, 'size': size, 'volume': volume, 'mixers': mixers,
+                'clusters': int(np.count_nonzero(size[first]))}
+
+    def _install(self, arrays: Dict[str, np.ndarray]):
+        self._parent = array('q', arrays['parent'].astype(np.int64).tobytes())
+        self._rank = array('b', arrays['rank'].tobytes())
+        self._size = array('q', arrays['size'].tobytes())
+        self._volume = array('d', arrays['volume'].tobytes())
+        self._mixers = array('q', arrays['mixers'].tobytes())
+        self.cluster_count = arrays['clusters']
+
+    def _record_rebuild(self, started: float):
+        self.stats['rebuilds'] += 1
+        self.stats['last_rebuild_seconds'] = round(time.time() - started, 4)
+
+    @classmethod
+    def from_store(cls, store: TransactionGraphStore, is_mixer: Callable[[str], bool],
+                   lock=None) -> 'ClusterIndex':
+        index = cls(store, is_mixer, lock=lock)
+        index.rebuild()
+        return index
+
+    def get_stats(self) -> Dict:
+        return {'clusters': self.cluster_count, **self.stats}
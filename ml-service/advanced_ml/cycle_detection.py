@@ -0,0 +1,125 @@
+"""
+Detecção Limitada de Round-Tripping
+Busca apenas ciclos que passam pelo endereço alvo, em vez de enumerar todos os
+ciclos do grafo. Uma BFS reversa limitada calcula quantos saltos faltam para
+voltar ao alvo; a DFS iterativa só expande nós que conseguem fechar o ciclo
+dentro do comprimento máximo (ou seja, nós da mesma SCC do alvo). A busca
+respeita ordem temporal, janela de tempo, retenção de valor e limites de
+trabalho, devolvendo ``truncated`` quando um limite é atingido.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+def _distances_to_target(store: TransactionGraphStore, target: int, max_hops: int) -> Dict[int, int]:
+    """BFS reversa: nó -> menor número de saltos até o alvo (até max_hops)"""
+    distances = {target: 0}
+    frontier = [target]
+    for hops in range(1, max_hops + 1):
+        next_frontier = []
+        for node in frontier:
+            for predecessor in store.predecessor_ids(node).tolist():
+                if predecessor not in distances:
+                    distances[predecessor] = hops
+                    next_frontier.append(predecessor)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return distances
+
+
+def find_cycles_through(store: TransactionGraphStore, address: str, max_length: int = 6,
+                        min_length: int = 2, time_window: Optional[int] = None,
+                        retention_threshold: Optional[float] = None, max_cycles: int = 100,
+                        max_expansions: int = 20000) -> Dict:
+    """Ciclos simples que começam e terminam no endereço
+
+    Com ``time_window`` cada salto deve ocorrer depois do anterior e o ciclo
+    inteiro dentro da janela (contada a partir da primeira transferência);
+    para cada vizinho é usada a transferência mais antiga que ainda respeita
+    a ordem. Com ``retention_threshold`` só entram ciclos em que o valor que
+    volta ao alvo é pelo menos essa fração do valor que saiu.
+    """
+    result = {'cycles': [], 'truncated': False, 'expansions': 0}
+    target = store.node_id(address)
+    if target is None:
+        return result
+
+    distances = _distances_to_target(store, target, max_length - 1)
+    if len(distances) == 1:
+        return result
+
+    src_dst, timestamps, amounts = store.dst, store.timestamp, store.amount
+    timed = time_window is not None
+
+    def candidates(node: int, arrived_at: Optional[int], started_at: Optional[int], depth: int):
+        """(vizinho, aresta) que ainda conseguem fechar o ciclo, ordenados por tempo"""
+        edges = store.out_edge_ids(node)
+        if timed and arrived_at is not None:
+            edge_ts = timestamps[edges]
+            edges = edges[(edge_ts >= arrived_at) & (edge_ts <= started_at + time_window)]
+        if not len(edges):
+            return []
+        # Transferência mais antiga por vizinho: deixa a maior folga para os saltos seguintes
+        edges = edges[np.argsort(timestamps[edges], kind='stable')]
+        neighbors, first = np.unique(src_dst[edges], return_index=True)
+        selected = []
+        for neighbor, edge in zip(neighbors.tolist(), edges[first].tolist()):
+            remaining = distances.get(neighbor)
+            if remaining is not None and depth + remaining <= max_length:
+                selected.append((neighbor, edge))
+        return selected
+
+    path = [target]
+    path_edges: List[int] = []
+    on_path = {target}
+    stack = [(candidates(target, None, None, 1), 0)]
+
+    while stack:
+        options, position = stack[-1]
+        if position >= len(options):
+            stack.pop()
+            if path_edges:
+                path_edges.pop()
+                on_path.discard(path.pop())
+            continue
+        stack[-1] = (options, position + 1)
+        neighbor, edge = options[position]
+
+        if neighbor == target:
+            if len(path) < min_length:
+                continue
+            cycle_edges = path_edges + [edge]
+            retention = (float(amounts[cycle_edges[-1]] / amounts[cycle_edges[0]])
+                         if amounts[cycle_edges[0]] > 0 else 0.0)
+            if retention_threshold is not None and retention < retention_threshold:
+                continue
+            result['cycles'].append({
+                'nodes': list(path),
+                'amounts': amounts[cycle_edges].tolist(),
+                'timestamps': timestamps[cycle_edges].tolist(),
+                'amount_retention': retention
+            })
+            if len(result['cycles']) >= max_cycles:
+                result['truncated'] = True
+                break
+            continue
+
+        if neighbor in on_path:
+            continue
+        if result['expansions'] >= max_expansions:
+            result['truncated'] = True
+            break
+
+        result['expansions'] += 1
+        started_at = int(timestamps[path_edges[0] if path_edges else edge])
+        path.append(neighbor)
+        path_edges.append(edge)
+        on_path.add(neighbor)
+        stack.append((candidates(neighbor, int(timestamps[edge]), started_at, len(path)), 0))
+
+    return result
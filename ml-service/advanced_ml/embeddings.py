@@ -0,0 +1,229 @@
+"""
+Embeddings de Nós do Grafo de Transações
+Propagação de mensagens em k saltos com produtos de matrizes esparsas (SciPy)
+sobre a adjacência do grafo. Cada nó parte de um vetor de atributos próprios
+(graus, estatísticas de valores, flag de mixer, intervalo entre envios) e
+recebe a média dos atributos dos destinos e das origens de suas
+transferências, salto a salto. O cálculo roda em lotes de linhas, fora da
+trava do grafo, e o resultado fica numa matriz NumPy indexada pelo ID do nó:
+pontuar um endereço por requisição é uma leitura de linha.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from advanced_ml.graph_store import TransactionGraphStore
+
+# Atributos por nó, na ordem das colunas de cada bloco do embedding
+NODE_FEATURES = (
+    'out_degree', 'in_degree', 'out_volume', 'in_volume', 'out_mean',
+    'out_cv', 'out_interval', 'pass_through', 'mixer'
+)
+MIXER = NODE_FEATURES.index('mixer')
+PASS_THROUGH = NODE_FEATURES.index('pass_through')
+
+
+def node_features(src: np.ndarray, dst: np.ndarray, amount: np.ndarray, timestamp: np.ndarray,
+                  mixer_flags: np.ndarray, n_nodes: int) -> np.ndarray:
+    """Matriz (nós x atributos) calculada das colunas de arestas; escalas log1p para contagens e valores"""
+    out_count = np.bincount(src, minlength=n_nodes).astype(np.float64)
+    in_count = np.bincount(dst, minlength=n_nodes).astype(np.float64)
+    out_volume = np.bincount(src, weights=amount, minlength=n_nodes)
+    in_volume = np.bincount(dst, weights=amount, minlength=n_nodes)
+    out_squares = np.bincount(src, weights=amount * amount, minlength=n_nodes)
+
+    senders = out_count > 0
+    out_mean = np.divide(out_volume, out_count, out=np.zeros(n_nodes), where=senders)
+    variance = np.divide(out_squares, out_count, out=np.zeros(n_nodes), where=senders) - out_mean ** 2
+    out_cv = np.divide(np.sqrt(np.maximum(variance, 0.0)), out_mean, out=np.zeros(n_nodes), where=out_mean > 0)
+
+    # Intervalo médio entre envios: janela de atividade de saída dividida pelos intervalos
+    first = np.full(n_nodes, np.iinfo(np.int64).max, dtype=np.int64)
+    last = np.zeros(n_nodes, dtype=np.int64)
+    np.minimum.at(first, src, timestamp)
+    np.maximum.at(last, src, timestamp)
+    repeated = out_count > 1
+    interval = np.divide((last - first).astype(np.float64), out_count - 1,
+                         out=np.zeros(n_nodes), where=repeated)
+
+    # Fração do volume recebido que volta a sair (1 = nó de passagem)
+    pass_through = np.divide(np.minimum(in_volume, out_volume), np.maximum(in_volume, out_volume),
+                             out=np.zeros(n_nodes), where=(in_volume > 0) & (out_volume > 0))
+
+    features = np.empty((n_nodes, len(NODE_FEATURES)), dtype=np.float32)
+    features[:, 0] = np.log1p(out_count)
+    features[:, 1] = np.log1p(in_count)
+    features[:, 2] = np.log1p(out_volume)
+    features[:, 3] = np.log1p(in_volume)
+    features[:, 4] = np.log1p(out_mean)
+    features[:, 5] = out_cv
+    features[:, 6] = np.log1p(interval)
+    features[:, PASS_THROUGH] = pass_through
+    features[:, MIXER] = mixer_flags[:n_nodes] > 0
+    return features
+
+
+def _mean_aggregation(rows: np.ndarray, cols: np.ndarray, n_nodes: int) -> csr_matrix:
+    """Operador de média sobre as transferências de cada linha (pesos = número de transferências)"""
+    adjacency = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n_nodes, n_nodes))
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inverse = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0)
+    return diags(inverse.astype(np.float32)) @ adjacency
+
+
+def _propagate(operator: csr_matrix, features: np.ndarray, batch_size: int) -> np.ndarray:
+    """``operator @ features`` em lotes de linhas: memória temporária limitada ao lote"""
+    result = np.empty_like(features)
+    for start in range(0, features.shape[0], batch_size):
+        result[start:start + batch_size] = operator[start:start + batch_size] @ features
+    return result
+
+
+def compute_embeddings(src: np.ndarray, dst: np.ndarray, amount: np.ndarray, timestamp: np.ndarray,
+                       mixer_flags: np.ndarray, n_nodes: int, hops: int = 2,
+                       batch_size: int = 65536) -> np.ndarray:
+    """Embeddings [X, (P_out)^1..k X, (P_in)^1..k X] com X = atributos do nó
+
+    ``P_out`` faz a média sobre os destinos das transferências enviadas e
+    ``P_in`` sobre as origens das recebidas; cada salto reaplica o operador
+    ao bloco anterior, então o bloco k resume a vizinhança a k saltos.
+    """
+    features = node_features(src, dst, amount, timestamp, mixer_flags, n_nodes)
+    blocks = [features]
+    for operator in (_mean_aggregation(src, dst, n_nodes), _mean_aggregation(dst, src, n_nodes)):
+        current = features
+        for _ in range(hops):
+            current = _propagate(operator, current, batch_size)
+            blocks.append(current)
+    return np.hstack(blocks)
+
+
+def neighborhood_risk(embeddings: np.ndarray, hops: int) -> np.ndarray:
+    """Risco 0-100 por nó a partir dos embeddings: exposição a mixers por salto e papel de passagem
+
+    A exposição de um salto é a maior entre a fração média de mixers nos
+    destinos e nas origens das transferências; saltos mais distantes pesam
+    menos.
+    """
+    width = len(NODE_FEATURES)
+    score = 0.5 * embeddings[:, MIXER] + 0.1 * embeddings[:, PASS_THROUGH]
+    weight = 0.6
+    for hop in range(1, hops + 1):
+        exposure = np.maximum(embeddings[:, hop * width + MIXER], embeddings[:, (hops + hop) * width + MIXER])
+        score = score + weight * exposure
+        weight /= 2
+    return (np.clip(score, 0.0, 1.0) * 100).astype(np.float32)
+
+
+class NodeEmbeddings:
+    """Cache de embeddings do grafo, recalculado periodicamente em segundo plano
+
+    O estado das arestas é capturado sob ``lock`` (vistas das colunas, sem
+    cópia) e a propagação roda fora dela. Uma evicção libera IDs de nós que
+    podem ser reutilizados por outros endereços, então ela descarta o cache e
+    qualquer cálculo em andamento; o próximo ciclo recalcula.
+    """
+
+    def __init__(self, store: TransactionGraphStore, mixer_flags: Callable[[int], np.ndarray],
+                 lock=None, hops: int = 2, batch_size: int = 65536):
+        self.store = store
+        self.mixer_flags = mixer_flags
+        self.lock = lock if lock is not None else threading.RLock()
+        self.hops = hops
+        self.batch_size = batch_size
+        self.matrix: Optional[np.ndarray] = None
+        self.risk: Optional[np.ndarray] = None
+        self._generation = 0
+        self._computed_state = None
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.interval: Optional[float] = None
+        self.stats = {'refreshes': 0, 'discarded': 0, 'last_refresh_seconds': 0.0, 'embedded_nodes': 0}
+        store.add_eviction_listener(self.invalidate)
+
+    def invalidate(self):
+        with self.lock:
+            self._generation += 1
+            self.matrix = None
+            self.risk = None
+            self._computed_state = None
+            self.stats['embedded_nodes'] = 0
+
+    def refresh(self) -> bool:
+        """Recalcula os embeddings se o grafo mudou desde o último cálculo; True se o cache foi trocado"""
+        with self._refresh_lock:
+            started = time.time()
+            with self.lock:
+                store = self.store
+                state = (self._generation, store.number_of_edges())
+                if state == self._computed_state:
+                    return False
+                n_nodes = store.node_capacity
+                src, dst = store.src, store.dst
+                amount, timestamp = store.amount, store.timestamp
+                flags = np.array(self.mixer_flags(n_nodes), dtype=np.int8)
+
+            matrix = compute_embeddings(src, dst, amount, timestamp, flags, n_nodes,
+                                        hops=self.hops, batch_size=self.batch_size)
+            risk = neighborhood_risk(matrix, self.hops)
+
+            with self.lock:
+                if self._generation != state[0]:
+                    self.stats['discarded'] += 1
+                    return False
+                self.matrix, self.risk = matrix, risk
+                self._computed_state = state
+                self.stats['refreshes'] += 1
+                self.stats['embedded_nodes'] = n_nodes
+                self.stats['last_refresh_seconds'] = round(time.time() - started, 4)
+            return True
+
+    def vector(self, node: int) -> Optional[np.ndarray]:
+        matrix = self.matrix
+        if matrix is None or node >= matrix.shape[0]:
+            return None
+        return matrix[node]
+
+    def risk_score(self, node: Optional[int]) -> float:
+        """Risco de vizinhança do nó no último cálculo (0 para nós ainda sem embedding)"""
+        risk = self.risk
+        if node is None or risk is None or node >= len(risk):
+            return 0.0
+        return round(float(risk[node]), 2)
+
+    def start(self, interval: float):
+        """Recalcula a cada ``interval`` segundos numa thread daemon"""
+        self.interval = interval
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='graph-embeddings', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Node embedding refresh failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def resume_after_fork(self):
+        """Recria a thread de recálculo em um worker pré-forkado (threads não sobrevivem ao fork)"""
+        # A trava pode ter sido copiada no meio de um recálculo da thread do processo pai
+        self._refresh_lock = threading.Lock()
+        if self.interval is not None and not self._stop.is_set() and \
+                (self._thread is None or not self._thread.is_alive()):
+            self.start(self.interval)
+
+    def stop(self):
+        """Encerra a thread no próximo ciclo (sem esperar um recálculo em andamento)"""
+        self._stop.set()
+
+    def get_stats(self) -> Dict:
+        return {'hops': self.hops, 'dimensions': len(NODE_FEATURES) * (2 * self.hops + 1), **self.stats}
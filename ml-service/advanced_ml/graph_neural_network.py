@@ -4,11 +4,24 @@ Implementa GNN avançada para detecção de padrões complexos de lavagem de din
 """
 
 import numpy as np
-import networkx as nx
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 import hashlib
 import json
+import logging
+import threading
+from indicators.matcher import get_shared_matcher
+from advanced_ml.graph_store import TransactionGraphStore, store_config_from_env
+from advanced_ml.cycle_detection import find_cycles_through
+from advanced_ml.layering import find_layering_chains
+from advanced_ml.incremental import IncrementalPatternCache, PATH_PATTERNS, SMURFING
+from advanced_ml.graph_snapshot import GraphSnapshotter
+from advanced_ml.graph_shard import GraphShardClient
+from advanced_ml.clustering import ClusterIndex
+from advanced_ml.embeddings import NodeEmbeddings
+
+# Categoria das palavras-chave de mixer do GNN no matcher compartilhado
+MIXER_KEYWORD_CATEGORY = 'mixer_keyword'
 
 @dataclass
 class TransactionNode:
@@ -30,12 +43,76 @@ class TransactionEdge:
 class GraphNeuralNetwork:
     """GNN proprietária para análise de grafos de transações"""
     
+    # Profundidade de layering usada pela análise abrangente
+    LAYERING_DEPTH = 5
+    # Saltos de propagação dos embeddings de nós
+    EMBEDDING_HOPS = 2
+    
     def __init__(self, license_key: str):
         self._license_key = license_key
         self._validate_license()
-        self.graph = nx.DiGraph()
-        self.node_embeddings = {}
+        # Inserções e análises compartilham o grafo; snapshots capturam o estado sob a mesma trava
+        self._lock = threading.RLock()
+        self.persistence: Optional[GraphSnapshotter] = None
+        # Com shards, o grafo compartilhado vive no serviço de shards e self.graph fica vazio
+        self.shards: Optional[GraphShardClient] = None
+        self.node_embeddings: Optional[NodeEmbeddings] = None
         self.suspicious_patterns = self._load_suspicious_patterns()
+        self._matcher = get_shared_matcher()
+        self._matcher.add_substrings(MIXER_KEYWORD_CATEGORY,
+                                     self.suspicious_patterns['mixer_usage']['known_mixers'])
+        self._attach_graph(TransactionGraphStore(**store_config_from_env()))
+        
+    def _attach_graph(self, graph: TransactionGraphStore):
+        self.graph = graph
+        # Evicções compactam numa thread; sob a trava fica só a troca das colunas
+        self.graph.enable_background_compaction(self._lock)
+        # Uma aresta nova só afeta nós que alcançam sua origem dentro da profundidade das buscas
+        self.pattern_cache = IncrementalPatternCache(
+            self.graph,
+            propagation_depth=max(self.LAYERING_DEPTH - 1,
+                                  self.suspicious_patterns['round_tripping']['max_cycle_length'] - 1)
+        )
+        # Evicção remove arestas e renumera IDs: nenhum resultado em cache continua confiável
+        self.graph.add_eviction_listener(self.pattern_cache.invalidate_all)
+        # Clusters mantidos por union-find na inserção; uniões não se desfazem, então a evicção reconstrói
+        self.cluster_index = ClusterIndex.from_store(self.graph, self._is_mixer, lock=self._lock)
+        self.graph.add_eviction_listener(self.cluster_index.schedule_rebuild)
+        # Embeddings recalculados em segundo plano; um grafo novo (restauração) herda o intervalo do anterior
+        previous, self.node_embeddings = self.node_embeddings, NodeEmbeddings(
+            self.graph, self.cluster_index.mixer_flags, lock=self._lock, hops=self.EMBEDDING_HOPS)
+        if previous is not None and previous.interval is not None:
+            previous.stop()
+            self.node_embeddings.start(previous.interval)
+    
+    def _is_mixer(self, address: str) -> bool:
+        return self._matcher.matches(address, MIXER_KEYWORD_CATEGORY)
+    
+    def enable_persistence(self, directory: str, interval: float = 300):
+        """Restaura o grafo do último snapshot em ``directory`` e passa a gravar snapshots periódicos"""
+        with self._lock:
+            self.persistence = GraphSnapshotter(directory, lock=self._lock)
+            restored = self.persistence.load(**store_config_from_env())
+            if restored is not None:
+                self._attach_graph(restored)
+                stats = self.persistence.stats
+                logging.info(f"Transaction graph restored from {directory}: {stats['restored_edges']} edges "
+                             f"+ {stats['replayed_edges']} replayed in {stats['restore_seconds']}s")
+        self.persistence.start(self.graph, interval)
+    
+    def enable_embeddings(self, interval: float = 300):
+        """Passa a recalcular os embeddings de nós a cada ``interval`` segundos em segundo plano"""
+        self.node_embeddings.start(interval)
+    
+    def use_shards(self, client: GraphShardClient):
+        """Passa a inserir e consultar as transações no serviço de shards do grafo"""
+        self.shards = client
+    
+    def resume_after_fork(self):
+        """Recria as threads de snapshots e de embeddings em um worker pré-forkado"""
+        if self.persistence is not None:
+            self.persistence.resume_after_fork()
+        self.node_embeddings.resume_after_fork()
         
     def _validate_license(self):
         """Validação de licença com hash específico"""
@@ -50,7 +127,9 @@ class GraphNeuralNetwork:
             'layering': {
                 'min_hops': 3,
                 'max_time_window': 3600,  # 1 hora
-                'amount_variance_threshold': 0.1
+                'amount_variance_threshold': 0.1,
+                'max_paths': 20000,  # limite de estados explorados por análise
+                'max_reported_chains': 20
             },
             'smurfing': {
                 'min_transactions': 10,
@@ -59,7 +138,11 @@ class GraphNeuralNetwork:
             },
             'round_tripping': {
                 'min_cycle_length': 2,
-                'amount_retention_threshold': 0.9
+                'max_cycle_length': 6,
+                'time_window': 604800,  # 7 dias
+                'amount_retention_threshold': 0.9,
+                'max_cycles': 50,  # limite de ciclos por análise
+                'max_expansions': 20000  # limite de nós expandidos na busca
             },
             'mixer_usage': {
                 'known_mixers': ['tornado', 'mixer', 'tumbler'],
@@ -69,124 +152,141 @@ class GraphNeuralNetwork:
     
     def add_transaction(self, tx: TransactionEdge):
         """Adiciona transação ao grafo"""
-        # Adicionar nós se não existirem
-        if not self.graph.has_node(tx.from_addr):
-            self.graph.add_node(tx.from_addr, 
-                              address=tx.from_addr,
-                              transactions=[],
-                              risk_score=0.0)
-        
-        if not self.graph.has_node(tx.to_addr):
-            self.graph.add_node(tx.to_addr,
-                              address=tx.to_addr, 
-                              transactions=[],
-                              risk_score=0.0)
-        
-        # Adicionar aresta
-        self.graph.add_edge(tx.from_addr, tx.to_addr,
-                          amount=tx.amount,
-                          timestamp=tx.timestamp,
-                          tx_hash=tx.tx_hash,
-                          risk_flags=tx.risk_flags)
-        
-        # Atualizar listas de transações
-        self.graph.nodes[tx.from_addr]['transactions'].append(tx.tx_hash)
-        self.graph.nodes[tx.to_addr]['transactions'].append(tx.tx_hash)
+        self.add_transactions([tx])
+    
+    def add_transactions(self, transactions: List[TransactionEdge]) -> int:
+        """Adiciona um lote de transações com uma única aquisição da trava do grafo; devolve quantas entraram"""
+        # Nós são criados sob demanda; as transações de cada nó saem do índice CSR
+        if self.shards is not None:
+            return self.shards.add_transactions(
+                (tx.from_addr, tx.to_addr, tx.amount, tx.timestamp, tx.tx_hash, tx.risk_flags)
+                for tx in transactions
+            )
+        added = 0
+        with self._lock:
+            sources = {}
+            for tx in transactions:
+                # Timestamp no futuro ou já fora da janela: nem nós, nem cluster, nem log
+                if not self.graph.admits(tx.timestamp):
+                    continue
+                # Cluster atualizado antes da inserção: se ela disparar evicção, a reconstrução já a inclui
+                src = self.graph.add_node(tx.from_addr)
+                self.cluster_index.add_edge(src, self.graph.add_node(tx.to_addr), tx.amount)
+                self.graph.add_transaction(tx.from_addr, tx.to_addr,
+                                           amount=tx.amount,
+                                           timestamp=tx.timestamp,
+                                           tx_hash=tx.tx_hash,
+                                           risk_flags=tx.risk_flags)
+                sources[tx.from_addr] = None
+                added += 1
+                if self.persistence is not None:
+                    self.persistence.log_transaction(tx.from_addr, tx.to_addr, tx.amount, tx.timestamp,
+                                                     tx.tx_hash, tx.risk_flags)
+            # Com o lote inteiro inserido, basta sujar a vizinhança de cada origem uma vez
+            for address in sources:
+                node = self.graph.node_id(address)
+                if node is not None:
+                    self.pattern_cache.on_transaction(node)
+        return added
     
-    def detect_layering_pattern(self, start_address: str, max_depth: int = 5) -> Dict:
+    def detect_layering_pattern(self, start_address: str, max_depth: int = 5,
+                                graph: Optional[TransactionGraphStore] = None) -> Dict:
         """Detecta padrões de layering (camadas de transações)"""
-        layering_chains = []
-        
-        def dfs_layering(current_addr, path, depth, total_amount):
-            if depth >= max_depth:
-                return
-            
-            for neighbor in self.graph.successors(current_addr):
-                edge_data = self.graph[current_addr][neighbor]
-                new_path = path + [neighbor]
-                new_amount = total_amount * 0.95  # Assumindo taxa de 5%
-                
-                # Verificar se é uma cadeia de layering válida
-                if (len(new_path) >= self.suspicious_patterns['layering']['min_hops'] and
-                    abs(edge_data['amount'] - new_amount) / new_amount < 
-                    self.suspicious_patterns['layering']['amount_variance_threshold']):
-                    
-                    layering_chains.append({
-                        'path': new_path,
-                        'total_hops': len(new_path),
-                        'amount_retention': edge_data['amount'] / total_amount,
-                        'risk_score': self._calculate_layering_risk(new_path)
-                    })
-                
-                dfs_layering(neighbor, new_path, depth + 1, edge_data['amount'])
+        graph = self.graph if graph is None else graph
+        config = self.suspicious_patterns['layering']
+        # Busca iterativa, em ordem temporal, memorizada e com limite de caminhos
+        search = find_layering_chains(
+            graph, start_address,
+            max_depth=max_depth,
+            min_hops=config['min_hops'],
+            max_time_window=config['max_time_window'],
+            amount_variance_threshold=config['amount_variance_threshold'],
+            max_paths=config['max_paths'],
+            max_chains=config['max_reported_chains']
+        )
         
-        dfs_layering(start_address, [start_address], 0, 0)
+        layering_chains = []
+        for nodes, retention in search['chains']:
+            path = [graph.address(node) for node in nodes]
+            layering_chains.append({
+                'path': path,
+                'total_hops': len(path),
+                'amount_retention': retention,
+                'risk_score': self._calculate_layering_risk(path)
+            })
         
         return {
             'detected_chains': layering_chains,
+            'chain_count': search['chain_count'],
             'max_risk_score': max([chain['risk_score'] for chain in layering_chains], default=0),
+            'truncated': search['truncated'],
             'pattern_type': 'LAYERING'
         }
     
-    def detect_smurfing_pattern(self, address: str, time_window: int = 86400) -> Dict:
+    def detect_smurfing_pattern(self, address: str, time_window: int = 86400,
+                                graph: Optional[TransactionGraphStore] = None) -> Dict:
         """Detecta padrões de smurfing (múltiplas transações pequenas)"""
-        transactions = []
-        
-        # Coletar transações de saída
-        for neighbor in self.graph.successors(address):
-            edge_data = self.graph[address][neighbor]
-            transactions.append(edge_data)
+        graph = self.graph if graph is None else graph
+        # Todas as transferências de saída contam, inclusive repetidas para o mesmo destino
+        node = graph.node_id(address)
+        if node is None:
+            return {'detected': False, 'pattern_type': 'SMURFING'}
         
-        if len(transactions) < self.suspicious_patterns['smurfing']['min_transactions']:
+        # Contagem, média e variância mantidas na inserção: casos triviais sem varrer as arestas
+        count, avg_amount, variance = graph.out_amount_stats(node)
+        if count < self.suspicious_patterns['smurfing']['min_transactions'] or avg_amount <= 0:
             return {'detected': False, 'pattern_type': 'SMURFING'}
         
         # Analisar similaridade de valores
-        amounts = [tx['amount'] for tx in transactions]
-        avg_amount = np.mean(amounts)
-        similar_amounts = sum(1 for amt in amounts 
-                            if abs(amt - avg_amount) / avg_amount < 0.05)
+        if variance == 0:
+            similar_amounts = count
+        else:
+            amounts = graph.amount[graph.out_edge_ids(node)]
+            similar_amounts = int(np.count_nonzero(np.abs(amounts - avg_amount) / avg_amount < 0.05))
         
-        similarity_ratio = similar_amounts / len(amounts)
+        similarity_ratio = similar_amounts / count
         
         if similarity_ratio >= self.suspicious_patterns['smurfing']['amount_similarity_threshold']:
             return {
                 'detected': True,
                 'pattern_type': 'SMURFING',
-                'transaction_count': len(transactions),
+                'transaction_count': count,
                 'similarity_ratio': similarity_ratio,
-                'total_amount': sum(amounts),
-                'risk_score': min(similarity_ratio * len(transactions) * 10, 100)
+                'total_amount': avg_amount * count,
+                'risk_score': min(similarity_ratio * count * 10, 100)
             }
         
         return {'detected': False, 'pattern_type': 'SMURFING'}
     
-    def detect_round_tripping(self, address: str) -> Dict:
+    def detect_round_tripping(self, address: str, graph: Optional[TransactionGraphStore] = None) -> Dict:
         """Detecta padrões de round-tripping (fundos retornando à origem)"""
-        cycles = []
-        
-        try:
-            # Encontrar ciclos simples
-            simple_cycles = list(nx.simple_cycles(self.graph.subgraph(
-                [n for n in self.graph.nodes() if 
-                 nx.has_path(self.graph, address, n) or 
-                 nx.has_path(self.graph, n, address)]
-            )))
-            
-            for cycle in simple_cycles:
-                if address in cycle and len(cycle) >= 2:
-                    cycle_risk = self._calculate_cycle_risk(cycle)
-                    cycles.append({
-                        'cycle_path': cycle,
-                        'length': len(cycle),
-                        'risk_score': cycle_risk
-                    })
+        graph = self.graph if graph is None else graph
+        config = self.suspicious_patterns['round_tripping']
+        # Busca limitada apenas pelos ciclos que passam pelo endereço
+        search = find_cycles_through(
+            graph, address,
+            max_length=config['max_cycle_length'],
+            min_length=config['min_cycle_length'],
+            time_window=config['time_window'],
+            retention_threshold=config['amount_retention_threshold'],
+            max_cycles=config['max_cycles'],
+            max_expansions=config['max_expansions']
+        )
         
-        except nx.NetworkXError:
-            pass
+        cycles = []
+        for found in search['cycles']:
+            cycle = [graph.address(node) for node in found['nodes']]
+            cycles.append({
+                'cycle_path': cycle,
+                'length': len(cycle),
+                'amount_retention': found['amount_retention'],
+                'risk_score': self._calculate_cycle_risk(cycle)
+            })
         
         return {
             'detected_cycles': cycles,
             'max_risk_score': max([c['risk_score'] for c in cycles], default=0),
+            'truncated': search['truncated'],
             'pattern_type': 'ROUND_TRIPPING'
         }
     
@@ -194,19 +294,34 @@ class GraphNeuralNetwork:
         """Analisa clustering de endereços para identificar entidades"""
         clusters = []
         
-        # Usar algoritmo de clustering baseado em conectividade
-        subgraph = self.graph.subgraph(addresses)
-        connected_components = list(nx.weakly_connected_components(subgraph))
-        
-        for component in connected_components:
-            if len(component) > 1:
-                cluster_risk = self._calculate_cluster_risk(component)
-                clusters.append({
-                    'addresses': list(component),
-                    'size': len(component),
-                    'risk_score': cluster_risk,
-                    'total_volume': self._calculate_cluster_volume(component)
-                })
+        # Clusters globais do índice union-find: pertencimento e agregados sem percorrer o grafo.
+        # Com shards, o índice é montado sobre as transferências entre os endereços dados
+        if self.shards is not None:
+            graph = self.shards.subgraph_store(addresses)
+            index = ClusterIndex.from_store(graph, self._is_mixer)
+        else:
+            graph, index = self.graph, self.cluster_index
+        
+        members: Dict[int, List[str]] = {}
+        with self._lock:
+            for address in dict.fromkeys(addresses):
+                node = graph.node_id(address)
+                if node is not None:
+                    members.setdefault(index.cluster(node)[0], []).append(address)
+            
+            for root, cluster_addresses in members.items():
+                if len(cluster_addresses) > 1:
+                    _, size, volume, mixer_count = index.cluster(root)
+                    # O componente global tende a um único componente gigante: o risco considera só
+                    # os endereços consultados que caíram nele; o índice informa o pertencimento
+                    request_mixers = sum(1 for address in cluster_addresses if self._is_mixer(address))
+                    clusters.append({
+                        'addresses': cluster_addresses,
+                        'size': size,
+                        'mixer_count': mixer_count,
+                        'risk_score': self._calculate_cluster_risk(len(cluster_addresses), request_mixers),
+                        'total_volume': volume
+                    })
         
         return {
             'clusters': clusters,
@@ -236,38 +351,65 @@ class GraphNeuralNetwork:
         
         return min(base_risk, 100)
     
-    def _calculate_cluster_risk(self, cluster: set) -> float:
+    def _calculate_cluster_risk(self, size: int, mixer_count: int) -> float:
         """Calcula risco de um cluster de endereços"""
-        base_risk = len(cluster) * 5
+        base_risk = size * 5
         
         # Verificar se há mixers no cluster
-        mixer_count = sum(1 for addr in cluster 
-                         if any(mixer in addr.lower() 
-                               for mixer in self.suspicious_patterns['mixer_usage']['known_mixers']))
-        
         if mixer_count > 0:
             base_risk *= self.suspicious_patterns['mixer_usage']['risk_multiplier']
         
         return min(base_risk, 100)
     
-    def _calculate_cluster_volume(self, cluster: set) -> float:
-        """Calcula volume total de um cluster"""
-        total_volume = 0
-        
-        for addr in cluster:
-            for neighbor in self.graph.successors(addr):
-                if neighbor in cluster:
-                    total_volume += self.graph[addr][neighbor]['amount']
-        
-        return total_volume
+    def get_stats(self) -> Dict:
+        """Tamanho do grafo, contadores de evicção, cache de padrões e snapshots"""
+        if self.shards is not None:
+            return {'sharded': True, **self.shards.get_stats()}
+        stats = {
+            **self.graph.get_stats(),
+            'pattern_cache': self.pattern_cache.get_stats(),
+            'cluster_index': self.cluster_index.get_stats(),
+            'embeddings': self.node_embeddings.get_stats()
+        }
+        if self.persistence is not None:
+            stats['persistence'] = self.persistence.get_stats()
+        return stats
     
     def comprehensive_analysis(self, address: str) -> Dict:
         """Análise abrangente de um endereço"""
+        if self.shards is not None:
+            # Vizinhança buscada nos shards a cada análise; sem cache local, pois outros workers inserem arestas
+            depth = max(self.LAYERING_DEPTH, self.suspicious_patterns['round_tripping']['max_cycle_length'])
+            graph, _ = self.shards.neighborhood(address, depth)
+            return self._comprehensive_analysis(address, graph, use_cache=False)
+        with self._lock:
+            return self._comprehensive_analysis(address, self.graph, use_cache=True)
+    
+    def _comprehensive_analysis(self, address: str, graph: TransactionGraphStore, use_cache: bool) -> Dict:
+        # Resultados em cache são reaproveitados até uma nova aresta sujar o nó
+        node = graph.node_id(address) if use_cache else None
+        smurfing = self.pattern_cache.get(SMURFING, node) if node is not None else None
+        if smurfing is None:
+            smurfing = self.detect_smurfing_pattern(address, graph=graph)
+            if node is not None:
+                self.pattern_cache.put(SMURFING, node, smurfing)
+        
+        path_patterns = self.pattern_cache.get(PATH_PATTERNS, node) if node is not None else None
+        if path_patterns is None:
+            path_patterns = {
+                'layering': self.detect_layering_pattern(address, max_depth=self.LAYERING_DEPTH, graph=graph),
+                'round_tripping': self.detect_round_tripping(address, graph=graph)
+            }
+            if node is not None:
+                self.pattern_cache.put(PATH_PATTERNS, node, path_patterns)
+        
         results = {
             'address': address,
-            'layering': self.detect_layering_pattern(address),
-            'smurfing': self.detect_smurfing_pattern(address),
-            'round_tripping': self.detect_round_tripping(address),
+            'layering': path_patterns['layering'],
+            'smurfing': smurfing,
+            'round_tripping': path_patterns['round_tripping'],
+            # Leitura de linha da matriz de embeddings; com shards não há embeddings globais e vale 0
+            'neighborhood_risk_score': self.node_embeddings.risk_score(node),
             'overall_risk_score': 0,
             'risk_factors': []
         }
@@ -276,7 +418,8 @@ class GraphNeuralNetwork:
         risk_scores = [
             results['layering']['max_risk_score'],
             results['smurfing'].get('risk_score', 0),
-            results['round_tripping']['max_risk_score']
+            results['round_tripping']['max_risk_score'],
+            results['neighborhood_risk_score']
         ]
         
         results['overall_risk_score'] = min(max(risk_scores) * 1.2, 100)
@@ -288,5 +431,7 @@ class GraphNeuralNetwork:
             results['risk_factors'].append('SMURFING_PATTERN')
         if results['round_tripping']['max_risk_score'] > 40:
             results['risk_factors'].append('ROUND_TRIPPING')
+        if results['neighborhood_risk_score'] > 50:
+            results['risk_factors'].append('MIXER_NEIGHBORHOOD')
         
         return results
\ No newline at end of file
@@ -0,0 +1,467 @@
+"""
+Serviço de Shards do Grafo de Transações
+Processos locais que particionam o grafo por hash do endereço de origem: cada
+shard guarda as transferências que saem dos endereços que possui, de modo
+que todos os workers do gunicorn enxergam o mesmo grafo sem duplicá-lo em
+memória. Os workers falam com os shards por sockets Unix em um protocolo
+binário compacto (cabeçalho fixo + registros de aresta no formato do log de
+snapshots). Travessias multi-salto andam em ondas: a cada salto, uma única
+requisição por shard com toda a fronteira, enviadas em paralelo. A
+vizinhança obtida vira um TransactionGraphStore local, sobre o qual os
+detectores rodam sem mudanças.
+
+Uso:
+    python -m advanced_ml.graph_shard --shards 4 --socket-dir /run/aml-graph
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from advanced_ml.graph_snapshot import GraphSnapshotter, encode_edge_record, iter_edge_records
+from advanced_ml.graph_store import TransactionGraphStore, store_config_from_env
+
+# Quadro: código (operação na requisição, status na resposta) + tamanho do payload
+FRAME = struct.Struct('<BI')
+UINT32 = struct.Struct('<I')
+EDGE_LIMITS = struct.Struct('<II')
+NAME_LENGTH = struct.Struct('<H')
+
+OP_ADD = 1         # payload: registros de aresta -> UINT32 arestas inseridas
+OP_OUT_EDGES = 2   # payload: EDGE_LIMITS (por nó, total) + endereços -> UINT32 nós cortados + registros
+OP_STATS = 3       # payload vazio -> JSON
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+class GraphShardError(Exception):
+    """Falha de comunicação com um shard ou erro reportado por ele"""
+
+
+def shard_for(address: str, n_shards: int) -> int:
+    """Shard dono do endereço (hash estável entre processos, ao contrário de hash())"""
+    return zlib.crc32(address.encode()) % n_shards
+
+
+def encode_addresses(addresses: Iterable[str]) -> bytes:
+    parts = []
+    for address in addresses:
+        encoded = address.encode()
+        parts.append(NAME_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b''.join(parts)
+
+
+def decode_addresses(data: bytes, offset: int = 0) -> List[str]:
+    addresses = []
+    while offset < len(data):
+        (length,) = NAME_LENGTH.unpack_from(data, offset)
+        offset += NAME_LENGTH.size
+        addresses.append(data[offset:offset + length].decode())
+        offset += length
+    return addresses
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError('Connection closed by peer')
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_frame(sock: socket.socket, code: int, payload: bytes = b''):
+    sock.sendall(FRAME.pack(code, len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    code, length = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    return code, _recv_exact(sock, length) if length else b''
+
+
+# Servidor
+
+class GraphShard:
+    """Partição do grafo: as arestas cuja origem pertence a este shard"""
+
+    def __init__(self, index: int, count: int, snapshot_dir: Optional[str] = None,
+                 snapshot_interval: float = 300, **store_kwargs):
+        self.index = index
+        self.count = count
+        self.lock = threading.RLock()
+        self.persistence: Optional[GraphSnapshotter] = None
+        self.store = None
+        if snapshot_dir:
+            # Cada shard persiste a própria partição (snapshot + log) em um subdiretório
+            self.persistence = GraphSnapshotter(os.path.join(snapshot_dir, f"shard-{index}"), lock=self.lock)
+            self.store = self.persistence.load(**store_kwargs)
+        if self.store is None:
+            self.store = TransactionGraphStore(**store_kwargs)
+        self.store.enable_background_compaction(self.lock)
+        if self.persistence is not None:
+            self.persistence.start(self.store, snapshot_interval)
+        self.stats = {'added_edges': 0, 'misrouted_edges': 0, 'edge_queries': 0, 'truncated_nodes': 0}
+
+    def add(self, payload: bytes) -> int:
+        added = 0
+        with self.lock:
+            for _, record in iter_edge_records(payload):
+                if shard_for(record[0], self.count) != self.index:
+                    self.stats['misrouted_edges'] += 1
+                    continue
+                if not self.store.admits(record[3]):
+                    continue
+                self.store.add_transaction(*record)
+                if self.persistence is not None:
+                    self.persistence.log_transaction(*record)
+                added += 1
+        self.stats['added_edges'] += added
+        return added
+
+    def out_edges(self, addresses: List[str], limit: int, budget: int) -> bytes:
+        """Transferências de saída dos endereços (as ``limit`` mais recentes de cada nó, ``budget`` no total)
+
+        Esgotado o orçamento, os endereços restantes contam como cortados.
+        """
+        records, truncated = [], 0
+        store = self.store
+        with self.lock:
+            for address in addresses:
+                node = store.node_id(address)
+                if node is None:
+                    continue
+                edges = store.out_edge_ids(node)
+                allowed = min(limit, budget - len(records))
+                if len(edges) > allowed:
+                    edges = edges[len(edges) - allowed:]
+                    truncated += 1
+                for edge in edges.tolist():
+                    data = store.edge_data(edge)
+                    records.append(encode_edge_record(
+                        address, store.address(int(store.dst[edge])), data['amount'], data['timestamp'],
+                        data['tx_hash'], data['risk_flags']
+                    ))
+        self.stats['edge_queries'] += 1
+        self.stats['truncated_nodes'] += truncated
+        return UINT32.pack(truncated) + b''.join(records)
+
+    def get_stats(self) -> Dict:
+        stats = {'shard': self.index, 'shards': self.count, **self.stats, **self.store.get_stats()}
+        if self.persistence is not None:
+            stats['persistence'] = self.persistence.get_stats()
+        return stats
+
+    def dispatch(self, op: int, payload: bytes) -> bytes:
+        if op == OP_ADD:
+            return UINT32.pack(self.add(payload))
+        if op == OP_OUT_EDGES:
+            limit, budget = EDGE_LIMITS.unpack_from(payload)
+            return self.out_edges(decode_addresses(payload, EDGE_LIMITS.size), limit, budget)
+        if op == OP_STATS:
+            return json.dumps(self.get_stats()).encode()
+        raise GraphShardError(f"Unknown operation: {op}")
+
+
+class _ShardRequestHandler(socketserver.BaseRequestHandler):
+    """Uma conexão persistente por worker; requisições atendidas em ordem"""
+
+    def handle(self):
+        shard = self.server.shard
+        while True:
+            try:
+                op, payload = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                status, response = STATUS_OK, shard.dispatch(op, payload)
+            except Exception as e:
+                logging.error(f"Graph shard {shard.index} failed on op {op}: {e}")
+                status, response = STATUS_ERROR, str(e).encode()
+            send_frame(self.request, status, response)
+
+
+class _ShardServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_shard_server(index: int, count: int, socket_path: str, snapshot_dir: Optional[str] = None,
+                        snapshot_interval: float = 300) -> _ShardServer:
+    """Shard pronto para ``serve_forever`` no socket Unix dado"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    shard = GraphShard(index, count, snapshot_dir=snapshot_dir, snapshot_interval=snapshot_interval,
+                       **store_config_from_env())
+    server = _ShardServer(socket_path, _ShardRequestHandler)
+    server.shard = shard
+    return server
+
+
+def serve_shard(index: int, count: int, socket_path: str, snapshot_dir: Optional[str] = None,
+                snapshot_interval: float = 300):
+    """Executa um shard até receber SIGTERM"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = create_shard_server(index, count, socket_path, snapshot_dir, snapshot_interval)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logging.info(f"Graph shard {index}/{count} listening on {socket_path} "
+                 f"({server.shard.store.number_of_edges()} edges)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if server.shard.persistence is not None:
+            server.shard.persistence.stop()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def shard_socket_paths(socket_dir: str, count: int) -> List[str]:
+    return [os.path.join(socket_dir, f"shard-{index}.sock") for index in range(count)]
+
+
+# Cliente
+
+class GraphShardClient:
+    """Cliente dos shards usado pelos workers
+
+    Mantém uma conexão por shard (recriada após fork) protegida por trava,
+    de modo que pode ser compartilhado entre as threads de um worker.
+    """
+
+    def __init__(self, socket_paths: List[str], timeout: float = 5.0,
+                 max_edges_per_node: int = 500, max_nodes: int = 5000, max_edges: int = 5000):
+        if not socket_paths:
+            raise GraphShardError('No graph shard sockets configured')
+        self.socket_paths = list(socket_paths)
+        self.timeout = timeout
+        # Limites por requisição de análise, dimensionados para latência (cada aresta buscada
+        # é reinserida num grafo local, ~10 µs), não para a capacidade dos shards
+        self.max_edges_per_node = max_edges_per_node
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self._sockets: List[Optional[socket.socket]] = [None] * len(self.socket_paths)
+        self._locks = [threading.Lock() for _ in self.socket_paths]
+        self._pid = os.getpid()
+
+    @classmethod
+    def from_env(cls) -> Optional['GraphShardClient']:
+        """Cliente para AML_GRAPH_SHARD_SOCKETS (caminhos separados por os.pathsep, na ordem dos shards)"""
+        value = os.getenv('AML_GRAPH_SHARD_SOCKETS', '')
+        paths = [path for path in value.split(os.pathsep) if path.strip()]
+        if not paths:
+            return None
+        return cls(paths,
+                   timeout=float(os.getenv('AML_GRAPH_SHARD_TIMEOUT', '5')),
+                   max_edges_per_node=int(os.getenv('AML_GRAPH_SHARD_MAX_EDGES_PER_NODE', '500')),
+                   max_nodes=int(os.getenv('AML_GRAPH_SHARD_MAX_NODES', '5000')),
+                   max_edges=int(os.getenv('AML_GRAPH_SHARD_MAX_EDGES', '5000')))
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.socket_paths)
+
+    def _connection(self, shard: int) -> socket.socket:
+        if self._pid != os.getpid():
+            # Sockets herdados do master seriam compartilhados entre workers
+            self._sockets = [None] * len(self.socket_paths)
+            self._pid = os.getpid()
+        sock = self._sockets[shard]
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_paths[shard])
+            self._sockets[shard] = sock
+        return sock
+
+    def _discard(self, shard: int):
+        sock = self._sockets[shard]
+        self._sockets[shard] = None
+        if sock is not None:
+            sock.close()
+
+    def _exchange(self, requests: Dict[int, Tuple[int, bytes]]) -> Dict[int, bytes]:
+        """Envia todas as requisições antes de ler as respostas: os shards trabalham em paralelo"""
+        shards = sorted(requests)
+        for shard in shards:
+            self._locks[shard].acquire()
+        try:
+            for shard in shards:
+                op, payload = requests[shard]
+                try:
+                    send_frame(self._connection(shard), op, payload)
+                except OSError as e:
+                    self._discard(shard)
+                    raise GraphShardError(f"Graph shard {shard} unavailable: {e}")
+
+            responses = {}
+            for shard in shards:
+                try:
+                    status, payload = recv_frame(self._connection(shard))
+                except (OSError, ConnectionError) as e:
+                    self._discard(shard)
+                    raise GraphShardError(f"Graph shard {shard} unavailable: {e}")
+                if status != STATUS_OK:
+                    raise GraphShardError(f"Graph shard {shard}: {payload.decode(errors='replace')}")
+                responses[shard] = payload
+            return responses
+        except GraphShardError:
+            # Respostas pendentes deixariam a conexão fora de sincronia
+            for shard in shards:
+                self._discard(shard)
+            raise
+        finally:
+            for shard in shards:
+                self._locks[shard].release()
+
+    def add_transactions(self, records: Iterable[Tuple]) -> int:
+        """Insere arestas (from, to, amount, timestamp, tx_hash, risk_flags) no shard de cada origem"""
+        batches: Dict[int, List[bytes]] = {}
+        for record in records:
+            batches.setdefault(shard_for(record[0], self.shard_count), []).append(encode_edge_record(*record))
+        if not batches:
+            return 0
+        responses = self._exchange({shard: (OP_ADD, b''.join(batch)) for shard, batch in batches.items()})
+        return sum(UINT32.unpack(payload)[0] for payload in responses.values())
+
+    def add_transaction(self, from_addr: str, to_addr: str, amount: float, timestamp: int,
+                        tx_hash: str, risk_flags: Optional[List[str]] = None) -> int:
+        return self.add_transactions([(from_addr, to_addr, amount, timestamp, tx_hash, risk_flags)])
+
+    def out_edges(self, addresses: Iterable[str], max_edges: Optional[int] = None) -> Tuple[List[Tuple], bool]:
+        """Transferências de saída dos endereços, buscadas em todos os shards de uma vez
+
+        No máximo ``max_edges`` (padrão: ``self.max_edges``) no total: o
+        orçamento é dividido entre os shards pela quantidade de endereços de
+        cada um, e cada shard para de montar a resposta ao esgotar sua parte.
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for address in addresses:
+            by_shard.setdefault(shard_for(address, self.shard_count), []).append(address)
+        if not by_shard:
+            return [], False
+
+        budget = self.max_edges if max_edges is None else max_edges
+        total = sum(len(batch) for batch in by_shard.values())
+        requests = {}
+        for shard, batch in by_shard.items():
+            share = budget * len(batch) // total
+            requests[shard] = (OP_OUT_EDGES, EDGE_LIMITS.pack(self.max_edges_per_node, share) +
+                               encode_addresses(batch))
+        responses = self._exchange(requests)
+        records, truncated = [], False
+        for shard in sorted(responses):
+            payload = responses[shard]
+            truncated |= UINT32.unpack_from(payload)[0] > 0
+            records.extend(record for _, record in iter_edge_records(payload[UINT32.size:]))
+        return records, truncated
+
+    def neighborhood(self, address: str, depth: int) -> Tuple[TransactionGraphStore, bool]:
+        """Grafo local com as transferências de saída até ``depth`` saltos a partir do endereço
+
+        Contém todas as arestas que layering (profundidade ``depth``) e
+        ciclos de até ``depth`` saltos pelo endereço podem usar. O custo por
+        requisição é limitado: no máximo ``max_edges`` arestas no total (o
+        restante do orçamento vai a cada salto) e ``max_nodes`` nós
+        expandidos; ao atingir um limite a busca para e o corte é reportado.
+        """
+        local = TransactionGraphStore()
+        seen: Set[str] = {address}
+        frontier = [address]
+        truncated = False
+        budget = self.max_edges
+        for _ in range(depth):
+            if not frontier:
+                break
+            if budget <= 0:
+                truncated = True
+                break
+            records, cut = self.out_edges(frontier, budget)
+            truncated |= cut
+            budget -= len(records)
+            next_frontier = []
+            for record in records:
+                local.add_transaction(*record)
+                neighbor = record[1]
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    next_frontier.append(neighbor)
+            if len(seen) > self.max_nodes:
+                truncated = True
+                break
+            frontier = next_frontier
+        return local, truncated
+
+    def subgraph_store(self, addresses: Iterable[str]) -> TransactionGraphStore:
+        """Grafo local apenas com as transferências entre os endereços dados"""
+        members = set(addresses)
+        local = TransactionGraphStore()
+        for address in members:
+            local.add_node(address)
+        records, _ = self.out_edges(members)
+        for record in records:
+            if record[1] in members:
+                local.add_transaction(*record)
+        return local
+
+    def get_stats(self) -> Dict:
+        responses = self._exchange({shard: (OP_STATS, b'') for shard in range(self.shard_count)})
+        shards = [json.loads(responses[shard]) for shard in range(self.shard_count)]
+        return {
+            'shards': self.shard_count,
+            'nodes': sum(stats['nodes'] for stats in shards),
+            'edges': sum(stats['edges'] for stats in shards),
+            'per_shard': shards
+        }
+
+    def close(self):
+        for shard in range(self.shard_count):
+            self._discard(shard)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the transaction graph shard service')
+    parser.add_argument('--shards', type=int, default=int(os.getenv('AML_GRAPH_SHARDS', '4')))
+    parser.add_argument('--socket-dir', default=os.getenv('AML_GRAPH_SHARD_DIR', '/tmp/aml-graph'))
+    parser.add_argument('--snapshot-dir', default=os.getenv('AML_GRAPH_SNAPSHOT_DIR'))
+    parser.add_argument('--snapshot-interval', type=float,
+                        default=float(os.getenv('AML_GRAPH_SNAPSHOT_INTERVAL', '300')))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    os.makedirs(args.socket_dir, exist_ok=True)
+    paths = shard_socket_paths(args.socket_dir, args.shards)
+    # spawn: cada shard começa limpo, sem herdar estado nem threads deste processo
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=serve_shard, args=(index, args.shards, path, args.snapshot_dir,
+                                                  args.snapshot_interval), daemon=True)
+        for index, path in enumerate(paths)
+    ]
+    for process in processes:
+        process.start()
+    print(f"AML_GRAPH_SHARD_SOCKETS={os.pathsep.join(paths)}", flush=True)
+
+    def stop(*_):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
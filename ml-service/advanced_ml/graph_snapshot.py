@@ -0,0 +1,374 @@
+"""
+Snapshots em Disco do Grafo de Transações
+Persiste o TransactionGraphStore em formato colunar (um .npy por coluna +
+tabela de endereços internados + manifesto) e mantém um log binário
+append-only com as arestas recebidas desde o último snapshot. Na partida, os
+arrays são abertos com memory-map (copy-on-write) e apenas o log é
+reaplicado, de modo que um grafo grande volta em segundos sem reinserir
+arestas uma a uma.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from advanced_ml.graph_store import TransactionGraphStore
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+ADDRESSES_FILE = 'addresses.bin'
+LOCK_FILE = 'WRITER.lock'
+SNAPSHOT_PREFIX = 'snapshot-'
+LOG_PREFIX = 'edges-'
+LOG_SUFFIX = '.log'
+# amount, timestamp e tamanhos de origem, destino, hash e flags (JSON)
+RECORD = struct.Struct('<dqIIII')
+
+
+class GraphSnapshotError(Exception):
+    """Snapshot ausente, incompleto ou incompatível"""
+
+
+def _encode_addresses(addresses: List[Optional[str]]) -> Tuple[bytes, str]:
+    """Tabela de endereços como um único blob; IDs livres viram string vazia"""
+    text = '\n'.join(address or '' for address in addresses)
+    if text.count('\n') == max(len(addresses) - 1, 0):
+        return text.encode(), 'lines'
+    # Algum endereço contém quebra de linha: cai para JSON (raro)
+    return json.dumps(addresses).encode(), 'json'
+
+
+def _decode_addresses(blob: bytes, encoding: str, count: int) -> List[Optional[str]]:
+    if encoding == 'json':
+        addresses = json.loads(blob.decode())
+    else:
+        addresses = blob.decode().split('\n') if count else []
+    if len(addresses) != count:
+        raise GraphSnapshotError(f"Address table has {len(addresses)} entries, expected {count}")
+    return [address or None for address in addresses]
+
+
+def encode_edge_record(from_addr: str, to_addr: str, amount: float, timestamp: int,
+                       tx_hash: str, risk_flags: Optional[List[str]] = None) -> bytes:
+    """Aresta no formato binário do log (também usado no protocolo dos shards)"""
+    fields = [from_addr.encode(), to_addr.encode(), (tx_hash or '').encode(),
+              json.dumps(list(risk_flags)).encode() if risk_flags else b'']
+    return RECORD.pack(amount, timestamp, *map(len, fields)) + b''.join(fields)
+
+
+def iter_edge_records(data: bytes) -> Iterator[Tuple[int, Tuple]]:
+    """Registros completos como (offset final, campos); para no primeiro registro truncado"""
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        amount, timestamp, *lengths = RECORD.unpack_from(data, offset)
+        end = offset + RECORD.size + sum(lengths)
+        if end > len(data):
+            break
+        fields, position = [], offset + RECORD.size
+        for length in lengths:
+            fields.append(data[position:position + length].decode())
+            position += length
+        from_addr, to_addr, tx_hash, flags = fields
+        offset = end
+        yield offset, (from_addr, to_addr, amount, timestamp, tx_hash, json.loads(flags) if flags else None)
+
+
+def read_edge_log(path: str) -> Iterator[Tuple[int, Tuple]]:
+    """Registros válidos de um arquivo de log de arestas"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return iter_edge_records(data)
+
+
+class GraphSnapshotter:
+    """Snapshots periódicos + log de arestas de um TransactionGraphStore
+
+    Layout::
+
+        <root>/CURRENT                      snapshot ativo
+        <root>/snapshot-<seq>/manifest.json contagens, dtypes e shapes, metadados do grafo
+        <root>/snapshot-<seq>/<coluna>.npy  colunas de arestas, agregados e índices CSR
+        <root>/snapshot-<seq>/addresses.bin tabela de endereços internados
+        <root>/edges-<seq>.log              arestas recebidas depois do snapshot <seq>
+
+    Há um único escritor por diretório (trava POSIX em ``WRITER.lock``,
+    obtida no primeiro registro gravado): com vários workers pré-forkados,
+    só o primeiro que recebe tráfego persiste o próprio grafo.
+    """
+
+    def __init__(self, root: str, lock: Optional[threading.RLock] = None, keep: int = 2):
+        self.root = root
+        self.lock = lock or threading.RLock()
+        self.keep = max(1, keep)
+        self._seq = 0
+        self._log = None
+        self._writer_pid: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._disabled_pid: Optional[int] = None
+        self._store: Optional[TransactionGraphStore] = None
+        self._interval: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {
+            'snapshots': 0,
+            'last_snapshot_at': None,
+            'last_snapshot_seconds': 0.0,
+            'logged_edges': 0,
+            'restored_edges': 0,
+            'replayed_edges': 0,
+            'restore_seconds': 0.0,
+            'errors': 0
+        }
+
+    # Diretório
+
+    def _snapshot_dir(self, seq: int) -> str:
+        return os.path.join(self.root, f"{SNAPSHOT_PREFIX}{seq:06d}")
+
+    def _log_path(self, seq: int) -> str:
+        return os.path.join(self.root, f"{LOG_PREFIX}{seq:06d}{LOG_SUFFIX}")
+
+    def _list(self, prefix: str, suffix: str = '') -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for entry in os.listdir(self.root):
+            if entry.startswith(prefix) and entry.endswith(suffix):
+                number = entry[len(prefix):len(entry) - len(suffix)]
+                if number.isdigit():
+                    found.append(int(number))
+        return sorted(found)
+
+    def current_snapshot(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return int(name[len(SNAPSHOT_PREFIX):]) if name.startswith(SNAPSHOT_PREFIX) else None
+
+    # Restauração
+
+    def load(self, mmap: bool = True, **store_kwargs) -> Optional[TransactionGraphStore]:
+        """Abre o snapshot ativo e reaplica os logs posteriores; None se não há nada salvo
+
+        ``store_kwargs`` (retenção, tamanho de bloco) vêm da configuração
+        atual, não do snapshot; a retenção é aplicada já na reaplicação.
+        """
+        started = time.time()
+        seq = self.current_snapshot()
+        if seq is None:
+            store = TransactionGraphStore(**store_kwargs)
+            seq = 0
+        else:
+            store = self._load_snapshot(seq, mmap, store_kwargs)
+            self.stats['restored_edges'] = store.number_of_edges()
+
+        # Logs a partir do snapshot ativo (um snapshot mais novo pode ter falhado antes do CURRENT)
+        replayed = 0
+        logs = [number for number in self._list(LOG_PREFIX, LOG_SUFFIX) if number >= seq]
+        for number in logs:
+            path, valid_until = self._log_path(number), 0
+            for valid_until, record in read_edge_log(path):
+                store.add_transaction(*record)
+                replayed += 1
+            if valid_until < os.path.getsize(path):
+                # Registro incompleto no fim (queda durante a escrita): descarta para não corromper os próximos
+                logging.warning(f"Truncating incomplete record at {path}:{valid_until}")
+                os.truncate(path, valid_until)
+
+        self._seq = max([seq] + logs)
+        self.stats['replayed_edges'] = replayed
+        # Arestas reaplicadas ainda não estão em nenhum snapshot
+        self.stats['logged_edges'] = replayed
+        self.stats['restore_seconds'] = round(time.time() - started, 4)
+        if self.current_snapshot() is None and not replayed:
+            return None
+        return store
+
+    def _load_snapshot(self, seq: int, mmap: bool, store_kwargs: Dict) -> TransactionGraphStore:
+        directory = self._snapshot_dir(seq)
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise GraphSnapshotError(f"Missing manifest in {directory}")
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise GraphSnapshotError(f"Unsupported snapshot format in {directory}")
+
+        arrays = {}
+        for name, info in manifest['arrays'].items():
+            # Copy-on-write: o grafo restaurado pode alterar agregados sem tocar no arquivo
+            array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='c' if mmap else None)
+            if list(array.shape) != info['shape'] or str(array.dtype) != info['dtype']:
+                raise GraphSnapshotError(f"Array {name} does not match manifest of {directory}")
+            # Vista ndarray simples sobre o mesmo mapeamento (evita o overhead da subclasse memmap)
+            arrays[name] = np.asarray(array)
+
+        with open(os.path.join(directory, ADDRESSES_FILE), 'rb') as f:
+            addresses = _decode_addresses(f.read(), manifest['address_encoding'], manifest['nodes'])
+        return TransactionGraphStore.from_snapshot(arrays, manifest['graph'], addresses, **store_kwargs)
+
+    # Escrita
+
+    def _claim_writer(self) -> bool:
+        """Trava de escritor única por diretório (travas POSIX não passam pelo fork)"""
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return True
+        if self._disabled_pid == pid:
+            return False
+
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(os.path.join(self.root, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            self._disabled_pid = pid
+            logging.warning(f"Graph snapshot directory {self.root} is owned by another process; "
+                            f"persistence disabled in pid {pid}")
+            return False
+
+        # Handles herdados do processo pai não pertencem a este processo
+        self._lock_fd = fd
+        self._log = None
+        self._writer_pid = pid
+        return True
+
+    def _open_log(self, seq: int):
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._log_path(seq), 'ab')
+
+    def log_transaction(self, from_addr: str, to_addr: str, amount: float, timestamp: int,
+                        tx_hash: str, risk_flags: Optional[List[str]] = None):
+        """Acrescenta a aresta ao log (o chamador segura a trava do grafo)"""
+        if not self._claim_writer():
+            return
+        if self._log is None:
+            self._open_log(self._seq)
+        # Um único write por registro: um leitor nunca vê metade de um registro já confirmado
+        self._log.write(encode_edge_record(from_addr, to_addr, amount, timestamp, tx_hash, risk_flags))
+        self._log.flush()
+        self.stats['logged_edges'] += 1
+
+    def save(self, store: TransactionGraphStore) -> Optional[Dict]:
+        """Grava um snapshot completo e passa a registrar as novas arestas em um log novo"""
+        if not self._claim_writer():
+            return None
+
+        started = time.time()
+        with self.lock:
+            arrays, graph_meta, addresses = store.snapshot_state()
+            seq = self._seq + 1
+            # Arestas a partir daqui vão para o log do novo snapshot
+            if self._log is not None:
+                os.fsync(self._log.fileno())
+            self._open_log(seq)
+            self._seq = seq
+            self.stats['logged_edges'] = 0
+
+        # Fora da trava: as colunas capturadas não mudam com novas inserções
+        arrays = TransactionGraphStore.complete_snapshot(arrays)
+        address_blob, address_encoding = _encode_addresses(addresses)
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'sequence': seq,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'nodes': len(addresses),
+            'edges': int(len(arrays['src'])),
+            'address_encoding': address_encoding,
+            'arrays': {name: {'dtype': str(array.dtype), 'shape': list(array.shape)}
+                       for name, array in arrays.items()},
+            'graph': graph_meta
+        }
+
+        target_dir = self._snapshot_dir(seq)
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(staging_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(staging_dir, ADDRESSES_FILE), 'wb') as f:
+                f.write(address_blob)
+            with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(staging_dir, target_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        pointer_tmp = os.path.join(self.root, f".{CURRENT_FILE}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(os.path.basename(target_dir))
+        os.replace(pointer_tmp, os.path.join(self.root, CURRENT_FILE))
+        self._prune()
+
+        self.stats['snapshots'] += 1
+        self.stats['last_snapshot_at'] = manifest['created_at']
+        self.stats['last_snapshot_seconds'] = round(time.time() - started, 4)
+        return manifest
+
+    def _prune(self):
+        """Mantém os ``keep`` snapshots mais recentes e os logs que eles ainda precisam"""
+        snapshots = self._list(SNAPSHOT_PREFIX)
+        kept = snapshots[-self.keep:]
+        for seq in snapshots[:-self.keep]:
+            # Arquivos ainda mapeados por um grafo restaurado continuam válidos após o unlink
+            shutil.rmtree(self._snapshot_dir(seq), ignore_errors=True)
+        if kept:
+            for seq in self._list(LOG_PREFIX, LOG_SUFFIX):
+                if seq < kept[0]:
+                    os.unlink(self._log_path(seq))
+
+    # Snapshots em segundo plano
+
+    def start(self, store: TransactionGraphStore, interval: float):
+        """Grava snapshots a cada ``interval`` segundos enquanto houver arestas novas"""
+        self._store = store
+        self._interval = interval
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+        self._thread.start()
+
+    def resume_after_fork(self):
+        """Recria a thread de snapshots em um worker pré-forkado (threads não sobrevivem ao fork)"""
+        if self._store is not None and not self._stop.is_set() and \
+                (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._log is not None and self._writer_pid == os.getpid():
+            self._log.close()
+            self._log = None
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self._interval):
+            if not self.stats['logged_edges']:
+                continue
+            try:
+                self.save(self._store)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logging.error(f"Graph snapshot failed: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            'directory': self.root,
+            'current_snapshot': self.current_snapshot(),
+            'writer': self._writer_pid == os.getpid(),
+            **self.stats
+        }
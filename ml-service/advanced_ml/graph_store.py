@@ -0,0 +1,1126 @@
+"""
+Armazenamento Compacto do Grafo de Transações
+Substitui o nx.DiGraph do GNN: endereços viram IDs inteiros internados, as
+arestas ficam em colunas NumPy (src, dst, amount, timestamp, tx_id) e a
+adjacência é um índice CSR (saída e entrada) atualizado em blocos. Cada
+transferência é uma aresta própria (multigrafo) e cada par origem->destino
+mantém agregados incrementais (quantidade, soma, primeiro/último timestamp).
+Uma política de retenção (janela de tempo + orçamento de arestas) remove as
+arestas antigas em blocos por faixa de tempo e libera os nós que ficam sem
+arestas. Expõe o subconjunto da API do networkx usado pelos detectores.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import logging
+import os
+import threading
+import time
+
+import networkx as nx
+import numpy as np
+
+NODE_DTYPE = np.int32
+EDGE_DTYPE = np.int64
+
+# Arestas pendentes antes de mesclar um novo bloco no índice CSR
+DEFAULT_CHUNK_SIZE = 65536
+# Timestamps informados pelo cliente podem estar até 5 minutos à frente do relógio local
+DEFAULT_MAX_CLOCK_SKEW = 300
+
+
+def store_config_from_env() -> Dict:
+    """Retenção: janela de tempo (AML_GRAPH_RETENTION_DAYS), orçamento de arestas (AML_GRAPH_MAX_EDGES)
+    e tolerância a timestamps no futuro (AML_GRAPH_MAX_CLOCK_SKEW, segundos)"""
+    return {
+        'retention_seconds': int(float(os.getenv('AML_GRAPH_RETENTION_DAYS', '30')) * 86400),
+        'max_edges': int(os.getenv('AML_GRAPH_MAX_EDGES', '20000000')),
+        'max_clock_skew': int(os.getenv('AML_GRAPH_MAX_CLOCK_SKEW', str(DEFAULT_MAX_CLOCK_SKEW)))
+    }
+
+
+class _Column:
+    """Array NumPy com crescimento amortizado (capacidade dobra quando enche)
+
+    Escritas só acontecem após ``size`` ou em arrays novos (crescimento e
+    compactação), exceto nas colunas de agregados atualizadas no lugar; por
+    isso uma vista ``view()`` das colunas de arestas continua válida depois.
+    """
+
+    __slots__ = ('data', 'size')
+
+    def __init__(self, dtype, capacity: int = 1024, fill=0):
+        self.data = np.full(capacity, fill, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            self._grow(self.size + 1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values: np.ndarray):
+        end = self.size + len(values)
+        if end > len(self.data):
+            self._grow(end)
+        self.data[self.size:end] = values
+        self.size = end
+
+    def _grow(self, minimum: int):
+        capacity = max(minimum, len(self.data) * 2)
+        grown = np.zeros(capacity, dtype=self.data.dtype)
+        grown[:self.size] = self.data[:self.size]
+        self.data = grown
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    def replace(self, values: np.ndarray, spare: int = 0):
+        """Substitui o conteúdo (usado na compactação após evicção), com ``spare`` linhas de folga"""
+        self.data = np.zeros(max(1024, len(values) + spare), dtype=self.data.dtype)
+        self.data[:len(values)] = values
+        self.size = len(values)
+
+    def attach(self, values: np.ndarray):
+        """Adota o array sem copiar (ex.: memory-map de um snapshot); copia só ao crescer"""
+        self.data = values
+        self.size = len(values)
+
+
+class _StringColumn:
+    """Strings concatenadas em um único buffer + offsets (sem um objeto str por linha)"""
+
+    __slots__ = ('buffer', 'offsets')
+
+    def __init__(self):
+        self.buffer = _Column(np.uint8, capacity=16384)
+        self.offsets = _Column(np.int64)
+        self.offsets.append(0)
+
+    def append(self, value: str) -> int:
+        return self.append_encoded(value.encode())
+
+    def append_encoded(self, value: bytes) -> int:
+        self.buffer.extend(np.frombuffer(value, dtype=np.uint8))
+        self.offsets.append(self.buffer.size)
+        return self.offsets.size - 2
+
+    def __getitem__(self, index: int) -> str:
+        offsets = self.offsets.data
+        return self.buffer.data[offsets[index]:offsets[index + 1]].tobytes().decode()
+
+    def __len__(self) -> int:
+        return self.offsets.size - 1
+
+    def take(self, indices: np.ndarray) -> '_StringColumn':
+        """Nova coluna apenas com as linhas indicadas, copiadas em bloco"""
+        return self.gather(self.buffer.view(), self.offsets.view(), indices)
+
+    @staticmethod
+    def gather(buffer: np.ndarray, offsets: np.ndarray, indices: np.ndarray) -> '_StringColumn':
+        """``take`` sobre vistas do buffer e dos offsets (não depende da coluna continuar igual)"""
+        starts, ends = offsets[indices], offsets[indices + 1]
+        lengths = ends - starts
+        new_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_offsets[1:])
+        gather = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+        column = _StringColumn()
+        column.buffer.replace(buffer[gather])
+        column.offsets.replace(new_offsets)
+        return column
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.size + self.offsets.data.nbytes
+
+
+def _merge_csr(indptr: np.ndarray, order: np.ndarray, chunk_keys: np.ndarray,
+               first_edge: int, n_nodes: int):
+    """Mescla um bloco de arestas novas em um índice CSR existente em O(E)
+
+    As arestas antigas de cada nó mantêm a ordem e as novas entram depois
+    delas, preservando a ordem de inserção dentro de cada nó.
+    """
+    old_indptr = np.empty(n_nodes + 1, dtype=EDGE_DTYPE)
+    old_indptr[:len(indptr)] = indptr
+    old_indptr[len(indptr):] = indptr[-1]
+
+    chunk_sort = np.argsort(chunk_keys, kind='stable')
+    new_counts = np.bincount(chunk_keys, minlength=n_nodes)
+    new_indptr = np.zeros(n_nodes + 1, dtype=EDGE_DTYPE)
+    np.cumsum(new_counts, out=new_indptr[1:])
+
+    merged = np.empty(len(order) + len(chunk_keys), dtype=EDGE_DTYPE)
+    old_counts = np.diff(old_indptr)
+    merged[np.arange(len(order)) + np.repeat(new_indptr[:-1], old_counts)] = order
+    sorted_keys = chunk_keys[chunk_sort]
+    merged[np.arange(len(chunk_keys)) + old_indptr[sorted_keys + 1]] = chunk_sort + first_edge
+
+    return old_indptr + new_indptr, merged
+
+
+def _compacted_state(columns: Dict[str, np.ndarray], keep: np.ndarray, n_nodes: int,
+                     bucket_seconds: int) -> Dict[str, np.ndarray]:
+    """Colunas, agregados e índices CSR das arestas mantidas em ``keep``
+
+    Só lê ``columns`` (vistas das colunas de arestas, ver ``_Column``) e não
+    toca no grafo: a compactação em segundo plano roda isto fora da trava,
+    enquanto novas arestas entram depois dessas vistas.
+    """
+    kept = np.flatnonzero(keep)
+    src = columns['src'][kept]
+    dst = columns['dst'][kept]
+    amount = columns['amount'][kept]
+    timestamp = columns['timestamp'][kept]
+    state = {
+        'remap': np.full(len(keep), -1, dtype=EDGE_DTYPE),
+        'src': src, 'dst': dst, 'amount': amount, 'timestamp': timestamp,
+        'tx_hashes': _StringColumn.gather(columns['tx_hash_bytes'], columns['tx_hash_offsets'],
+                                          columns['tx_id'][kept])
+    }
+    state['remap'][kept] = np.arange(len(kept))
+
+    # Agregados por par
+    keys = (src.astype(np.int64) << 32) | dst.astype(np.int64)
+    pair_keys, first, edge_pair = np.unique(keys, return_index=True, return_inverse=True)
+    n_pairs = len(pair_keys)
+    last_edge = np.zeros(n_pairs, dtype=EDGE_DTYPE)
+    np.maximum.at(last_edge, edge_pair, np.arange(len(kept)))
+    min_ts = np.full(n_pairs, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(min_ts, edge_pair, timestamp)
+    max_ts = np.full(n_pairs, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(max_ts, edge_pair, timestamp)
+    state.update({
+        'edge_pair': edge_pair, 'pair_keys': pair_keys,
+        'pair_src': src[first], 'pair_dst': dst[first],
+        'pair_count': np.bincount(edge_pair, minlength=n_pairs),
+        'pair_sum': np.bincount(edge_pair, weights=amount, minlength=n_pairs),
+        'pair_min_ts': min_ts, 'pair_max_ts': max_ts, 'pair_last_edge': last_edge
+    })
+
+    # Estatísticas de saída por nó
+    out_count = np.bincount(src, minlength=n_nodes)
+    out_sum = np.bincount(src, weights=amount, minlength=n_nodes)
+    out_mean = np.divide(out_sum, out_count, out=np.zeros(n_nodes), where=out_count > 0)
+    state.update({
+        'out_count': out_count, 'out_mean': out_mean,
+        'out_m2': np.bincount(src, weights=(amount - out_mean[src]) ** 2, minlength=n_nodes),
+        # Nós sem nenhuma aresta vão para a lista livre
+        'unused_nodes': np.flatnonzero(out_count + np.bincount(dst, minlength=n_nodes) == 0)
+    })
+
+    # Índices CSR reconstruídos do zero a partir das colunas compactadas
+    empty_indptr, empty_order = np.zeros(1, dtype=EDGE_DTYPE), np.zeros(0, dtype=EDGE_DTYPE)
+    state['out_indptr'], state['out_order'] = _merge_csr(empty_indptr, empty_order,
+                                                         src.astype(EDGE_DTYPE), 0, n_nodes)
+    state['in_indptr'], state['in_order'] = _merge_csr(empty_indptr, empty_order,
+                                                       dst.astype(EDGE_DTYPE), 0, n_nodes)
+
+    state['buckets'], state['bucket_counts'] = np.unique(timestamp // bucket_seconds, return_counts=True)
+    return state
+
+
+class _NodeView:
+    """Equivalente a ``DiGraph.nodes``: pertinência, iteração e atributos por endereço"""
+
+    def __init__(self, store: 'TransactionGraphStore'):
+        self._store = store
+
+    def __contains__(self, address) -> bool:
+        return address in self._store._node_ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store._node_ids)
+
+    def __len__(self) -> int:
+        return len(self._store._node_ids)
+
+    def __getitem__(self, address: str) -> Dict:
+        store = self._store
+        node = store._node_ids[address]
+        edges = np.union1d(store.out_edge_ids(node), store.in_edge_ids(node))
+        return {
+            'address': address,
+            'transactions': [store.tx_hash(edge) for edge in edges],
+            'risk_score': float(store._risk_score.data[node])
+        }
+
+
+class _AdjacencyView:
+    """Equivalente a ``graph[u]``: ``graph[u][v]`` devolve a última aresta u->v + agregados do par"""
+
+    def __init__(self, store: 'TransactionGraphStore', node: int):
+        self._store = store
+        self._node = node
+
+    def __getitem__(self, address: str) -> Dict:
+        pair = self._store.pair_id(self._node, self._store._node_ids.get(address, -1))
+        if pair is None:
+            raise KeyError(address)
+        return self._store.pair_data(pair)
+
+    def __contains__(self, address) -> bool:
+        target = self._store._node_ids.get(address)
+        return target is not None and self._store.pair_id(self._node, target) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return self._store.successors(self._store._addresses[self._node])
+
+    def __len__(self) -> int:
+        return len(self._store.successor_ids(self._node))
+
+
+class TransactionGraphStore:
+    """Grafo direcionado de transações com arestas em colunas NumPy
+
+    Cada transação é uma aresta própria (src, dst, amount, timestamp, tx_id);
+    o tx_id indexa a coluna de hashes. As arestas recém-inseridas ficam em
+    listas pendentes por nó até completarem um bloco, que é então mesclado
+    nos índices CSR de saída e de entrada sem reordenar o grafo inteiro.
+
+    Transferências repetidas entre o mesmo par não se sobrescrevem: o par
+    mantém contagem, soma e timestamps mínimo/máximo, atualizados na inserção.
+
+    Retenção: com ``retention_seconds`` as arestas mais antigas que a janela
+    (em relação ao maior timestamp já visto) são removidas em faixas inteiras
+    de ``bucket_seconds``; com ``max_edges`` as arestas mais antigas saem até
+    o grafo voltar a 90% do orçamento. Cada evicção compacta as colunas de uma
+    vez; IDs de nós sobreviventes não mudam e IDs de nós removidos vão para
+    uma lista livre. IDs de arestas mudam na compactação.
+
+    Por padrão a compactação roda dentro da inserção que vence a janela. Com
+    ``enable_background_compaction(lock)`` ela passa a rodar numa thread: o
+    cálculo (O(E)) é feito fora da trava sobre vistas das colunas e só a
+    troca do estado, que reaplica as arestas inseridas nesse meio-tempo,
+    acontece sob a trava.
+
+    Os timestamps vêm do cliente, então a janela não pode ser deslocada por
+    um valor arbitrário: arestas mais de ``max_clock_skew`` segundos à frente
+    do relógio local são recusadas (o maior timestamp visto nunca passa de
+    agora + tolerância) e arestas que já estariam fora da janela também,
+    sem disparar compactação (``admits``).
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, retention_seconds: Optional[int] = None,
+                 max_edges: Optional[int] = None, bucket_seconds: int = 3600,
+                 max_clock_skew: Optional[int] = DEFAULT_MAX_CLOCK_SKEW):
+        self.chunk_size = chunk_size
+        self.retention_seconds = retention_seconds
+        self.max_edges = max_edges
+        self.max_clock_skew = max_clock_skew
+        self.bucket_seconds = bucket_seconds
+
+        self._node_ids: Dict[str, int] = {}
+        self._addresses: List[Optional[str]] = []
+        self._free_nodes: List[int] = []
+        self._risk_score = _Column(np.float64)
+
+        self._src = _Column(NODE_DTYPE)
+        self._dst = _Column(NODE_DTYPE)
+        self._amount = _Column(np.float64)
+        self._timestamp = _Column(np.int64)
+        self._tx_id = _Column(EDGE_DTYPE)
+        self._tx_hashes = _StringColumn()
+        # Flags de risco são raras: só arestas com flags ocupam espaço
+        self._risk_flags: Dict[int, List[str]] = {}
+        self._edge_pair = _Column(EDGE_DTYPE)
+
+        # Agregados por par origem->destino (chave: src << 32 | dst). Pares vindos de uma
+        # compactação ou snapshot ficam em arrays ordenados (busca binária, sem um objeto por
+        # par); só os criados depois entram no dicionário
+        self._pair_ids: Dict[int, int] = {}
+        self._pair_index_keys = np.zeros(0, dtype=np.int64)
+        self._pair_index_ids = np.zeros(0, dtype=EDGE_DTYPE)
+        self._pair_src = _Column(NODE_DTYPE)
+        self._pair_dst = _Column(NODE_DTYPE)
+        self._pair_count = _Column(np.int64)
+        self._pair_sum = _Column(np.float64)
+        self._pair_min_ts = _Column(np.int64)
+        self._pair_max_ts = _Column(np.int64)
+        self._pair_last_edge = _Column(EDGE_DTYPE)
+        # Estatísticas de saída por nó (contagem + média/M2 de Welford), atualizadas na inserção
+        self._out_count = _Column(np.int64)
+        self._out_mean = _Column(np.float64)
+        self._out_m2 = _Column(np.float64)
+
+        self._indexed_edges = 0
+        self._out_indptr = np.zeros(1, dtype=EDGE_DTYPE)
+        self._out_order = np.zeros(0, dtype=EDGE_DTYPE)
+        self._in_indptr = np.zeros(1, dtype=EDGE_DTYPE)
+        self._in_order = np.zeros(0, dtype=EDGE_DTYPE)
+        self._pending_out: Dict[int, List[int]] = {}
+        self._pending_in: Dict[int, List[int]] = {}
+
+        # Arestas por faixa de tempo (timestamp // bucket_seconds)
+        self._bucket_counts: Dict[int, int] = {}
+        self._oldest_bucket: Optional[int] = None
+        self._latest_timestamp: Optional[int] = None
+        self._eviction_listeners: List = []
+        self.eviction_stats = {
+            'evictions': 0,
+            'evicted_edges': 0,
+            'evicted_nodes': 0,
+            'last_eviction_seconds': 0.0,
+            'last_eviction_lock_seconds': 0.0,
+            'background_compactions': 0,
+            'discarded_compactions': 0
+        }
+        # Trava do dono do grafo (None = compactação síncrona) e a compactação em andamento
+        self._compaction_lock = None
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._compaction_generation = 0
+        self.rejection_stats = {'rejected_future': 0, 'rejected_stale': 0}
+
+        self.nodes = _NodeView(self)
+
+    # Nós
+
+    def add_node(self, address: str) -> int:
+        node = self._node_ids.get(address)
+        if node is None:
+            if self._free_nodes:
+                # Reaproveita o ID de um nó removido pela retenção
+                node = self._free_nodes.pop()
+                self._addresses[node] = address
+                self._risk_score.data[node] = 0.0
+                self._out_count.data[node] = 0
+                self._out_mean.data[node] = 0.0
+                self._out_m2.data[node] = 0.0
+            else:
+                node = len(self._addresses)
+                self._addresses.append(address)
+                self._risk_score.append(0.0)
+                self._out_count.append(0)
+                self._out_mean.append(0.0)
+                self._out_m2.append(0.0)
+            self._node_ids[address] = node
+        return node
+
+    def has_node(self, address: str) -> bool:
+        return address in self._node_ids
+
+    def __contains__(self, address) -> bool:
+        return address in self._node_ids
+
+    def node_id(self, address: str) -> Optional[int]:
+        return self._node_ids.get(address)
+
+    def address(self, node: int) -> str:
+        return self._addresses[node]
+
+    def number_of_nodes(self) -> int:
+        return len(self._node_ids)
+
+    @property
+    def node_capacity(self) -> int:
+        """Maior ID de nó + 1 (inclui IDs livres); tamanho de arrays indexados por nó"""
+        return len(self._addresses)
+
+    # Arestas
+
+    def add_transaction(self, from_addr: str, to_addr: str, amount: float, timestamp: int,
+                        tx_hash: str, risk_flags: Optional[List[str]] = None) -> Optional[int]:
+        """Insere uma transação e devolve o ID da aresta (None se recusada ou se já saiu pela retenção)
+
+        Os tipos são validados e convertidos antes de qualquer escrita: um valor
+        inválido levanta TypeError/ValueError sem deixar colunas desalinhadas.
+        """
+        if not isinstance(from_addr, str) or not isinstance(to_addr, str):
+            raise TypeError(f"addresses must be str, got {type(from_addr).__name__}/{type(to_addr).__name__}")
+        if tx_hash is not None and not isinstance(tx_hash, str):
+            raise TypeError(f"tx_hash must be str, got {type(tx_hash).__name__}")
+        amount = float(amount)
+        timestamp = int(timestamp)
+        encoded_hash = (tx_hash or '').encode()
+        flags = list(risk_flags) if risk_flags else None
+        if not self.admits(timestamp):
+            return None
+        edge = self._append_edge(self.add_node(from_addr), self.add_node(to_addr), amount, timestamp,
+                                 encoded_hash, flags)
+
+        if self._retention_due():
+            if self._compaction_lock is not None:
+                # A evicção acontece na thread; a aresta já foi admitida dentro da janela
+                self._schedule_compaction()
+            else:
+                keep = self._evict()
+                # A própria aresta pode ter saído (timestamp fora da janela)
+                return self._src.size - 1 if keep is None or keep[-1] else None
+        if self._src.size - self._indexed_edges >= self.chunk_size:
+            self.flush()
+        return edge
+
+    def _append_edge(self, src: int, dst: int, amount: float, timestamp: int, encoded_hash: bytes,
+                     flags: Optional[List[str]]) -> int:
+        """Acrescenta uma aresta já validada e atualiza agregados, pendências e faixas de tempo"""
+        edge = self._src.size
+        self._src.append(src)
+        self._dst.append(dst)
+        self._amount.append(amount)
+        self._timestamp.append(timestamp)
+        self._tx_id.append(self._tx_hashes.append_encoded(encoded_hash))
+        if flags:
+            self._risk_flags[edge] = flags
+        self._edge_pair.append(self._update_pair(src, dst, amount, timestamp, edge))
+        self._update_out_stats(src, amount)
+
+        self._pending_out.setdefault(src, []).append(edge)
+        self._pending_in.setdefault(dst, []).append(edge)
+
+        bucket = timestamp // self.bucket_seconds
+        self._bucket_counts[bucket] = self._bucket_counts.get(bucket, 0) + 1
+        if self._oldest_bucket is None or bucket < self._oldest_bucket:
+            self._oldest_bucket = bucket
+        if self._latest_timestamp is None or timestamp > self._latest_timestamp:
+            self._latest_timestamp = timestamp
+        return edge
+
+    def _update_pair(self, src: int, dst: int, amount: float, timestamp: int, edge: int) -> int:
+        key = (src << 32) | dst
+        pair = self._lookup_pair(key)
+        if pair is None:
+            pair = self._pair_src.size
+            self._pair_ids[key] = pair
+            self._pair_src.append(src)
+            self._pair_dst.append(dst)
+            self._pair_count.append(1)
+            self._pair_sum.append(amount)
+            self._pair_min_ts.append(timestamp)
+            self._pair_max_ts.append(timestamp)
+            self._pair_last_edge.append(edge)
+            return pair
+
+        self._pair_count.data[pair] += 1
+        self._pair_sum.data[pair] += amount
+        if timestamp < self._pair_min_ts.data[pair]:
+            self._pair_min_ts.data[pair] = timestamp
+        if timestamp > self._pair_max_ts.data[pair]:
+            self._pair_max_ts.data[pair] = timestamp
+        self._pair_last_edge.data[pair] = edge
+        return pair
+
+    def _lookup_pair(self, key: int) -> Optional[int]:
+        pair = self._pair_ids.get(key)
+        if pair is None and len(self._pair_index_keys):
+            position = int(self._pair_index_keys.searchsorted(key))
+            if position < len(self._pair_index_keys) and self._pair_index_keys[position] == key:
+                return int(self._pair_index_ids[position])
+        return pair
+
+    def _update_out_stats(self, node: int, amount: float):
+        count = self._out_count.data[node] + 1
+        delta = amount - self._out_mean.data[node]
+        self._out_count.data[node] = count
+        self._out_mean.data[node] += delta / count
+        self._out_m2.data[node] += delta * (amount - self._out_mean.data[node])
+
+    def number_of_edges(self) -> int:
+        return self._src.size
+
+    # Retenção
+
+    def add_eviction_listener(self, callback):
+        """Registra uma função chamada após cada evicção (ex.: invalidar caches)"""
+        self._eviction_listeners.append(callback)
+
+    def _retention_cutoff(self) -> Optional[int]:
+        """Primeira faixa de tempo que ainda está dentro da janela"""
+        if self.retention_seconds is None or self._latest_timestamp is None:
+            return None
+        return (self._latest_timestamp - self.retention_seconds) // self.bucket_seconds
+
+    def admits(self, timestamp: int) -> bool:
+        """Se uma aresta com este timestamp entra no grafo (contabiliza as recusas)
+
+        Recusa timestamps além de agora + ``max_clock_skew`` e os anteriores à
+        primeira faixa da janela de retenção: uma aresta velha seria removida
+        pela próxima evicção, então não vale uma compactação completa.
+        """
+        if self.max_clock_skew is not None and timestamp > time.time() + self.max_clock_skew:
+            self.rejection_stats['rejected_future'] += 1
+            return False
+        cutoff = self._retention_cutoff()
+        if cutoff is not None and timestamp // self.bucket_seconds < cutoff:
+            self.rejection_stats['rejected_stale'] += 1
+            return False
+        return True
+
+    def _retention_due(self) -> bool:
+        if self.max_edges is not None and self._src.size > self.max_edges:
+            return True
+        cutoff = self._retention_cutoff()
+        return cutoff is not None and self._oldest_bucket is not None and self._oldest_bucket < cutoff
+
+    def evict(self) -> int:
+        """Aplica a política de retenção agora; devolve quantas arestas saíram"""
+        before = self._src.size
+        self._evict()
+        return before - self._src.size
+
+    def _retention_keep(self, timestamps: Optional[np.ndarray] = None, cutoff: Optional[int] = None,
+                        oldest_bucket: Optional[int] = None) -> Optional[np.ndarray]:
+        """Máscara das arestas que a política de retenção mantém (None se nenhuma sai)
+
+        Sem argumentos usa o estado atual; a compactação em segundo plano passa
+        a vista dos timestamps, o corte e a faixa mais antiga lidos sob a trava.
+        """
+        if timestamps is None:
+            timestamps = self._timestamp.view()
+            cutoff, oldest_bucket = self._retention_cutoff(), self._oldest_bucket
+        n_edges = len(timestamps)
+        if not n_edges:
+            return None
+
+        keep = np.ones(n_edges, dtype=bool)
+        # Janela de tempo: faixas inteiras anteriores ao corte saem juntas
+        if cutoff is not None and oldest_bucket is not None and oldest_bucket < cutoff:
+            keep &= timestamps // self.bucket_seconds >= cutoff
+        # Orçamento: mantém as arestas mais recentes até 90% do limite (folga evita compactar a cada inserção)
+        if self.max_edges is not None and np.count_nonzero(keep) > self.max_edges:
+            target = int(self.max_edges * 0.9)
+            candidates = np.flatnonzero(keep)
+            oldest_first = candidates[np.argsort(timestamps[candidates], kind='stable')]
+            keep[oldest_first[:len(candidates) - target]] = False
+        return None if keep.all() else keep
+
+    def _evict(self) -> Optional[np.ndarray]:
+        keep = self._retention_keep()
+        if keep is None:
+            return None
+
+        started = time.time()
+        evicted_edges, evicted_nodes = self._compact(keep)
+        self._record_eviction(started, evicted_edges, evicted_nodes)
+        for callback in self._eviction_listeners:
+            callback()
+        return keep
+
+    def _record_eviction(self, started: float, evicted_edges: int, evicted_nodes: int,
+                         lock_seconds: Optional[float] = None):
+        elapsed = time.time() - started
+        self.eviction_stats['evictions'] += 1
+        self.eviction_stats['evicted_edges'] += evicted_edges
+        self.eviction_stats['evicted_nodes'] += evicted_nodes
+        self.eviction_stats['last_eviction_seconds'] = round(elapsed, 4)
+        # Quanto da evicção a inserção (ou a thread, sob a trava) ficou bloqueando o grafo
+        self.eviction_stats['last_eviction_lock_seconds'] = round(
+            elapsed if lock_seconds is None else lock_seconds, 4)
+
+    def enable_background_compaction(self, lock):
+        """Passa a compactar numa thread, segurando ``lock`` (a trava do dono do grafo) só na troca
+
+        A inserção que vence a janela ou o orçamento apenas agenda a
+        compactação e continua; até a troca o grafo mantém as arestas que vão
+        sair. ``evict`` e ``add_transactions_bulk`` continuam síncronos.
+        """
+        self._compaction_lock = lock
+
+    def _schedule_compaction(self):
+        # Chamado sob a trava; no máximo uma compactação por vez. Uma thread que não está
+        # viva veio do processo pai num fork e nunca vai terminar de limpar a referência
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self._compact_in_background,
+                                                   name='graph-compaction', daemon=True)
+        self._compaction_thread.start()
+
+    def _edge_columns(self) -> Dict[str, np.ndarray]:
+        """Vistas das colunas de arestas, estáveis enquanto novas arestas são acrescentadas"""
+        return {
+            'src': self._src.view(),
+            'dst': self._dst.view(),
+            'amount': self._amount.view(),
+            'timestamp': self._timestamp.view(),
+            'tx_id': self._tx_id.view(),
+            'tx_hash_bytes': self._tx_hashes.buffer.view(),
+            'tx_hash_offsets': self._tx_hashes.offsets.view()
+        }
+
+    def _compact_in_background(self):
+        lock = self._compaction_lock
+        started = time.time()
+        try:
+            with lock:
+                generation = self._compaction_generation
+                n_edges, n_nodes = self._src.size, len(self._addresses)
+                columns = self._edge_columns()
+                cutoff, oldest_bucket = self._retention_cutoff(), self._oldest_bucket
+
+            keep = self._retention_keep(columns['timestamp'], cutoff, oldest_bucket)
+            state = None if keep is None else _compacted_state(columns, keep, n_nodes, self.bucket_seconds)
+
+            with lock:
+                if state is None:
+                    return
+                if generation != self._compaction_generation:
+                    # Uma compactação síncrona (evict/lote) trocou as colunas nesse meio-tempo
+                    self.eviction_stats['discarded_compactions'] += 1
+                    return
+                locked = time.time()
+                evicted_edges, evicted_nodes = self._install_compaction(state, n_edges, n_nodes)
+                self._record_eviction(started, evicted_edges, evicted_nodes, time.time() - locked)
+                self.eviction_stats['background_compactions'] += 1
+                for callback in self._eviction_listeners:
+                    callback()
+        except Exception as e:
+            logging.error(f"Background graph compaction failed: {e}")
+        finally:
+            with lock:
+                self._compaction_thread = None
+
+    @property
+    def compaction_generation(self) -> int:
+        """Muda a cada compactação instalada (IDs de arestas antigos deixam de valer)"""
+        return self._compaction_generation
+
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        """Espera a compactação em segundo plano em andamento (não chamar segurando a trava)"""
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def add_transactions_bulk(self, src: np.ndarray, dst: np.ndarray, amount: np.ndarray,
+                              timestamp: np.ndarray, tx_hash_bytes: np.ndarray, tx_hash_offsets: np.ndarray,
+                              risk_flags: Optional[Dict[int, List[str]]] = None) -> int:
+        """Insere um lote colunar de arestas entre nós já internados (``add_node``)
+
+        Linhas além de agora + ``max_clock_skew`` são descartadas; as antigas
+        entram e saem pela retenção, junto com a compactação do lote.
+
+        ``tx_hash_bytes``/``tx_hash_offsets`` seguem o formato de
+        ``_StringColumn`` (offsets começando em 0, um a mais que as arestas) e
+        ``risk_flags`` é indexado pela posição no lote. Agregados por par,
+        estatísticas de saída e índices CSR são refeitos de uma vez sobre o
+        grafo inteiro, pelo mesmo caminho da compactação, junto com a
+        retenção: o custo é proporcional ao grafo, então é feito para cargas
+        em massa. Os listeners de evicção são chamados, pois IDs de arestas e
+        agregados mudam. Devolve quantas arestas do lote ficaram no grafo.
+        """
+        timestamp = np.asarray(timestamp, dtype=np.int64)
+        if self.max_clock_skew is not None:
+            admitted = timestamp <= time.time() + self.max_clock_skew
+            if not admitted.all():
+                # Linhas no futuro saem do lote, com seus hashes e flags
+                self.rejection_stats['rejected_future'] += int(np.count_nonzero(~admitted))
+                lengths = np.diff(tx_hash_offsets)
+                tx_hash_bytes = np.asarray(tx_hash_bytes)[np.repeat(admitted, lengths)]
+                tx_hash_offsets = np.concatenate([[0], np.cumsum(lengths[admitted])])
+                positions = np.cumsum(admitted) - 1
+                risk_flags = {int(positions[row]): flags for row, flags in (risk_flags or {}).items()
+                              if admitted[row]}
+                src, dst, amount, timestamp = (np.asarray(column)[admitted]
+                                               for column in (src, dst, amount, timestamp))
+        n_new = len(src)
+        if not n_new:
+            return 0
+        first_edge = self._src.size
+        first_hash = len(self._tx_hashes)
+
+        self._src.extend(np.asarray(src, dtype=NODE_DTYPE))
+        self._dst.extend(np.asarray(dst, dtype=NODE_DTYPE))
+        self._amount.extend(np.asarray(amount, dtype=np.float64))
+        self._timestamp.extend(np.asarray(timestamp, dtype=np.int64))
+        self._tx_id.extend(np.arange(first_hash, first_hash + n_new, dtype=EDGE_DTYPE))
+        base = self._tx_hashes.buffer.size
+        self._tx_hashes.buffer.extend(tx_hash_bytes)
+        self._tx_hashes.offsets.extend(np.asarray(tx_hash_offsets[1:], dtype=np.int64) + base)
+        self._edge_pair.extend(np.zeros(n_new, dtype=EDGE_DTYPE))
+        for row, flags in (risk_flags or {}).items():
+            self._risk_flags[first_edge + row] = list(flags)
+
+        latest = int(np.max(timestamp))
+        oldest_bucket = int(np.min(timestamp)) // self.bucket_seconds
+        if self._latest_timestamp is None or latest > self._latest_timestamp:
+            self._latest_timestamp = latest
+        if self._oldest_bucket is None or oldest_bucket < self._oldest_bucket:
+            self._oldest_bucket = oldest_bucket
+
+        started = time.time()
+        keep = self._retention_keep()
+        evicted = keep is not None
+        if keep is None:
+            keep = np.ones(self._src.size, dtype=bool)
+        evicted_edges, evicted_nodes = self._compact(keep)
+        if evicted:
+            self._record_eviction(started, evicted_edges, evicted_nodes)
+        for callback in self._eviction_listeners:
+            callback()
+        return int(np.count_nonzero(keep[first_edge:]))
+
+    def _compact(self, keep: np.ndarray):
+        """Remove as arestas fora de ``keep`` e reconstrói agregados e índices"""
+        n_nodes = len(self._addresses)
+        state = _compacted_state(self._edge_columns(), keep, n_nodes, self.bucket_seconds)
+        return self._install_compaction(state, self._src.size, n_nodes)
+
+    def _install_compaction(self, state: Dict[str, np.ndarray], n_edges: int, n_nodes: int):
+        """Troca colunas, agregados e índices pelos de ``state`` (calculado sobre as ``n_edges``
+        primeiras arestas e ``n_nodes`` primeiros nós) e reaplica as arestas inseridas depois"""
+        # Arestas que entraram durante a compactação em segundo plano (nenhuma no caminho síncrono)
+        total = self._src.size
+        offsets, buffer = self._tx_hashes.offsets.data, self._tx_hashes.buffer.data
+        delta = list(zip(
+            self._src.data[n_edges:total].tolist(), self._dst.data[n_edges:total].tolist(),
+            self._amount.data[n_edges:total].tolist(), self._timestamp.data[n_edges:total].tolist(),
+            [buffer[offsets[tx]:offsets[tx + 1]].tobytes() for tx in self._tx_id.data[n_edges:total].tolist()],
+            [self._risk_flags.get(edge) for edge in range(n_edges, total)]
+        ))
+        remap = state['remap']
+        self._risk_flags = {int(remap[edge]): flags for edge, flags in self._risk_flags.items()
+                            if edge < n_edges and remap[edge] >= 0}
+        self._compaction_generation += 1
+
+        src, timestamp = state['src'], state['timestamp']
+        n_kept, spare = len(src), len(delta)
+        self._src.replace(src, spare)
+        self._dst.replace(state['dst'], spare)
+        self._amount.replace(state['amount'], spare)
+        self._timestamp.replace(timestamp, spare)
+        self._tx_id.replace(np.arange(n_kept, dtype=EDGE_DTYPE), spare)
+        self._tx_hashes = state['tx_hashes']
+
+        # Agregados por par
+        self._edge_pair.replace(state['edge_pair'], spare)
+        # np.unique devolve as chaves ordenadas: o ID do par é a própria posição
+        pair_keys = state['pair_keys']
+        self._pair_ids = {}
+        self._pair_index_keys = pair_keys
+        self._pair_index_ids = np.arange(len(pair_keys), dtype=EDGE_DTYPE)
+        self._pair_src.replace(state['pair_src'])
+        self._pair_dst.replace(state['pair_dst'])
+        self._pair_count.replace(state['pair_count'])
+        self._pair_sum.replace(state['pair_sum'])
+        self._pair_min_ts.replace(state['pair_min_ts'])
+        self._pair_max_ts.replace(state['pair_max_ts'])
+        self._pair_last_edge.replace(state['pair_last_edge'])
+
+        # Estatísticas de saída por nó (nós criados depois do cálculo só têm arestas do delta)
+        n_capacity = len(self._addresses)
+        for column, values in ((self._out_count, state['out_count']), (self._out_mean, state['out_mean']),
+                               (self._out_m2, state['out_m2'])):
+            column.data[:n_nodes] = values
+            column.data[n_nodes:n_capacity] = 0
+
+        # Nós sem nenhuma aresta vão para a lista livre (exceto os que ganharam arestas no delta)
+        delta_nodes = {node for edge in delta for node in edge[:2]}
+        evicted_nodes = 0
+        for node in state['unused_nodes'].tolist():
+            address = self._addresses[node]
+            if address is not None and node not in delta_nodes:
+                del self._node_ids[address]
+                self._addresses[node] = None
+                self._free_nodes.append(node)
+                evicted_nodes += 1
+
+        self._indexed_edges = n_kept
+        self._out_indptr, self._out_order = state['out_indptr'], state['out_order']
+        self._in_indptr, self._in_order = state['in_indptr'], state['in_order']
+        self._pending_out.clear()
+        self._pending_in.clear()
+
+        buckets = state['buckets']
+        self._bucket_counts = dict(zip(buckets.tolist(), state['bucket_counts'].tolist()))
+        self._oldest_bucket = int(buckets[0]) if len(buckets) else None
+
+        for edge in delta:
+            self._append_edge(*edge)
+        return n_edges - n_kept, evicted_nodes
+
+    def number_of_pairs(self) -> int:
+        return self._pair_src.size
+
+    def flush(self):
+        """Mescla as arestas pendentes nos índices CSR"""
+        n_edges = self._src.size
+        if n_edges == self._indexed_edges:
+            return
+
+        first = self._indexed_edges
+        n_nodes = len(self._addresses)
+        self._out_indptr, self._out_order = _merge_csr(
+            self._out_indptr, self._out_order, self._src.data[first:n_edges].astype(EDGE_DTYPE),
+            first, n_nodes
+        )
+        self._in_indptr, self._in_order = _merge_csr(
+            self._in_indptr, self._in_order, self._dst.data[first:n_edges].astype(EDGE_DTYPE),
+            first, n_nodes
+        )
+        self._indexed_edges = n_edges
+        self._pending_out.clear()
+        self._pending_in.clear()
+
+    def _edge_ids(self, node: int, indptr: np.ndarray, order: np.ndarray,
+                  pending: Dict[int, List[int]]) -> np.ndarray:
+        if node + 1 < len(indptr):
+            indexed = order[indptr[node]:indptr[node + 1]]
+        else:
+            indexed = order[:0]
+        extra = pending.get(node)
+        if extra:
+            return np.concatenate([indexed, np.asarray(extra, dtype=EDGE_DTYPE)])
+        return indexed
+
+    def out_edge_ids(self, node: int) -> np.ndarray:
+        """IDs das arestas de saída do nó, em ordem de inserção"""
+        return self._edge_ids(node, self._out_indptr, self._out_order, self._pending_out)
+
+    def in_edge_ids(self, node: int) -> np.ndarray:
+        """IDs das arestas de entrada do nó, em ordem de inserção"""
+        return self._edge_ids(node, self._in_indptr, self._in_order, self._pending_in)
+
+    @staticmethod
+    def _unique_in_order(values: np.ndarray) -> np.ndarray:
+        if len(values) < 2:
+            return values
+        _, first = np.unique(values, return_index=True)
+        return values[np.sort(first)]
+
+    def successor_ids(self, node: int) -> np.ndarray:
+        return self._unique_in_order(self._dst.data[self.out_edge_ids(node)])
+
+    def predecessor_ids(self, node: int) -> np.ndarray:
+        return self._unique_in_order(self._src.data[self.in_edge_ids(node)])
+
+    def successors(self, address: str) -> Iterator[str]:
+        addresses = self._addresses
+        return (addresses[node] for node in self.successor_ids(self._node_ids[address]).tolist())
+
+    def predecessors(self, address: str) -> Iterator[str]:
+        addresses = self._addresses
+        return (addresses[node] for node in self.predecessor_ids(self._node_ids[address]).tolist())
+
+    def pair_edge_ids(self, src: int, dst: int) -> np.ndarray:
+        """Todas as arestas src->dst"""
+        edges = self.out_edge_ids(src)
+        return edges[self._dst.data[edges] == dst]
+
+    def pair_id(self, src: int, dst: int) -> Optional[int]:
+        if src < 0 or dst < 0:
+            return None
+        return self._lookup_pair((src << 32) | dst)
+
+    def out_pair_ids(self, node: int) -> np.ndarray:
+        """Pares de saída do nó, na ordem da primeira transferência"""
+        return self._unique_in_order(self._edge_pair.data[self.out_edge_ids(node)])
+
+    def last_edge(self, src: int, dst: int) -> Optional[int]:
+        pair = self.pair_id(src, dst)
+        return int(self._pair_last_edge.data[pair]) if pair is not None else None
+
+    def out_count(self, node: int) -> int:
+        return int(self._out_count.data[node])
+
+    def out_amount_stats(self, node: int) -> Tuple[int, float, float]:
+        """(quantidade, média, variância) dos valores enviados pelo nó, em O(1)"""
+        count = int(self._out_count.data[node])
+        if not count:
+            return 0, 0.0, 0.0
+        return count, float(self._out_mean.data[node]), float(self._out_m2.data[node] / count)
+
+    def pair_data(self, pair: int) -> Dict:
+        """Dados da última transferência do par + agregados de todas as transferências"""
+        data = self.edge_data(int(self._pair_last_edge.data[pair]))
+        data.update({
+            'count': int(self._pair_count.data[pair]),
+            'total_amount': float(self._pair_sum.data[pair]),
+            'first_timestamp': int(self._pair_min_ts.data[pair]),
+            'last_timestamp': int(self._pair_max_ts.data[pair])
+        })
+        return data
+
+    def pair_stats(self, from_addr: str, to_addr: str) -> Optional[Dict]:
+        pair = self.pair_id(self._node_ids.get(from_addr, -1), self._node_ids.get(to_addr, -1))
+        return self.pair_data(pair) if pair is not None else None
+
+    def tx_hash(self, edge: int) -> str:
+        return self._tx_hashes[int(self._tx_id.data[edge])]
+
+    def edge_data(self, edge: int) -> Dict:
+        return {
+            'amount': float(self._amount.data[edge]),
+            'timestamp': int(self._timestamp.data[edge]),
+            'tx_hash': self.tx_hash(edge),
+            'risk_flags': self._risk_flags.get(int(edge), [])
+        }
+
+    def __getitem__(self, address: str) -> _AdjacencyView:
+        return _AdjacencyView(self, self._node_ids[address])
+
+    # Colunas (somente leitura) para detectores vetorizados
+
+    @property
+    def src(self) -> np.ndarray:
+        return self._src.view()
+
+    @property
+    def dst(self) -> np.ndarray:
+        return self._dst.view()
+
+    @property
+    def amount(self) -> np.ndarray:
+        return self._amount.view()
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._timestamp.view()
+
+    @property
+    def pair_dst(self) -> np.ndarray:
+        return self._pair_dst.view()
+
+    @property
+    def pair_sum(self) -> np.ndarray:
+        return self._pair_sum.view()
+
+    # Travessias
+
+    def reachable(self, address: str, reverse: bool = False) -> Set[int]:
+        """Nós alcançáveis a partir do endereço (ou que o alcançam, com reverse=True)"""
+        start = self._node_ids.get(address)
+        if start is None:
+            return set()
+
+        neighbors = self.predecessor_ids if reverse else self.successor_ids
+        seen = {start}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for neighbor in neighbors(node).tolist():
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return seen
+
+    def subgraph(self, addresses: Iterable[str]) -> nx.DiGraph:
+        """Subgrafo induzido como nx.DiGraph (para algoritmos do networkx em recortes pequenos)"""
+        nodes = {self._node_ids[a] for a in addresses if a in self._node_ids}
+        return self._to_networkx(nodes)
+
+    def to_networkx(self) -> nx.DiGraph:
+        return self._to_networkx(set(self._node_ids.values()))
+
+    def _to_networkx(self, nodes: Set[int]) -> nx.DiGraph:
+        graph = nx.DiGraph()
+        for node in nodes:
+            graph.add_node(self._addresses[node])
+        for node in nodes:
+            pairs = self.out_pair_ids(node)
+            for pair in pairs[np.isin(self._pair_dst.data[pairs], list(nodes))].tolist():
+                # Uma aresta por par, com os agregados de todas as transferências
+                graph.add_edge(self._addresses[node], self._addresses[int(self._pair_dst.data[pair])],
+                               **self.pair_data(pair))
+        return graph
+
+    def get_stats(self) -> Dict:
+        n_edges = self._src.size
+        column_bytes = sum(column.data[:n_edges].nbytes for column in
+                           (self._src, self._dst, self._amount, self._timestamp, self._tx_id,
+                            self._edge_pair))
+        index_bytes = (self._out_indptr.nbytes + self._out_order.nbytes +
+                       self._in_indptr.nbytes + self._in_order.nbytes)
+        return {
+            'nodes': len(self._node_ids),
+            'free_node_ids': len(self._free_nodes),
+            'edges': n_edges,
+            'pairs': self._pair_src.size,
+            'pending_edges': n_edges - self._indexed_edges,
+            'edge_column_bytes': int(column_bytes),
+            'csr_index_bytes': int(index_bytes),
+            'tx_hash_bytes': self._tx_hashes.nbytes,
+            'time_buckets': len(self._bucket_counts),
+            'oldest_timestamp': self._oldest_bucket * self.bucket_seconds if self._oldest_bucket is not None else None,
+            'latest_timestamp': self._latest_timestamp,
+            **self.eviction_stats,
+            **self.rejection_stats
+        }
+
+    # Snapshot
+
+    # Colunas só-append ou substituídas por arrays novos: entram no snapshot como vistas
+    _SHARED_COLUMNS = ('_src', '_dst', '_amount', '_timestamp', '_tx_id', '_edge_pair',
+                       '_pair_src', '_pair_dst')
+    # Colunas alteradas no lugar (agregados e estado por nó): entram como cópia
+    _COPIED_COLUMNS = ('_pair_count', '_pair_sum', '_pair_min_ts', '_pair_max_ts', '_pair_last_edge',
+                       '_risk_score', '_out_count', '_out_mean', '_out_m2')
+
+    def snapshot_state(self) -> Tuple[Dict[str, np.ndarray], Dict, List[Optional[str]]]:
+        """Estado consistente do grafo: (arrays, metadados, tabela de endereços)
+
+        Deve ser chamado sem inserções concorrentes, mas é barato (cópia só
+        dos agregados por par/nó): arestas, hashes e índices CSR são vistas
+        que inserções posteriores não alteram, então a gravação em disco pode
+        acontecer fora da trava.
+        """
+        arrays = {name.lstrip('_'): getattr(self, name).view() for name in self._SHARED_COLUMNS}
+        arrays.update({name.lstrip('_'): getattr(self, name).view().copy() for name in self._COPIED_COLUMNS})
+        arrays.update({
+            'tx_hash_bytes': self._tx_hashes.buffer.view(),
+            'tx_hash_offsets': self._tx_hashes.offsets.view(),
+            'out_indptr': self._out_indptr,
+            'out_order': self._out_order,
+            'in_indptr': self._in_indptr,
+            'in_order': self._in_order,
+            'free_nodes': np.asarray(self._free_nodes, dtype=NODE_DTYPE),
+            'bucket_keys': np.fromiter(self._bucket_counts.keys(), dtype=np.int64, count=len(self._bucket_counts)),
+            'bucket_counts': np.fromiter(self._bucket_counts.values(), dtype=np.int64, count=len(self._bucket_counts))
+        })
+        meta = {
+            'indexed_edges': self._indexed_edges,
+            'bucket_seconds': self.bucket_seconds,
+            'latest_timestamp': self._latest_timestamp,
+            'risk_flags': {str(edge): flags for edge, flags in self._risk_flags.items()},
+            'eviction_stats': dict(self.eviction_stats)
+        }
+        return arrays, meta, list(self._addresses)
+
+    @staticmethod
+    def complete_snapshot(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Acrescenta os índices derivados (busca de pares), calculados fora da trava"""
+        keys = (arrays['pair_src'].astype(np.int64) << 32) | arrays['pair_dst'].astype(np.int64)
+        order = np.argsort(keys, kind='stable').astype(EDGE_DTYPE)
+        return {**arrays, 'pair_index_keys': keys[order], 'pair_index_ids': order}
+
+    @classmethod
+    def from_snapshot(cls, arrays: Dict[str, np.ndarray], meta: Dict,
+                      addresses: List[Optional[str]], **kwargs) -> 'TransactionGraphStore':
+        """Reconstrói o grafo a partir de ``snapshot_state`` sem reinserir arestas
+
+        Os arrays (tipicamente memory-maps copy-on-write) são adotados sem
+        cópia; só os dicionários de endereços e de pares são refeitos.
+        """
+        store = cls(**kwargs)
+        for name in cls._SHARED_COLUMNS + cls._COPIED_COLUMNS:
+            getattr(store, name).attach(arrays[name.lstrip('_')])
+        store._tx_hashes.buffer.attach(arrays['tx_hash_bytes'])
+        store._tx_hashes.offsets.attach(arrays['tx_hash_offsets'])
+        store._out_indptr, store._out_order = arrays['out_indptr'], arrays['out_order']
+        store._in_indptr, store._in_order = arrays['in_indptr'], arrays['in_order']
+
+        store._addresses = list(addresses)
+        store._node_ids = dict(zip(store._addresses, range(len(store._addresses))))
+        store._node_ids.pop(None, None)
+        store._free_nodes = arrays['free_nodes'].tolist()
+        if 'pair_index_keys' not in arrays:
+            arrays = cls.complete_snapshot(arrays)
+        store._pair_index_keys, store._pair_index_ids = arrays['pair_index_keys'], arrays['pair_index_ids']
+        store._risk_flags = {int(edge): flags for edge, flags in meta['risk_flags'].items()}
+        store.eviction_stats.update(meta['eviction_stats'])
+        store._latest_timestamp = meta['latest_timestamp']
+
+        # Arestas gravadas antes do último flush voltam para as listas pendentes
+        store._indexed_edges = meta['indexed_edges']
+        first = store._indexed_edges
+        for edge, (src, dst) in enumerate(zip(store._src.data[first:store._src.size].tolist(),
+                                              store._dst.data[first:store._dst.size].tolist()), first):
+            store._pending_out.setdefault(src, []).append(edge)
+            store._pending_in.setdefault(dst, []).append(edge)
+
+        if meta['bucket_seconds'] == store.bucket_seconds:
+            buckets, counts = arrays['bucket_keys'], arrays['bucket_counts']
+        else:
+            buckets, counts = np.unique(store._timestamp.view() // store.bucket_seconds, return_counts=True)
+        store._bucket_counts = dict(zip(buckets.tolist(), counts.tolist()))
+        store._oldest_bucket = min(store._bucket_counts) if store._bucket_counts else None
+        return store
@@ -0,0 +1,144 @@
+"""
+Manutenção Incremental dos Scores de Padrões
+Guarda o resultado dos detectores por nó e descarta apenas o que uma nova
+aresta pode alterar: o smurfing depende só das saídas do próprio nó, e
+layering/round-tripping de um nó só mudam se ele alcança a origem da aresta
+dentro da profundidade de busca.
+
+A invalidação é preguiçosa: a inserção só carimba a origem com uma geração
+(O(1), sem busca sob a trava do grafo). Cada resultado guarda a fronteira de
+alcance do nó (os nós a até ``propagation_depth`` saltos, calculada junto com
+o resultado) e a geração em que foi calculado; na leitura, ele está sujo se
+algum nó da fronteira foi carimbado depois disso. Uma aresta nova que amplia
+a fronteira sai de um nó que já estava nela, então a fronteira nunca precisa
+ser estendida no lugar: o resultado é recalculado com a fronteira nova.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from advanced_ml.graph_store import NODE_DTYPE, TransactionGraphStore
+
+SMURFING = 'smurfing'
+PATH_PATTERNS = 'paths'  # layering + round-tripping
+
+
+class IncrementalPatternCache:
+    """Cache LRU de resultados de detectores validados por geração dos nós alcançáveis
+
+    Nós cuja fronteira passa de ``max_frontier`` nós (hubs muito conectados)
+    não entram no cache de padrões de caminho: a validação custaria quase o
+    mesmo que recalcular. ``max_frontier_total`` limita a soma das fronteiras
+    guardadas; acima dele saem as entradas menos usadas.
+    """
+
+    def __init__(self, store: TransactionGraphStore, propagation_depth: int,
+                 max_entries: int = 100000, max_frontier: int = 5000, max_frontier_total: int = 5000000):
+        self.store = store
+        self.propagation_depth = propagation_depth
+        self.max_entries = max_entries
+        self.max_frontier = max_frontier
+        self.max_frontier_total = max_frontier_total
+        # Entradas: (resultado, geração do cálculo, fronteira de alcance)
+        self._caches: Dict[str, OrderedDict] = {SMURFING: OrderedDict(), PATH_PATTERNS: OrderedDict()}
+        self._frontier_total = 0
+        # Geração da última aresta inserida a partir de cada nó
+        self._generation = 0
+        self._touched = np.zeros(1024, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidated': 0,
+            'full_invalidations': 0,
+            'uncached_wide': 0
+        }
+
+    def get(self, kind: str, node: int) -> Optional[Dict]:
+        with self._lock:
+            cache = self._caches[kind]
+            entry = cache.get(node)
+            if entry is not None:
+                value, generation, frontier = entry
+                if self._touched_since(frontier, generation):
+                    self._discard(cache, node)
+                    self.stats['invalidated'] += 1
+                    entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            cache.move_to_end(node)
+            self.stats['hits'] += 1
+            return value
+
+    def put(self, kind: str, node: int, value: Dict):
+        # Chamado sob a trava do grafo, logo após o cálculo: a geração atual é a do resultado
+        frontier = np.array([node], dtype=NODE_DTYPE) if kind == SMURFING else self._frontier(node)
+        with self._lock:
+            cache = self._caches[kind]
+            self._discard(cache, node)
+            if frontier is None:
+                self.stats['uncached_wide'] += 1
+                return
+            cache[node] = (value, self._generation, frontier)
+            self._frontier_total += len(frontier)
+            while len(cache) > self.max_entries or self._frontier_total > self.max_frontier_total:
+                self._discard(cache, next(iter(cache)))
+
+    def on_transaction(self, src: int):
+        """Carimba ``src`` com uma nova geração: sujos passam a ser os resultados cuja fronteira o contém"""
+        with self._lock:
+            if src >= len(self._touched):
+                grown = np.zeros(max(src + 1, len(self._touched) * 2), dtype=np.int64)
+                grown[:len(self._touched)] = self._touched
+                self._touched = grown
+            self._generation += 1
+            self._touched[src] = self._generation
+
+    def _touched_since(self, frontier: np.ndarray, generation: int) -> bool:
+        # Nós além do array nunca foram origem de uma aresta inserida
+        frontier = frontier[frontier < len(self._touched)]
+        return bool(len(frontier)) and int(self._touched[frontier].max()) > generation
+
+    def _frontier(self, node: int) -> Optional[np.ndarray]:
+        """Nós a até ``propagation_depth`` saltos de ``node`` (None se passar de ``max_frontier``)"""
+        store = self.store
+        seen = {node}
+        frontier = [node]
+        for _ in range(self.propagation_depth):
+            next_frontier = []
+            for current in frontier:
+                for successor in store.successor_ids(current).tolist():
+                    if successor not in seen:
+                        seen.add(successor)
+                        if len(seen) > self.max_frontier:
+                            return None
+                        next_frontier.append(successor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return np.fromiter(seen, dtype=NODE_DTYPE, count=len(seen))
+
+    def _discard(self, cache: OrderedDict, node: int):
+        entry: Optional[Tuple] = cache.pop(node, None)
+        if entry is not None:
+            self._frontier_total -= len(entry[2])
+
+    def invalidate_all(self):
+        with self._lock:
+            for cache in self._caches.values():
+                self.stats['invalidated'] += len(cache)
+                cache.clear()
+            self._frontier_total = 0
+            self.stats['full_invalidations'] += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            'cached_smurfing': len(self._caches[SMURFING]),
+            'cached_path_patterns': len(self._caches[PATH_PATTERNS]),
+            'cached_frontier_nodes': self._frontier_total,
+            **self.stats
+        }
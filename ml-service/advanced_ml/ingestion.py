@@ -0,0 +1,309 @@
+"""
+Ingestão Contínua de Transações
+Consumidor assíncrono de JSON delimitado por linha (arquivo, socket Unix ou
+fila em memória) que agrupa as transações em micro-lotes (por tamanho ou por
+prazo) e as insere no grafo de uma vez, fora do caminho das consultas. A
+fila é limitada: quando o grafo não acompanha, os leitores param de ler e o
+socket/arquivo segura o produtor (backpressure). Cada linha usa os mesmos
+campos da API de análise:
+
+    {"fromAddress": "0x..", "toAddress": "0x..", "amount": 1.5,
+     "timestamp": 1700000000, "hash": "0x..", "flags": []}
+
+O grafo de destino é o serviço de shards (AML_GRAPH_SHARD_SOCKETS), o único
+que os workers da API consultam ao vivo. ``--standalone`` grava num grafo
+próprio do processo, persistido em AML_GRAPH_SNAPSHOT_DIR: os workers só
+enxergam essas transações ao reiniciar a partir desse snapshot (carga em
+lote, não ingestão contínua ao lado das consultas).
+
+Uso:
+    python -m advanced_ml.ingestion --socket /run/aml-ingest.sock
+    python -m advanced_ml.ingestion --file transactions.ndjson --follow
+    python -m advanced_ml.ingestion --file history.ndjson --standalone
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_shard import GraphShardClient
+
+
+class IngestionError(ValueError):
+    """Linha que não descreve uma transação válida"""
+
+
+def transaction_from_dict(data: Dict, default_from: Optional[str] = None) -> TransactionEdge:
+    """Converte os campos da API em TransactionEdge com tipos validados (timestamp ausente = agora)
+
+    Com ``default_from`` (transações enviadas junto de uma carteira), origem
+    ausente vira a carteira, destino ausente '' e valor ausente 0; sem ele,
+    os três campos são obrigatórios.
+    """
+    try:
+        if default_from is None:
+            from_addr, to_addr, amount = data['fromAddress'], data['toAddress'], data['amount']
+        else:
+            from_addr = data.get('fromAddress', default_from)
+            to_addr = data.get('toAddress', '')
+            amount = data.get('amount', 0)
+        return TransactionEdge(
+            from_addr=str(from_addr),
+            to_addr=str(to_addr),
+            amount=float(amount),
+            timestamp=int(data.get('timestamp') or time.time()),
+            tx_hash=str(data.get('hash', '')),
+            risk_flags=list(data.get('flags') or [])
+        )
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError) as e:
+        raise IngestionError(f"invalid transaction: {e!r}") from e
+
+
+def parse_transaction(line: bytes) -> TransactionEdge:
+    """Converte uma linha JSON em TransactionEdge (timestamp ausente = agora)"""
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise IngestionError(f"invalid transaction line: {e}") from e
+    return transaction_from_dict(data)
+
+
+class TransactionIngestor:
+    """Micro-lotes de transações de várias fontes para ``GraphNeuralNetwork.add_transactions``
+
+    Um lote é inserido quando atinge ``batch_size`` transações ou quando a
+    mais antiga espera ``max_delay`` segundos. A inserção roda numa thread
+    dedicada para o loop continuar lendo enquanto a fila tiver espaço; com a
+    fila cheia (``max_pending``), as fontes aguardam.
+    """
+
+    def __init__(self, graph_nn: GraphNeuralNetwork, batch_size: int = 10000, max_delay: float = 0.05,
+                 max_pending: int = 100000):
+        self.graph_nn = graph_nn
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='graph-ingest')
+        self._stopping = False
+        self._servers: List[asyncio.AbstractServer] = []
+        self.stats = {
+            'received': 0, 'ingested': 0, 'parse_errors': 0, 'failed': 0, 'batches': 0,
+            'backpressure_waits': 0, 'last_batch_size': 0, 'last_batch_seconds': 0.0,
+            'ingest_latency_seconds': 0.0, 'latest_timestamp': None
+        }
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Criada sob demanda para pertencer ao loop em execução
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        return self._queue
+
+    async def put(self, tx: TransactionEdge):
+        """Enfileira uma transação (aguarda se a fila estiver cheia)"""
+        queue = self.queue
+        item = (tx, time.monotonic())
+        self.stats['received'] += 1
+        if queue.full():
+            self.stats['backpressure_waits'] += 1
+            await queue.put(item)
+        else:
+            queue.put_nowait(item)
+
+    async def put_line(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            tx = parse_transaction(line)
+        except IngestionError as e:
+            self.stats['parse_errors'] += 1
+            logging.debug(str(e))
+            return
+        await self.put(tx)
+
+    async def feed_stream(self, reader: asyncio.StreamReader):
+        """Consome linhas até o fim do stream; parar de ler aqui é o que segura o produtor"""
+        while not self._stopping:
+            line = await reader.readline()
+            if not line:
+                return
+            await self.put_line(line)
+
+    async def ingest_file(self, path: str, follow: bool = False, poll_interval: float = 0.5,
+                          chunk_size: int = 1 << 20):
+        """Lê o arquivo em blocos (numa thread); com ``follow``, continua aguardando linhas novas"""
+        loop = asyncio.get_running_loop()
+        pending = b''
+        with open(path, 'rb') as f:
+            while not self._stopping:
+                chunk = await loop.run_in_executor(None, f.read, chunk_size)
+                if not chunk:
+                    if not follow:
+                        break
+                    await asyncio.sleep(poll_interval)
+                    continue
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    await self.put_line(line)
+        # Última linha sem quebra de linha no fim do arquivo
+        await self.put_line(pending)
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        """Aceita produtores num socket Unix; cada conexão envia linhas até fechar"""
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._handle_connection, path)
+        self._servers.append(server)
+        return server
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await self.feed_stream(reader)
+        finally:
+            writer.close()
+
+    async def run(self):
+        """Loop de micro-lotes; retorna após ``stop()`` com a fila esvaziada"""
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), timeout=0.25)
+            except asyncio.TimeoutError:
+                if self._stopping:
+                    return
+                continue
+
+            batch = [first]
+            deadline = first[1] + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(loop, batch)
+
+    async def _flush(self, loop, batch: List[Tuple[TransactionEdge, float]]):
+        edges = [tx for tx, _ in batch]
+        started = time.monotonic()
+        try:
+            await loop.run_in_executor(self._executor, self.graph_nn.add_transactions, edges)
+        except Exception as e:
+            self.stats['failed'] += len(edges)
+            logging.error(f"Batch insert of {len(edges)} transactions failed: {e}")
+            return
+        finished = time.monotonic()
+        self.stats['ingested'] += len(edges)
+        self.stats['batches'] += 1
+        self.stats['last_batch_size'] = len(edges)
+        self.stats['last_batch_seconds'] = round(finished - started, 4)
+        # Tempo desde a recepção da transação mais antiga do lote até ela estar no grafo
+        self.stats['ingest_latency_seconds'] = round(finished - batch[0][1], 4)
+        latest = max(tx.timestamp for tx in edges)
+        if self.stats['latest_timestamp'] is None or latest > self.stats['latest_timestamp']:
+            self.stats['latest_timestamp'] = latest
+
+    def stop(self):
+        """Para de aceitar dados; ``run()`` termina depois de inserir o que já está na fila"""
+        self._stopping = True
+        for server in self._servers:
+            server.close()
+
+    def get_stats(self) -> Dict:
+        latest = self.stats['latest_timestamp']
+        return {
+            **self.stats,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'queue_capacity': self.max_pending,
+            # Atraso em tempo de evento: quanto o grafo está atrás do relógio
+            'lag_seconds': round(time.time() - latest, 3) if latest is not None else None
+        }
+
+
+async def _report(ingestor: TransactionIngestor, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logging.info(f"Ingestion stats: {json.dumps(ingestor.get_stats())}")
+
+
+async def _run(args, graph_nn: GraphNeuralNetwork):
+    ingestor = TransactionIngestor(graph_nn, batch_size=args.batch_size, max_delay=args.max_delay_ms / 1000,
+                                   max_pending=args.max_pending)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, ingestor.stop)
+
+    batcher = asyncio.create_task(ingestor.run())
+    reporter = asyncio.create_task(_report(ingestor, args.report_interval))
+    if args.socket:
+        await ingestor.serve_unix(args.socket)
+        logging.info(f"Ingesting transactions from unix socket {args.socket}")
+    if args.file:
+        await ingestor.ingest_file(args.file, follow=args.follow)
+        if not args.follow and not args.socket:
+            ingestor.stop()
+    await batcher
+    reporter.cancel()
+    logging.info(f"Ingestion finished: {json.dumps(ingestor.get_stats())}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream newline-delimited JSON transactions into the graph')
+    parser.add_argument('--socket', default=os.getenv('AML_INGEST_SOCKET'))
+    parser.add_argument('--file')
+    parser.add_argument('--follow', action='store_true', help='Keep reading lines appended to --file')
+    parser.add_argument('--batch-size', type=int, default=int(os.getenv('AML_INGEST_BATCH_SIZE', '10000')))
+    parser.add_argument('--max-delay-ms', type=float, default=float(os.getenv('AML_INGEST_MAX_DELAY_MS', '50')))
+    parser.add_argument('--max-pending', type=int, default=int(os.getenv('AML_INGEST_MAX_PENDING', '100000')))
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    parser.add_argument('--standalone', action='store_true',
+                        help='Without graph shards: build a private graph persisted to AML_GRAPH_SNAPSHOT_DIR; '
+                             'API workers only see it after restarting from that snapshot')
+    args = parser.parse_args(argv)
+    if not args.socket and not args.file:
+        parser.error('one of --socket or --file is required')
+
+    shard_client = GraphShardClient.from_env()
+    snapshot_dir = os.getenv('AML_GRAPH_SNAPSHOT_DIR')
+    if shard_client is None and not args.standalone:
+        parser.error('AML_GRAPH_SHARD_SOCKETS is not set: API workers would never see the ingested transactions. '
+                     'Start the graph shard service, or pass --standalone to build a snapshot offline')
+    if shard_client is None and not snapshot_dir:
+        parser.error('--standalone requires AML_GRAPH_SNAPSHOT_DIR (the graph would be lost on exit)')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Grafo de destino: o serviço de shards; em modo standalone, um grafo próprio persistido em snapshots
+    graph_nn = GraphNeuralNetwork(os.getenv('AML_LICENSE_KEY', 'demo_license_2024'))
+    if shard_client is not None:
+        graph_nn.use_shards(shard_client)
+    else:
+        logging.warning(f"Standalone ingestion into {snapshot_dir}: API workers see these transactions "
+                        f"only after restarting from this snapshot")
+        graph_nn.enable_persistence(snapshot_dir, interval=float(os.getenv('AML_GRAPH_SNAPSHOT_INTERVAL', '300')))
+
+    asyncio.run(_run(args, graph_nn))
+    if graph_nn.persistence is not None:
+        graph_nn.persistence.save(graph_nn.graph)
+        graph_nn.persistence.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Motor de Detecção de Layering
+DFS iterativa (pilha explícita, sem recursão nem cópia de caminhos) sobre as
+transferências a partir de um endereço. Cada salto precisa ocorrer depois do
+anterior e dentro da janela de tempo da cadeia. O resultado de cada estado
+(transferência de chegada, profundidade, prazo) é memorizado durante a
+consulta, de modo que sub-caminhos compartilhados são avaliados uma única vez.
+O número de estados explorados é limitado e o corte é reportado.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from advanced_ml.graph_store import TransactionGraphStore
+
+# Resumo de um estado: (cadeias que qualificam abaixo dele, amostras das mais longas)
+_EMPTY_SUMMARY: Tuple[int, List] = (0, [])
+
+
+class _Frame:
+    __slots__ = ('node', 'hops', 'prev_amount', 'deadline', 'edges', 'index',
+                 'key', 'count', 'chains', 'pending')
+
+    def __init__(self, node: int, hops: int, prev_amount: float, deadline: Optional[int],
+                 edges: List[int], key: Optional[Tuple]):
+        self.node = node
+        self.hops = hops
+        self.prev_amount = prev_amount
+        self.deadline = deadline
+        self.edges = edges
+        self.index = 0
+        self.key = key
+        self.count = 0
+        self.chains: List[Tuple[Tuple[int, ...], float]] = []
+        self.pending = None
+
+
+def find_layering_chains(store: TransactionGraphStore, address: str, max_depth: int = 5,
+                         min_hops: int = 3, max_time_window: Optional[int] = None,
+                         amount_variance_threshold: float = 0.1, fee_rate: float = 0.05,
+                         max_paths: int = 20000, max_chains: int = 20) -> Dict:
+    """Cadeias de layering a partir do endereço
+
+    Um salto qualifica quando o caminho tem pelo menos ``min_hops`` nós e o
+    valor transferido fica a menos de ``amount_variance_threshold`` do valor
+    do salto anterior descontada a taxa ``fee_rate``. Devolve a contagem total
+    de cadeias e até ``max_chains`` exemplos (as mais longas) como tuplas de
+    IDs de nós, com a retenção de valor do último salto.
+    """
+    result = {'chains': [], 'chain_count': 0, 'truncated': False, 'explored_paths': 0}
+    start = store.node_id(address)
+    if start is None:
+        return result
+
+    dst, timestamps, amounts = store.dst, store.timestamp, store.amount
+    timed = max_time_window is not None
+    memo: Dict[Tuple, Tuple[int, List]] = {}
+
+    def next_edges(node: int, arrived_at: Optional[int], deadline: Optional[int], hops: int) -> List[int]:
+        if hops >= max_depth:
+            return []
+        edges = store.out_edge_ids(node)
+        if timed and arrived_at is not None:
+            edge_ts = timestamps[edges]
+            edges = edges[(edge_ts >= arrived_at) & (edge_ts <= deadline)]
+        return edges.tolist()
+
+    def merge(frame: _Frame, summary: Tuple[int, List], own: Optional[Tuple]):
+        count, chains = summary
+        frame.count += count + (1 if own else 0)
+        candidates = [((frame.node,) + suffix, retention) for suffix, retention in chains]
+        if own:
+            candidates.append(own)
+        if candidates:
+            merged = frame.chains + candidates
+            merged.sort(key=lambda chain: len(chain[0]), reverse=True)
+            frame.chains = merged[:max_chains]
+
+    root = _Frame(start, 0, 0.0, None, next_edges(start, None, None, 0), None)
+    stack = [root]
+    root_summary = _EMPTY_SUMMARY
+
+    while stack:
+        frame = stack[-1]
+        if frame.index >= len(frame.edges):
+            stack.pop()
+            summary = (frame.count, frame.chains)
+            if frame.key is not None:
+                memo[frame.key] = summary
+            if stack:
+                parent = stack[-1]
+                merge(parent, summary, parent.pending)
+                parent.pending = None
+            else:
+                root_summary = summary
+            continue
+
+        edge = frame.edges[frame.index]
+        frame.index += 1
+        neighbor = int(dst[edge])
+        hops = frame.hops + 1
+        amount = float(amounts[edge])
+
+        own = None
+        if hops + 1 >= min_hops and frame.prev_amount > 0:
+            expected = frame.prev_amount * (1 - fee_rate)
+            if abs(amount - expected) / expected < amount_variance_threshold:
+                own = ((frame.node, neighbor), amount / frame.prev_amount)
+
+        # O prazo da cadeia é fixado pela primeira transferência
+        deadline = frame.deadline
+        if timed and frame.hops == 0:
+            deadline = int(timestamps[edge]) + max_time_window
+
+        key = (edge, hops, deadline)
+        summary = memo.get(key)
+        if summary is not None:
+            merge(frame, summary, own)
+            continue
+        if result['explored_paths'] >= max_paths:
+            result['truncated'] = True
+            merge(frame, _EMPTY_SUMMARY, own)
+            continue
+
+        result['explored_paths'] += 1
+        child_edges = next_edges(neighbor, int(timestamps[edge]), deadline, hops)
+        if not child_edges:
+            memo[key] = _EMPTY_SUMMARY
+            merge(frame, _EMPTY_SUMMARY, own)
+            continue
+        frame.pending = own
+        stack.append(_Frame(neighbor, hops, amount, deadline, child_edges, key))
+
+    result['chain_count'], result['chains'] = root_summary
+    return result
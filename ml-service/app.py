@@ -1,90 +1,146 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-import joblib
+import logging
 import os
+from ml_engine.features import FEATURE_SCHEMA
+from ml_engine.forest import CompiledForest
+from ml_engine.registry import ModelRegistry
+
+LEGACY_MODEL_PATH = 'aml_model.pkl'
 
 app = Flask(__name__)
 CORS(app)
 
 # Simple ML model for AML risk detection
 class AMLRiskModel:
-    def __init__(self):
-        self.model = None
-        self.load_or_train_model()
+    def __init__(self, registry=None):
+        self.registry = registry or ModelRegistry()
+        self.engine = None
+        self.manifest = None
+        self.ready = False
+        self.load_model()
     
-    def load_or_train_model(self):
-        model_path = 'aml_model.pkl'
-        
-        if os.path.exists(model_path):
-            self.model = joblib.load(model_path)
+    def load_model(self):
+        """Load the active model version; training is an offline step (train_model.py)"""
+        if self.registry.current_version():
+            # Arrays are memory-mapped, so pre-forked workers share one page-cached copy
+            self.engine, self.manifest = self.registry.load()
+            if self.manifest['feature_schema'] != FEATURE_SCHEMA:
+                raise RuntimeError(
+                    f"Model {self.manifest['version']} was trained on a different feature schema"
+                )
+        elif os.path.exists(LEGACY_MODEL_PATH):
+            import joblib
+            logging.warning(
+                'No published model in %s, falling back to %s. '
+                'Run `python train_model.py --from-pickle %s` to publish it.',
+                self.registry.root, LEGACY_MODEL_PATH, LEGACY_MODEL_PATH
+            )
+            self.engine = CompiledForest.from_sklearn(joblib.load(LEGACY_MODEL_PATH))
+            self.manifest = {'version': 'legacy-pickle', 'feature_schema': FEATURE_SCHEMA}
         else:
-            # Train simple model with synthetic data
-            X_train = np.random.rand(1000, 5)  # 5 features
-            y_train = (X_train[:, 0] * 100 > 50).astype(int)  # Simple rule
-            
-            self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-            self.model.fit(X_train, y_train)
-            joblib.dump(self.model, model_path)
+            raise RuntimeError(
+                f"No model found in {self.registry.root}. Run `python train_model.py` first."
+            )
+    
+    def warmup(self):
+        """Score a synthetic batch so every model page is touched before serving traffic"""
+        self.predict_batch([
+            {'amount': amount, 'fromAddress': '0x' + '0' * 40, 'flags': []}
+            for amount in (0.5, 999, 10000, 75000)
+        ])
+        self.ready = True
     
     def extract_features(self, transaction):
         """Extract features from transaction"""
-        amount = float(transaction.get('amount', 0))
+        return self.extract_features_batch([transaction])
+    
+    def extract_amounts(self, transactions):
+        """Parse transaction amounts into a float vector"""
+        return np.fromiter((float(tx.get('amount', 0)) for tx in transactions),
+                           dtype=np.float64, count=len(transactions))
+    
+    def extract_features_batch(self, transactions, amounts=None):
+        """Extract features for N transactions into a single (N, 5) matrix"""
+        count = len(transactions)
+        if amounts is None:
+            amounts = self.extract_amounts(transactions)
         
-        # Feature engineering
-        features = [
-            amount / 10000,  # Normalized amount
-            1 if amount > 10000 else 0,  # High value flag
-            1 if amount % 1000 == 0 else 0,  # Round number flag
-            len(transaction.get('fromAddress', '')),  # Address complexity
-            len(transaction.get('flags', []))  # Existing flags count
-        ]
+        # Feature engineering (same columns as the single-transaction path)
+        features = np.empty((count, 5), dtype=np.float64)
+        features[:, 0] = amounts / 10000  # Normalized amount
+        features[:, 1] = amounts > 10000  # High value flag
+        features[:, 2] = amounts % 1000 == 0  # Round number flag
+        features[:, 3] = np.fromiter((len(tx.get('fromAddress', '')) for tx in transactions),
+                                     dtype=np.float64, count=count)  # Address complexity
+        features[:, 4] = np.fromiter((len(tx.get('flags', [])) for tx in transactions),
+                                     dtype=np.float64, count=count)  # Existing flags count
         
-        return np.array(features).reshape(1, -1)
+        return features
     
     def predict(self, transaction):
-        features = self.extract_features(transaction)
-        risk_prob = self.model.predict_proba(features)[0][1]
+        return self.predict_batch([transaction])[0]
+    
+    def predict_batch(self, transactions):
+        """Score N transactions with a single predict_proba call"""
+        if not transactions:
+            return []
         
-        # Calculate risk score (0-100)
-        risk_score = int(risk_prob * 100)
+        amounts = self.extract_amounts(transactions)
+        features = self.extract_features_batch(transactions, amounts)
+        risk_probs = self.engine.predict_proba(features)[:, 1]
         
-        # Determine risk level
-        if risk_score >= 70:
-            risk_level = 'CRITICAL'
-        elif risk_score >= 50:
-            risk_level = 'HIGH'
-        elif risk_score >= 30:
-            risk_level = 'MEDIUM'
-        else:
-            risk_level = 'LOW'
+        # Calculate risk score (0-100)
+        risk_scores = (risk_probs * 100).astype(int)
         
         # Generate flags
-        flags = []
-        amount = float(transaction.get('amount', 0))
+        flag_columns = [
+            ('HIGH_VALUE', amounts > 50000),
+            ('MEDIUM_VALUE', amounts > 10000),
+            ('ROUND_AMOUNT', amounts % 1000 == 0),
+            ('ML_HIGH_RISK', risk_probs > 0.7),
+        ]
         
-        if amount > 50000:
-            flags.append('HIGH_VALUE')
-        if amount > 10000:
-            flags.append('MEDIUM_VALUE')
-        if amount % 1000 == 0:
-            flags.append('ROUND_AMOUNT')
-        if risk_prob > 0.7:
-            flags.append('ML_HIGH_RISK')
+        results = []
+        for i in range(len(transactions)):
+            risk_score = int(risk_scores[i])
+            results.append({
+                'riskScore': risk_score,
+                'riskLevel': risk_level_for(risk_score),
+                'flags': [flag for flag, mask in flag_columns if mask[i]],
+                'confidence': float(risk_probs[i])
+            })
         
-        return {
-            'riskScore': risk_score,
-            'riskLevel': risk_level,
-            'flags': flags,
-            'confidence': float(risk_prob)
-        }
+        return results
+
+def risk_level_for(risk_score):
+    """Determine risk level"""
+    if risk_score >= 70:
+        return 'CRITICAL'
+    elif risk_score >= 50:
+        return 'HIGH'
+    elif risk_score >= 30:
+        return 'MEDIUM'
+    return 'LOW'
 
 model = AMLRiskModel()
+model.warmup()
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'ok', 'service': 'ml-aml', 'version': '1.0.0'})
+    return jsonify({
+        'status': 'ok',
+        'service': 'ml-aml',
+        'version': '1.0.0',
+        'model_version': model.manifest['version']
+    })
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    if not model.ready:
+        return jsonify({'ready': False}), 503
+    return jsonify({'ready': True, 'model_version': model.manifest['version']})
 
 @app.route('/analyze/transaction', methods=['POST'])
 def analyze_transaction():
@@ -95,6 +151,31 @@ def analyze_transaction():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/analyze/transactions/batch', methods=['POST'])
+def analyze_transactions_batch():
+    try:
+        data = request.json
+        transactions = data.get('transactions', [])
+        
+        if not isinstance(transactions, list):
+            return jsonify({'error': 'transactions must be a list'}), 400
+        
+        invalid = [i for i, tx in enumerate(transactions) if not isinstance(tx, dict)]
+        if invalid:
+            return jsonify({'error': 'transactions must be objects', 'invalid_indices': invalid}), 400
+        
+        try:
+            results = model.predict_batch(transactions)
+        except (TypeError, ValueError) as e:
+            # Bad field values (non-numeric amount, non-list flags) are a client error
+            return jsonify({'error': f'invalid transaction: {e}'}), 400
+        return jsonify({
+            'results': results,
+            'count': len(results)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/analyze/wallet', methods=['POST'])
 def analyze_wallet():
     try:
@@ -108,13 +189,11 @@ def analyze_wallet():
                 'flags': []
             })
         
-        # Analyze all transactions
-        scores = []
+        # Analyze all transactions in one batch
+        results = model.predict_batch(transactions)
+        scores = np.array([result['riskScore'] for result in results])
         all_flags = set()
-        
-        for tx in transactions:
-            result = model.predict(tx)
-            scores.append(result['riskScore'])
+        for result in results:
             all_flags.update(result['flags'])
         
         # Aggregate risk
@@ -124,18 +203,9 @@ def analyze_wallet():
         # Wallet risk is weighted average
         wallet_risk = int(avg_score * 0.6 + max_score * 0.4)
         
-        if wallet_risk >= 70:
-            risk_level = 'CRITICAL'
-        elif wallet_risk >= 50:
-            risk_level = 'HIGH'
-        elif wallet_risk >= 30:
-            risk_level = 'MEDIUM'
-        else:
-            risk_level = 'LOW'
-        
         return jsonify({
             'riskScore': wallet_risk,
-            'riskLevel': risk_level,
+            'riskLevel': risk_level_for(wallet_risk),
             'flags': list(all_flags)
         })
     except Exception as e:
@@ -0,0 +1,330 @@
+"""
+Carga histórica do grafo de transações
+Lê exportações de cadeia (CSV, JSONL ou Parquet) em blocos, interpreta cada
+bloco com pandas em todos os núcleos e insere as arestas no grafo de forma
+colunar, de uma vez, gravando um snapshot no fim. Rótulos de entidade
+presentes na exportação podem ser gravados como lista para o índice de
+entidades (AML_ENTITY_SOURCES).
+
+Colunas aceitas (primeiro nome encontrado): origem ``fromAddress``/
+``from_address``/``from``, destino ``toAddress``/``to_address``/``to``,
+valor ``amount``/``value``, tempo ``timestamp``/``block_timestamp``
+(segundos Unix ou data ISO), hash ``hash``/``transaction_hash``/``tx_hash``
+e, opcionalmente, ``from_entity``/``to_entity``.
+
+Uso:
+    python backfill.py /data/exports/2024-*.csv --snapshot-dir /data/graph
+    python backfill.py exports/ --snapshot-dir /data/graph --workers 16 --entity-output /data/entities/backfill.csv
+"""
+
+import argparse
+import csv
+import glob
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from advanced_ml.graph_snapshot import GraphSnapshotter
+from advanced_ml.graph_store import TransactionGraphStore, store_config_from_env
+
+INPUT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+
+COLUMN_ALIASES = {
+    'from': ('fromAddress', 'from_address', 'from'),
+    'to': ('toAddress', 'to_address', 'to'),
+    'amount': ('amount', 'value'),
+    'timestamp': ('timestamp', 'block_timestamp'),
+    'hash': ('hash', 'transaction_hash', 'tx_hash'),
+    'from_entity': ('from_entity', 'fromEntity'),
+    'to_entity': ('to_entity', 'toEntity'),
+}
+REQUIRED_COLUMNS = ('from', 'to', 'amount')
+
+
+class BackfillError(ValueError):
+    """Entrada que não pode ser carregada (formato ou colunas)"""
+
+
+def input_files(paths: List[str]) -> List[str]:
+    """Expande diretórios e padrões glob nos arquivos de formato suportado (ordem determinística)"""
+    files = []
+    for path in paths:
+        for match in sorted(glob.glob(path)) or [path]:
+            if os.path.isdir(match):
+                files.extend(os.path.join(match, name) for name in sorted(os.listdir(match))
+                             if os.path.splitext(name)[1] in INPUT_FORMATS)
+            elif os.path.splitext(match)[1] in INPUT_FORMATS:
+                files.append(match)
+            else:
+                raise BackfillError(f"Unsupported input: {match}")
+    return files
+
+
+def plan_tasks(path: str, chunk_bytes: int) -> Iterator[Tuple]:
+    """Divide o arquivo em tarefas independentes: faixas de bytes alinhadas em fim de linha ou row groups
+
+    As faixas de texto supõem que nenhum campo contém quebra de linha (o
+    caso das exportações de cadeia).
+    """
+    file_format = INPUT_FORMATS[os.path.splitext(path)[1]]
+    if file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise BackfillError("Parquet input requires pyarrow") from e
+        for row_group in range(pq.ParquetFile(path).num_row_groups):
+            yield path, file_format, row_group, None, None
+        return
+
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline().decode('utf-8').rstrip('\r\n') if file_format == 'csv' else None
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield path, file_format, start, end, header
+            start = end
+
+
+def _resolve_columns(columns) -> Dict[str, str]:
+    resolved = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in columns:
+                resolved[name] = alias
+                break
+    missing = [name for name in REQUIRED_COLUMNS if name not in resolved]
+    if missing:
+        raise BackfillError(f"Missing columns {missing} (found {list(columns)})")
+    return resolved
+
+
+def _read_task(task: Tuple) -> pd.DataFrame:
+    path, file_format, start, end, header = task
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).read_row_group(start).to_pandas()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if file_format == 'csv':
+        names = next(csv.reader([header]))
+        return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=str, keep_default_na=False)
+    return pd.read_json(io.BytesIO(data), lines=True, dtype=False, convert_dates=False)
+
+
+def _parse_timestamps(values: pd.Series) -> np.ndarray:
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().all():
+        return numeric.to_numpy(dtype=np.int64)
+    # Datas inválidas viram 0 e a linha é descartada
+    parsed = pd.to_datetime(values, utc=True, errors='coerce').fillna(pd.Timestamp(0, tz='UTC'))
+    return (parsed.astype('int64') // 10 ** 9).to_numpy(dtype=np.int64)
+
+
+def parse_task(task: Tuple) -> Dict:
+    """Lê e interpreta uma tarefa (executa nos processos do pool)
+
+    Endereços saem fatorados (únicos do bloco + códigos), para o processo
+    principal internar cada endereço uma vez por bloco; hashes saem como
+    buffer de bytes + offsets.
+    """
+    frame = _read_task(task)
+    if frame.empty:
+        return {'rows': 0, 'skipped': 0}
+    columns = _resolve_columns(frame.columns)
+
+    sources = frame[columns['from']].astype(str).str.strip()
+    targets = frame[columns['to']].astype(str).str.strip()
+    amounts = pd.to_numeric(frame[columns['amount']], errors='coerce')
+    valid = (sources != '') & (targets != '') & amounts.notna()
+    if 'timestamp' in columns:
+        timestamps = _parse_timestamps(frame[columns['timestamp']])
+        valid &= timestamps > 0
+    else:
+        timestamps = np.full(len(frame), int(time.time()), dtype=np.int64)
+    valid = valid.to_numpy()
+
+    n_rows = int(valid.sum())
+    if not n_rows:
+        return {'rows': 0, 'skipped': len(frame)}
+    codes, uniques = pd.factorize(pd.concat([sources[valid], targets[valid]], ignore_index=True))
+    hashes = frame[columns['hash']].astype(str)[valid].tolist() if 'hash' in columns else [''] * n_rows
+    # Um único encode do bloco: as quebras de linha separam os hashes e dão os offsets
+    joined = np.frombuffer(('\n'.join(hashes) + '\n').encode('utf-8'), dtype=np.uint8)
+    separators = np.flatnonzero(joined == ord('\n'))
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    offsets[1:] = separators - np.arange(n_rows)
+
+    result = {
+        'rows': n_rows,
+        'skipped': len(frame) - n_rows,
+        'addresses': uniques.tolist(),
+        'src_codes': codes[:n_rows].astype(np.int32),
+        'dst_codes': codes[n_rows:].astype(np.int32),
+        'amount': amounts[valid].to_numpy(dtype=np.float64),
+        'timestamp': timestamps[valid],
+        'hash_bytes': joined[joined != ord('\n')],
+        'hash_offsets': offsets,
+    }
+
+    entities = []
+    for side in ('from', 'to'):
+        label = columns.get(f'{side}_entity')
+        if label is not None:
+            labels = frame.loc[valid, [columns[side], label]]
+            labels = labels[labels[label].notna() & (labels[label].astype(str).str.strip() != '')]
+            entities.extend(labels.drop_duplicates().itertuples(index=False, name=None))
+    result['entities'] = entities
+    return result
+
+
+def write_entities(path: str, entities: Dict[str, str]):
+    """Lista de entidades no formato CSV do índice (address, entity_id)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    staging = f"{path}.tmp"
+    with open(staging, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['address', 'entity_id'])
+        writer.writerows(sorted(entities.items()))
+    os.replace(staging, path)
+
+
+def backfill(paths: List[str], snapshot_dir: str, workers: Optional[int] = None,
+             chunk_bytes: int = 64 << 20, entity_output: Optional[str] = None,
+             report_interval: float = 5.0, retention_days: Optional[float] = None) -> Dict:
+    """Carrega os arquivos no grafo do ``snapshot_dir`` (restaurado se existir) e grava um snapshot
+
+    ``retention_days`` substitui AML_GRAPH_RETENTION_DAYS nesta carga (0 = sem
+    janela de tempo); o serviço aplica a própria retenção ao restaurar.
+    """
+    started = time.time()
+    files = input_files(paths)
+    if not files:
+        raise BackfillError("No input files")
+    tasks = [task for path in files for task in plan_tasks(path, chunk_bytes)]
+
+    snapshotter = GraphSnapshotter(snapshot_dir)
+    config = store_config_from_env()
+    if retention_days is not None:
+        config['retention_seconds'] = int(retention_days * 86400) if retention_days > 0 else None
+    store = snapshotter.load(**config) or TransactionGraphStore(**config)
+    existing_edges = store.number_of_edges()
+
+    columns = {name: [] for name in ('src', 'dst', 'amount', 'timestamp', 'hash_bytes', 'hash_offsets')}
+    entities: Dict[str, str] = {}
+    rows = skipped = 0
+    last_report = started
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap(parse_task, tasks):
+            rows += result['rows']
+            skipped += result['skipped']
+            if not result['rows']:
+                continue
+            # Internação no processo principal: um add_node por endereço distinto do bloco
+            ids = np.fromiter((store.add_node(address) for address in result['addresses']),
+                              dtype=np.int32, count=len(result['addresses']))
+            columns['src'].append(ids[result['src_codes']])
+            columns['dst'].append(ids[result['dst_codes']])
+            columns['amount'].append(result['amount'])
+            columns['timestamp'].append(result['timestamp'])
+            columns['hash_bytes'].append(result['hash_bytes'])
+            columns['hash_offsets'].append(result['hash_offsets'])
+            entities.update(result['entities'])
+
+            now = time.time()
+            if now - last_report >= report_interval:
+                logging.info(f"Parsed {rows} rows ({rows / (now - started):,.0f} rows/s)")
+                last_report = now
+    parsed_seconds = time.time() - started
+
+    inserted = 0
+    if rows:
+        hash_offsets = [columns['hash_offsets'][0]]
+        base = hash_offsets[0][-1]
+        for offsets in columns['hash_offsets'][1:]:
+            hash_offsets.append(offsets[1:] + base)
+            base += offsets[-1]
+        inserted = store.add_transactions_bulk(
+            np.concatenate(columns['src']), np.concatenate(columns['dst']),
+            np.concatenate(columns['amount']), np.concatenate(columns['timestamp']),
+            np.concatenate(columns['hash_bytes']), np.concatenate(hash_offsets)
+        )
+
+    manifest = snapshotter.save(store)
+    snapshotter.stop()
+    if manifest is None:
+        raise BackfillError(f"Another process holds the snapshot writer lock in {snapshot_dir}")
+    if entity_output and entities:
+        write_entities(entity_output, entities)
+
+    elapsed = time.time() - started
+    return {
+        'files': len(files),
+        'tasks': len(tasks),
+        'rows': rows,
+        'skipped_rows': skipped,
+        'inserted_edges': inserted,
+        'dropped_by_retention': rows - inserted,
+        'retention_days': config['retention_seconds'] / 86400 if config['retention_seconds'] else None,
+        'graph_edges': store.number_of_edges(),
+        'graph_nodes': store.number_of_nodes(),
+        'previous_edges': existing_edges,
+        'entities': len(entities),
+        'parse_seconds': round(parsed_seconds, 2),
+        'total_seconds': round(elapsed, 2),
+        'rows_per_second': round(rows / elapsed) if elapsed > 0 else rows,
+        'snapshot': manifest['sequence']
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Seed the transaction graph from historical exports')
+    parser.add_argument('inputs', nargs='+', help='CSV/JSONL/Parquet files, directories or glob patterns')
+    parser.add_argument('--snapshot-dir', default=os.getenv('AML_GRAPH_SNAPSHOT_DIR'),
+                        help='Graph snapshot directory (default: $AML_GRAPH_SNAPSHOT_DIR)')
+    parser.add_argument('--workers', type=int, help='Parser processes (default: CPU count)')
+    parser.add_argument('--chunk-mb', type=int, default=64, help='Bytes of text per parse task')
+    parser.add_argument('--entity-output', help='Write address/entity labels found in the inputs to this CSV')
+    parser.add_argument('--retention-days', type=float,
+                        help='Time window kept in the graph for this load, 0 for none '
+                             '(default: $AML_GRAPH_RETENTION_DAYS, 30)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not args.snapshot_dir:
+        parser.error('--snapshot-dir (or AML_GRAPH_SNAPSHOT_DIR) is required')
+
+    try:
+        report = backfill(args.inputs, args.snapshot_dir, workers=args.workers,
+                          chunk_bytes=args.chunk_mb << 20, entity_output=args.entity_output,
+                          retention_days=args.retention_days)
+    except BackfillError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Loaded {report['rows']} rows from {report['files']} files in {report['total_seconds']}s "
+          f"({report['rows_per_second']:,} rows/s); inserted {report['inserted_edges']} edges; "
+          f"graph has {report['graph_edges']} edges, {report['graph_nodes']} nodes; snapshot {report['snapshot']}")
+    if report['skipped_rows']:
+        print(f"Skipped {report['skipped_rows']} invalid rows")
+    if report['dropped_by_retention'] > 0:
+        window = f"{report['retention_days']:g}-day window" if report['retention_days'] else 'edge budget'
+        print(f"Warning: {report['dropped_by_retention']} valid rows fell outside the {window} "
+              f"(AML_GRAPH_RETENTION_DAYS / AML_GRAPH_MAX_EDGES) and were not kept; use --retention-days "
+              f"and run the service with a matching AML_GRAPH_RETENTION_DAYS to keep them", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
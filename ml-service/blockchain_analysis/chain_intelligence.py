@@ -5,12 +5,18 @@ Análise multi-chain com detecção de padrões sofisticados e attribution de en
 
 import hashlib
 import json
+import os
 import time
 from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import numpy as np
 from collections import defaultdict, deque
+from indicators.matcher import get_shared_matcher
+from indicators.entity_index import EntityIndexManager, entity_sources_from_env
+
+# Categoria dos indicadores de bridge no matcher compartilhado
+BRIDGE_CATEGORY = 'bridge'
 
 class BlockchainType(Enum):
     BITCOIN = "BITCOIN"
@@ -49,15 +55,37 @@ class CrossChainTransaction:
 class ChainIntelligence:
     """Sistema de inteligência blockchain com capacidades multi-chain"""
     
+    BRIDGE_INDICATORS = [
+        'bridge', 'portal', 'wormhole', 'multichain', 'anyswap',
+        'polygon', 'arbitrum', 'optimism', 'avalanche'
+    ]
+    
     def __init__(self, license_key: str):
         self._license_key = license_key
         self._validate_license()
         self.entity_database = {}
         self.address_clusters = defaultdict(set)
-        self.cross_chain_flows = []
+        # Histórico limitado: não cresce durante a vida do processo
+        self.cross_chain_flows = deque(maxlen=int(os.getenv('AML_CROSS_CHAIN_HISTORY', '10000')))
         self.risk_patterns = self._initialize_risk_patterns()
         self.known_entities = self._load_known_entities()
-        
+        # Índice endereço -> entidade: entidades embutidas + listas de AML_ENTITY_SOURCES
+        self.entity_index = EntityIndexManager(
+            sources=entity_sources_from_env(),
+            seed={entity_id: entity.addresses for entity_id, entity in self.known_entities.items()},
+            filter_path=os.getenv('AML_ENTITY_FILTER_PATH'),
+            filter_fpr=float(os.getenv('AML_ENTITY_FILTER_FPR', '0.001'))
+        )
+        reload_interval = os.getenv('AML_ENTITY_RELOAD_INTERVAL')
+        if reload_interval:
+            self.entity_index.start_watching(float(reload_interval))
+        self._matcher = get_shared_matcher()
+        self._matcher.add_substrings(BRIDGE_CATEGORY, self.BRIDGE_INDICATORS)
+        
+    def resume_after_fork(self):
+        """Recria a thread de recarga do índice de entidades em um worker pré-forkado"""
+        self.entity_index.resume_after_fork()
+
     def _validate_license(self):
         """Validação de licença específica para inteligência blockchain"""
         expected = "9a8b7c6d5e4f"
@@ -135,12 +163,11 @@ class ChainIntelligence:
         }
         
         # 1. Verificar correspondência direta com entidades conhecidas
-        for entity_id, entity in self.known_entities.items():
-            if address in entity.addresses:
-                attribution_result['entity_match'] = entity_id
-                attribution_result['confidence_score'] = 0.95
-                attribution_result['attribution_methods'].append('DIRECT_MATCH')
-                break
+        entity_id = self.entity_index.lookup(address)
+        if entity_id:
+            attribution_result['entity_match'] = entity_id
+            attribution_result['confidence_score'] = 0.95
+            attribution_result['attribution_methods'].append('DIRECT_MATCH')
         
         # 2. Análise de clustering baseada em heurísticas
         if not attribution_result['entity_match']:
@@ -332,13 +359,7 @@ class ChainIntelligence:
     
     def _is_bridge_transaction(self, tx: Dict) -> bool:
         """Identifica se uma transação é de bridge cross-chain"""
-        bridge_indicators = [
-            'bridge', 'portal', 'wormhole', 'multichain', 'anyswap',
-            'polygon', 'arbitrum', 'optimism', 'avalanche'
-        ]
-        
-        to_address = tx.get('toAddress', '').lower()
-        return any(indicator in to_address for indicator in bridge_indicators)
+        return self._matcher.matches(tx.get('toAddress', ''), BRIDGE_CATEGORY)
     
     def _analyze_bridge_flow_pattern(self, bridge_transactions: List[Dict]) -> Dict:
         """Analisa padrão de fluxo em bridge para detectar suspeitas"""
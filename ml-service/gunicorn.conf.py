@@ -0,0 +1,36 @@
+"""
+Configuração do gunicorn para os serviços de ML (app.py, advanced_app.py, main.py)
+
+A aplicação é carregada no master antes do fork (preload_app), de modo que
+modelos, RiskAnalyzer e AdvancedAMLSystem são compartilhados copy-on-write
+entre os workers. Todos os parâmetros podem ser ajustados por variáveis de
+ambiente.
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv('ML_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('ML_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('ML_THREADS', '1'))
+worker_class = os.getenv('ML_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+timeout = int(os.getenv('ML_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('ML_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('ML_KEEPALIVE', '5'))
+max_requests = int(os.getenv('ML_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('ML_MAX_REQUESTS_JITTER', '0'))
+
+preload_app = True
+
+accesslog = os.getenv('ML_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('ML_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Repassa o fork para o módulo da aplicação (ex.: recriar threads de fundo)"""
+    module_name = server.app.app_uri.split(':', 1)[0]
+    hook = getattr(sys.modules.get(module_name), 'on_worker_start', None)
+    if hook is not None:
+        hook()
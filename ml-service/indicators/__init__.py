@@ -0,0 +1 @@
+# Indicators module
\ No newline at end of file
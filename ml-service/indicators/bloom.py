@@ -0,0 +1,150 @@
+"""
+Filtro de Bloom para endereços
+Pré-filtro compacto na frente do índice de entidades: a grande maioria dos
+endereços avaliados não pertence a nenhuma entidade conhecida, e um negativo
+do filtro dispensa a consulta ao índice completo. O filtro é gravado em
+arquivo e aberto com memory-map, de modo que todos os workers compartilham as
+mesmas páginas.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import tempfile
+from typing import Iterable, Optional
+
+import numpy as np
+
+MAGIC = b'AMLBLOOM'
+FORMAT_VERSION = 1
+# magic, versão, bits, funções de hash, itens, fingerprint das fontes (32 bytes)
+HEADER = struct.Struct('<8sIQIQ32s')
+MASK64 = (1 << 64) - 1
+HASH_PAIR = struct.Struct('<QQ')
+
+
+class BloomFilterError(Exception):
+    """Arquivo de filtro inválido ou incompatível"""
+
+
+def hash_pair(key: str):
+    """Dois hashes de 64 bits da chave (o primeiro também ordena a tabela de entidades)"""
+    h1, h2 = HASH_PAIR.unpack(hashlib.blake2b(key.encode(), digest_size=16).digest())
+    # h2 ímpar: as posições nunca colapsam em um único bit
+    return h1, h2 | 1
+
+
+def optimal_parameters(capacity: int, false_positive_rate: float):
+    """Número de bits e de funções de hash para a capacidade e a taxa desejadas"""
+    capacity = max(1, capacity)
+    num_bits = int(math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+    num_bits = max(64, (num_bits + 7) // 8 * 8)
+    num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+    return num_bits, num_hashes
+
+
+class BloomFilter:
+    """Filtro de Bloom com double hashing (Kirsch-Mitzenmacher) sobre um array de bytes"""
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[np.ndarray] = None,
+                 count: int = 0, fingerprint: bytes = b''):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else np.zeros(num_bits // 8, dtype=np.uint8)
+        self.count = count
+        self.fingerprint = fingerprint.ljust(32, b'\0')[:32]
+        # Indexar um memoryview devolve int direto, bem mais barato que escalares numpy
+        self._view = memoryview(self.bits)
+
+    @classmethod
+    def build(cls, keys: Iterable[str], false_positive_rate: float = 0.001,
+              fingerprint: bytes = b'') -> 'BloomFilter':
+        keys = list(keys)
+        num_bits, num_hashes = optimal_parameters(len(keys), false_positive_rate)
+        bloom = cls(num_bits, num_hashes, fingerprint=fingerprint)
+        if keys:
+            # Posições calculadas em lote com aritmética uint64 (mesmo wrap do __contains__)
+            pairs = np.array([hash_pair(key) for key in keys], dtype=np.uint64)
+            steps = np.arange(num_hashes, dtype=np.uint64)
+            with np.errstate(over='ignore'):
+                positions = (pairs[:, :1] + steps * pairs[:, 1:]) % np.uint64(num_bits)
+            flags = np.zeros(num_bits, dtype=bool)
+            flags[positions.ravel()] = True
+            bloom.bits = np.packbits(flags, bitorder='little')
+            bloom._view = memoryview(bloom.bits)
+            bloom.count = len(keys)
+        return bloom
+
+    def add(self, key: str):
+        h1, h2 = hash_pair(key)
+        view = self._view
+        for i in range(self.num_hashes):
+            position = ((h1 + i * h2) & MASK64) % self.num_bits
+            view[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_hashes(*hash_pair(key))
+
+    def contains_hashes(self, h1: int, h2: int) -> bool:
+        """Pertinência a partir de ``hash_pair`` já calculado (compartilhado com a tabela de entidades)"""
+        view, num_bits = self._view, self.num_bits
+        for i in range(self.num_hashes):
+            position = ((h1 + i * h2) & MASK64) % num_bits
+            if not view[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return int(self.bits.nbytes)
+
+    def estimated_false_positive_rate(self) -> float:
+        if not self.count:
+            return 0.0
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def save(self, path: str):
+        """Grava o filtro (escrita em arquivo temporário + rename atômico)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.bloom-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.num_bits, self.num_hashes,
+                                    self.count, self.fingerprint))
+                f.write(np.ascontiguousarray(self.bits).tobytes())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'BloomFilter':
+        """Abre um filtro gravado; com mmap os bits ficam no page cache compartilhado"""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise BloomFilterError(f"Truncated bloom filter: {path}")
+
+        magic, version, num_bits, num_hashes, count, fingerprint = HEADER.unpack(header)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise BloomFilterError(f"Not a bloom filter file (v{FORMAT_VERSION}): {path}")
+        if os.path.getsize(path) != HEADER.size + num_bits // 8:
+            raise BloomFilterError(f"Bloom filter size does not match header: {path}")
+
+        if mmap:
+            bits = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(num_bits // 8,))
+        else:
+            bits = np.fromfile(path, dtype=np.uint8, offset=HEADER.size)
+        return cls(num_bits, num_hashes, bits=bits, count=count, fingerprint=fingerprint)
+
+    def get_stats(self):
+        return {
+            'items': self.count,
+            'size_bytes': self.size_bytes,
+            'num_hashes': self.num_hashes,
+            'estimated_false_positive_rate': round(self.estimated_false_positive_rate(), 6)
+        }
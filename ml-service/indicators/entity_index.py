@@ -0,0 +1,316 @@
+"""
+Índice de Entidades Conhecidas
+Carrega listas de endereços rotulados (CSV/JSONL) em um único dicionário
+endereço -> entity_id, com strings repetidas internadas. Suporta recarga a
+quente: um novo índice é construído em segundo plano e a referência é trocada
+atomicamente, sem reiniciar o serviço.
+
+Com um caminho de filtro configurado, o dicionário só existe durante a
+construção: o índice é gravado como filtro de Bloom + tabela ordenada,
+ambos abertos com memory-map e compartilhados entre os workers. O filtro
+descarta os negativos antes da busca na tabela.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from indicators.bloom import BloomFilter, BloomFilterError, hash_pair
+from indicators.entity_table import EntityTable, EntityTableError
+
+ENTITY_FILE_EXTENSIONS = ('.csv', '.jsonl')
+
+# Campos de metadados aceitos nos arquivos de entidades
+METADATA_FIELDS = ('entity_type', 'risk_level', 'compliance_status', 'jurisdictions')
+
+
+def normalize_address(address: str) -> str:
+    """Endereços EVM não diferenciam maiúsculas; base58/bech32 são mantidos como estão"""
+    address = address.strip()
+    if address[:2].lower() == '0x':
+        return address.lower()
+    return address
+
+
+def _intern_metadata(record: Dict) -> Dict:
+    metadata = {}
+    for field in METADATA_FIELDS:
+        value = record.get(field)
+        if value in (None, ''):
+            continue
+        if field == 'jurisdictions':
+            if isinstance(value, str):
+                value = value.split(';')
+            value = tuple(sys.intern(item.strip()) for item in value if item.strip())
+        else:
+            value = sys.intern(str(value))
+        metadata[field] = value
+    return metadata
+
+
+def iter_entity_file(path: str) -> Iterator[Tuple[str, str, Dict]]:
+    """Lê (endereço, entity_id, metadados) de um arquivo CSV ou JSONL
+
+    CSV: colunas ``address`` e ``entity_id`` (obrigatórias) e metadados opcionais.
+    JSONL: um objeto por linha com ``address`` ou uma lista ``addresses``.
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('address') and row.get('entity_id'):
+                    yield row['address'], row['entity_id'], _intern_metadata(row)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping invalid entity record {path}:{line_number}")
+                    continue
+                entity_id = record.get('entity_id')
+                addresses = record.get('addresses') or [record.get('address')]
+                if not entity_id:
+                    continue
+                metadata = _intern_metadata(record)
+                for address in addresses:
+                    if address:
+                        yield address, entity_id, metadata
+
+
+def entity_sources_from_env() -> List[str]:
+    """Arquivos/diretórios de entidades em AML_ENTITY_SOURCES (separados por os.pathsep)"""
+    value = os.getenv('AML_ENTITY_SOURCES', '')
+    return [source for source in value.split(os.pathsep) if source]
+
+
+def expand_sources(sources: Iterable[str]) -> List[str]:
+    """Expande diretórios em seus arquivos .csv/.jsonl (ordem determinística)"""
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(
+                os.path.join(source, name) for name in sorted(os.listdir(source))
+                if name.endswith(ENTITY_FILE_EXTENSIONS)
+            )
+        elif os.path.exists(source):
+            files.append(source)
+    return files
+
+
+class EntityIndex:
+    """Snapshot imutável do índice: uma consulta de atribuição é um lookup em hash
+
+    Em memória (``address_to_entity``) ou compartilhado: ``table`` em mmap
+    com ``prefilter`` na frente, sem dicionário no processo.
+    """
+
+    __slots__ = ('address_to_entity', 'entities', 'sources', 'built_at', 'prefilter', 'table')
+
+    def __init__(self, address_to_entity: Optional[Dict[str, str]], entities: Dict[str, Dict],
+                 sources: List[str], prefilter: Optional[BloomFilter] = None,
+                 table: Optional[EntityTable] = None):
+        self.address_to_entity = address_to_entity
+        self.entities = entities
+        self.sources = sources
+        self.built_at = time.time()
+        self.prefilter = prefilter
+        self.table = table
+
+    @classmethod
+    def shared(cls, prefilter: BloomFilter, table: EntityTable) -> 'EntityIndex':
+        return cls(None, table.entities, table.sources, prefilter=prefilter, table=table)
+
+    def lookup(self, address: str) -> Optional[str]:
+        if not address:
+            return None
+        key = normalize_address(address)
+        if self.table is None:
+            return self.address_to_entity.get(key)
+        # O mesmo hash serve ao filtro e à tabela; negativo do filtro: certamente fora do índice
+        h1, h2 = hash_pair(key)
+        if not self.prefilter.contains_hashes(h1, h2):
+            return None
+        return self.table.get(key, h1)
+
+    def get_entity(self, entity_id: str) -> Optional[Dict]:
+        return self.entities.get(entity_id)
+
+    def __len__(self) -> int:
+        if self.table is not None:
+            return len(self.table)
+        return len(self.address_to_entity)
+
+
+def build_entity_index(sources: Iterable[str],
+                       seed: Optional[Dict[str, Iterable[str]]] = None) -> EntityIndex:
+    """Constrói um índice a partir dos arquivos e de entidades embutidas (entity_id -> endereços)"""
+    address_to_entity: Dict[str, str] = {}
+    entities: Dict[str, Dict] = {}
+
+    for entity_id, addresses in (seed or {}).items():
+        entity_id = sys.intern(entity_id)
+        entities.setdefault(entity_id, {})
+        for address in addresses:
+            address_to_entity[normalize_address(address)] = entity_id
+
+    files = expand_sources(sources)
+    for path in files:
+        for address, entity_id, metadata in iter_entity_file(path):
+            entity_id = sys.intern(entity_id)
+            address_to_entity[normalize_address(address)] = entity_id
+            if metadata or entity_id not in entities:
+                entities[entity_id] = metadata
+
+    return EntityIndex(address_to_entity, entities, files)
+
+
+class EntityIndexManager:
+    """Mantém o índice ativo e o substitui atomicamente na recarga"""
+
+    def __init__(self, sources: Optional[Iterable[str]] = None,
+                 seed: Optional[Dict[str, Iterable[str]]] = None,
+                 filter_path: Optional[str] = None, filter_fpr: float = 0.001):
+        self.sources = list(sources or [])
+        self.seed = seed or {}
+        # Filtro de Bloom + tabela de endereços opcionais, compartilhados entre workers via arquivo + mmap
+        self.filter_path = filter_path
+        self.table_path = os.path.splitext(filter_path)[0] + '.table' if filter_path else None
+        self.filter_fpr = filter_fpr
+        self.reload_count = 0
+        self.last_reload_error: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watching = False
+        self._watch_interval = 60.0
+        self._mtimes = self._source_mtimes()
+        self._index = self._build(self._mtimes)
+
+    @property
+    def index(self) -> EntityIndex:
+        return self._index
+
+    def lookup(self, address: str) -> Optional[str]:
+        return self._index.lookup(address)
+
+    def reload(self) -> EntityIndex:
+        """Reconstrói o índice e troca a referência; leitores nunca veem estado parcial"""
+        with self._reload_lock:
+            mtimes = self._source_mtimes()
+            try:
+                new_index = self._build(mtimes)
+            except Exception as e:
+                self.last_reload_error = str(e)
+                logging.error(f"Entity index reload failed, keeping previous index: {e}")
+                return self._index
+
+            self._index = new_index
+            self._mtimes = mtimes
+            self.reload_count += 1
+            self.last_reload_error = None
+            logging.info(f"Entity index reloaded: {len(new_index)} addresses")
+            return new_index
+
+    def reload_async(self) -> threading.Thread:
+        thread = threading.Thread(target=self.reload, daemon=True)
+        thread.start()
+        return thread
+
+    def start_watching(self, interval: float = 60.0):
+        """Recarrega em segundo plano quando algum arquivo de origem muda"""
+        if self._watching:
+            return
+        self._watching = True
+        self._watch_interval = interval
+        self._start_watch_thread()
+
+    def _start_watch_thread(self):
+        self._watch_thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._watch_thread.start()
+
+    def _watch_loop(self):
+        while self._watching:
+            time.sleep(self._watch_interval)
+            if self._source_mtimes() != self._mtimes:
+                self.reload()
+
+    def resume_after_fork(self):
+        """Recria a thread de recarga em um worker pré-forkado (threads não sobrevivem ao fork)"""
+        # A trava pode ter sido copiada no meio de uma recarga do processo pai
+        self._reload_lock = threading.Lock()
+        if self._watching and (self._watch_thread is None or not self._watch_thread.is_alive()):
+            self._start_watch_thread()
+
+    def stop_watching(self):
+        self._watching = False
+
+    def _build(self, mtimes: Dict[str, float]) -> EntityIndex:
+        if not self.filter_path:
+            return build_entity_index(self.sources, self.seed)
+
+        fingerprint = hashlib.sha256(json.dumps({
+            'sources': sorted(mtimes.items()),
+            'seed': sorted((entity_id, sorted(addresses)) for entity_id, addresses in self.seed.items()),
+            'fpr': self.filter_fpr
+        }).encode()).digest()
+        # Arquivos gerados das mesmas fontes (por outro worker ou antes do restart): nem lê as fontes
+        index = self._load_shared(fingerprint)
+        if index is not None:
+            return index
+
+        index = build_entity_index(self.sources, self.seed)
+        try:
+            bloom = BloomFilter.build(index.address_to_entity, self.filter_fpr, fingerprint=fingerprint)
+            bloom.save(self.filter_path)
+            EntityTable.write(self.table_path, index.address_to_entity, index.entities, index.sources,
+                              fingerprint=fingerprint)
+        except OSError as e:
+            logging.warning(f"Could not persist entity index to {self.filter_path}, "
+                            f"keeping it in process memory: {e}")
+            return index
+        # Reabre com mmap: o dicionário é descartado e as páginas ficam no page cache compartilhado
+        shared = self._load_shared(fingerprint)
+        return shared if shared is not None else index
+
+    def _load_shared(self, fingerprint: bytes) -> Optional[EntityIndex]:
+        if not (os.path.exists(self.filter_path) and os.path.exists(self.table_path)):
+            return None
+        try:
+            bloom = BloomFilter.load(self.filter_path)
+            table = EntityTable.load(self.table_path)
+        except (BloomFilterError, EntityTableError, OSError) as e:
+            logging.warning(f"Rebuilding shared entity index: {e}")
+            return None
+        if bloom.fingerprint != fingerprint or table.fingerprint != fingerprint:
+            return None
+        return EntityIndex.shared(bloom, table)
+
+    def _source_mtimes(self) -> Dict[str, float]:
+        # Arquivos novos/removidos em diretórios alteram as chaves e também disparam recarga
+        mtimes = {}
+        for path in expand_sources(self.sources):
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def get_stats(self) -> Dict:
+        index = self._index
+        return {
+            'addresses': len(index),
+            'entities': len(index.entities),
+            'source_files': len(index.sources),
+            'built_at': index.built_at,
+            'prefilter': index.prefilter.get_stats() if index.prefilter is not None else None,
+            'shared_table': index.table.get_stats() if index.table is not None else None,
+            'reload_count': self.reload_count,
+            'last_reload_error': self.last_reload_error
+        }
@@ -0,0 +1,166 @@
+"""
+Tabela de Entidades Compartilhada
+Versão em arquivo do dicionário endereço -> entity_id do índice de entidades:
+hashes de 64 bits ordenados, o ordinal da entidade de cada endereço e os
+próprios endereços (para confirmar a correspondência), abertos com
+memory-map. Os workers consultam as mesmas páginas do page cache em vez de
+manter cada um o seu dicionário com milhões de strings.
+"""
+
+import bisect
+import json
+import os
+import struct
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from indicators.bloom import hash_pair
+
+MAGIC = b'AMLENTTB'
+FORMAT_VERSION = 1
+# magic, versão, endereços, bytes dos endereços, bytes do JSON de entidades, fingerprint das fontes
+HEADER = struct.Struct('<8sIQQQ32s')
+
+
+class EntityTableError(Exception):
+    """Arquivo de tabela inválido ou incompatível"""
+
+
+def _pad8(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+
+def _restore_metadata(metadata: Dict) -> Dict:
+    """Desfaz a serialização JSON dos metadados (strings internadas, jurisdições em tupla)"""
+    restored = {}
+    for field, value in metadata.items():
+        if isinstance(value, list):
+            restored[field] = tuple(sys.intern(item) for item in value)
+        else:
+            restored[field] = sys.intern(value)
+    return restored
+
+
+class EntityTable:
+    """Busca binária sobre hashes ordenados; colisões de hash são resolvidas pelo endereço"""
+
+    def __init__(self, keys: np.ndarray, ordinals: np.ndarray, offsets: np.ndarray, addresses: np.ndarray,
+                 entities: Dict[str, Dict], sources: List[str], fingerprint: bytes = b''):
+        self.keys = keys
+        self.ordinals = ordinals
+        self.offsets = offsets
+        self.addresses = addresses
+        self.entities = entities
+        self.entity_ids = list(entities)
+        self.sources = sources
+        self.fingerprint = fingerprint.ljust(32, b'\0')[:32]
+        # Indexar um memoryview devolve int direto, bem mais barato que escalares numpy
+        self._keys = memoryview(np.ascontiguousarray(keys)).cast('B').cast('Q')
+        self._ordinals = memoryview(np.ascontiguousarray(ordinals)).cast('B').cast('I')
+        self._offsets = memoryview(offsets).cast('B').cast('q')
+        self._addresses = memoryview(addresses)
+
+    def get(self, key: str, key_hash: Optional[int] = None) -> Optional[str]:
+        """entity_id do endereço (já normalizado); ``key_hash`` evita recalcular o hash do filtro"""
+        if key_hash is None:
+            key_hash = hash_pair(key)[0]
+        keys, offsets = self._keys, self._offsets
+        position = bisect.bisect_left(keys, key_hash)
+        encoded = None
+        while position < len(keys) and keys[position] == key_hash:
+            if encoded is None:
+                encoded = key.encode()
+            if self._addresses[offsets[position]:offsets[position + 1]] == encoded:
+                return self.entity_ids[self._ordinals[position]]
+            position += 1
+        return None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def size_bytes(self) -> int:
+        return int(self.keys.nbytes + self.ordinals.nbytes + self.offsets.nbytes + self.addresses.nbytes)
+
+    @staticmethod
+    def write(path: str, address_to_entity: Dict[str, str], entities: Dict[str, Dict],
+              sources: List[str], fingerprint: bytes = b''):
+        """Grava a tabela a partir do dicionário do índice (temporário + rename atômico)"""
+        ordinal_of = {entity_id: ordinal for ordinal, entity_id in enumerate(entities)}
+        addresses = list(address_to_entity)
+        encoded = [address.encode() for address in addresses]
+
+        keys = np.array([hash_pair(address)[0] for address in addresses], dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        ordinals = np.array([ordinal_of[address_to_entity[address]] for address in addresses],
+                            dtype=np.uint32)[order]
+        lengths = np.array([len(value) for value in encoded], dtype=np.int64)[order]
+        offsets = np.zeros(len(addresses) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        address_bytes = b''.join(encoded[row] for row in order.tolist())
+        # Ordinal = posição da entidade no JSON (a ordem das chaves é preservada)
+        trailer = json.dumps({'entities': entities, 'sources': sources}).encode()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.entities-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                header = HEADER.pack(MAGIC, FORMAT_VERSION, len(addresses), len(address_bytes),
+                                     len(trailer), fingerprint.ljust(32, b'\0')[:32])
+                # Colunas alinhadas em 8 bytes para o memory-map
+                f.write(header.ljust(_pad8(HEADER.size), b'\0'))
+                f.write(keys[order].tobytes())
+                f.write(ordinals.tobytes().ljust(_pad8(ordinals.nbytes), b'\0'))
+                f.write(offsets.tobytes())
+                f.write(address_bytes.ljust(_pad8(len(address_bytes)), b'\0'))
+                f.write(trailer)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'EntityTable':
+        """Abre uma tabela gravada com memory-map (só as entidades ficam em memória do processo)"""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise EntityTableError(f"Truncated entity table: {path}")
+            magic, version, count, address_size, trailer_size, fingerprint = HEADER.unpack(header)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise EntityTableError(f"Not an entity table file (v{FORMAT_VERSION}): {path}")
+
+            keys_at = _pad8(HEADER.size)
+            ordinals_at = keys_at + count * 8
+            offsets_at = ordinals_at + _pad8(count * 4)
+            addresses_at = offsets_at + (count + 1) * 8
+            trailer_at = addresses_at + _pad8(address_size)
+            if os.path.getsize(path) != trailer_at + trailer_size:
+                raise EntityTableError(f"Entity table size does not match header: {path}")
+            f.seek(trailer_at)
+            try:
+                trailer = json.loads(f.read(trailer_size))
+            except ValueError as e:
+                raise EntityTableError(f"Corrupted entity table metadata: {path}") from e
+
+        def column(dtype, offset, length):
+            if not length:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(length,))
+
+        entities = {sys.intern(entity_id): _restore_metadata(metadata)
+                    for entity_id, metadata in trailer['entities'].items()}
+        return cls(column(np.uint64, keys_at, count), column(np.uint32, ordinals_at, count),
+                   column(np.int64, offsets_at, count + 1), column(np.uint8, addresses_at, address_size),
+                   entities, trailer['sources'], fingerprint=fingerprint)
+
+    def get_stats(self) -> Dict:
+        return {
+            'addresses': len(self),
+            'size_bytes': self.size_bytes
+        }
@@ -0,0 +1,172 @@
+"""
+Matcher de Indicadores (Aho-Corasick)
+Compila todas as listas de indicadores (mixers, bridges, sancionados...) em um
+único autômato Aho-Corasick, mais um conjunto hash para endereços completos.
+Cada consulta percorre o endereço uma única vez e retorna todas as categorias
+encontradas, independente de quantos indicadores estão carregados.
+"""
+
+import os
+import threading
+from collections import defaultdict, deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+NO_MATCH: FrozenSet[str] = frozenset()
+
+# Sufixos dos arquivos de indicadores em AML_INDICATORS_DIR
+SUBSTRINGS_SUFFIX = '.txt'
+ADDRESSES_SUFFIX = '.addresses.txt'
+
+
+class _Automaton:
+    """Autômato imutável: transições, links de falha e saídas por estado"""
+
+    __slots__ = ('goto', 'fail', 'output', 'exact')
+
+    def __init__(self, substrings: Dict[str, Set[str]], exact: Dict[str, Set[str]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        outputs: List[Set[str]] = [set()]
+
+        for pattern, categories in substrings.items():
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outputs.append(set())
+                state = next_state
+            outputs[state].update(categories)
+
+        # BFS para os links de falha; as saídas herdam as do estado de falha
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                outputs[next_state].update(outputs[self.fail[next_state]])
+
+        self.output: List[FrozenSet[str]] = [frozenset(out) if out else NO_MATCH for out in outputs]
+        self.exact: Dict[str, FrozenSet[str]] = {
+            address: frozenset(categories) for address, categories in exact.items()
+        }
+
+    def search(self, text: str) -> FrozenSet[str]:
+        goto, fail, output = self.goto, self.fail, self.output
+        found = self.exact.get(text, NO_MATCH)
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found = found | output[state]
+        return found
+
+
+class IndicatorMatcher:
+    """Conjunto de indicadores por categoria, compilado sob demanda
+
+    Indicadores podem ser registrados a qualquer momento; o autômato é
+    recompilado na próxima consulta e trocado atomicamente, de modo que
+    consultas concorrentes sempre veem um autômato completo.
+    Comparações ignoram maiúsculas/minúsculas.
+    """
+
+    def __init__(self):
+        self._substrings: Dict[str, Set[str]] = defaultdict(set)
+        self._exact: Dict[str, Set[str]] = defaultdict(set)
+        self._automaton: Optional[_Automaton] = None
+        self._lock = threading.Lock()
+
+    def add_substrings(self, category: str, patterns: Iterable[str]):
+        """Registra padrões que casam em qualquer posição do endereço"""
+        with self._lock:
+            for pattern in patterns:
+                pattern = pattern.strip().lower()
+                if pattern and category not in self._substrings[pattern]:
+                    self._substrings[pattern].add(category)
+                    self._automaton = None
+
+    def add_addresses(self, category: str, addresses: Iterable[str]):
+        """Registra endereços completos (casamento exato)"""
+        with self._lock:
+            for address in addresses:
+                address = address.strip().lower()
+                if address and category not in self._exact[address]:
+                    self._exact[address].add(category)
+                    self._automaton = None
+
+    def load_directory(self, path: str) -> int:
+        """Carrega ``<categoria>.txt`` (substrings) e ``<categoria>.addresses.txt`` (exatos)"""
+        loaded = 0
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith(ADDRESSES_SUFFIX):
+                category, add = filename[:-len(ADDRESSES_SUFFIX)], self.add_addresses
+            elif filename.endswith(SUBSTRINGS_SUFFIX):
+                category, add = filename[:-len(SUBSTRINGS_SUFFIX)], self.add_substrings
+            else:
+                continue
+
+            with open(os.path.join(path, filename), encoding='utf-8') as f:
+                entries = [line for line in f if line.strip() and not line.startswith('#')]
+            add(category, entries)
+            loaded += len(entries)
+        return loaded
+
+    def compile(self) -> _Automaton:
+        automaton = self._automaton
+        if automaton is None:
+            with self._lock:
+                if self._automaton is None:
+                    self._automaton = _Automaton(self._substrings, self._exact)
+                automaton = self._automaton
+        return automaton
+
+    def match(self, address: str) -> FrozenSet[str]:
+        """Categorias cujos indicadores aparecem no endereço (uma passada)"""
+        if not address:
+            return NO_MATCH
+        return self.compile().search(address.lower())
+
+    def matches(self, address: str, category: str) -> bool:
+        return category in self.match(address)
+
+    def exact_addresses(self, category: Optional[str] = None) -> List[str]:
+        with self._lock:
+            return [address for address, categories in self._exact.items()
+                    if category is None or category in categories]
+
+    def get_stats(self) -> Dict:
+        automaton = self.compile()
+        return {
+            'substring_indicators': len(self._substrings),
+            'exact_addresses': len(self._exact),
+            'automaton_states': len(automaton.goto)
+        }
+
+
+_shared_matcher: Optional[IndicatorMatcher] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_matcher() -> IndicatorMatcher:
+    """Matcher do processo, carregado de AML_INDICATORS_DIR na primeira chamada"""
+    global _shared_matcher
+    if _shared_matcher is None:
+        with _shared_lock:
+            if _shared_matcher is None:
+                matcher = IndicatorMatcher()
+                indicators_dir = os.getenv('AML_INDICATORS_DIR')
+                if indicators_dir and os.path.isdir(indicators_dir):
+                    matcher.load_directory(indicators_dir)
+                _shared_matcher = matcher
+    return _shared_matcher
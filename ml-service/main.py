@@ -1,10 +1,12 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import numpy as np
 from datetime import datetime
 from risk_analyzer import RiskAnalyzer
+from scoring_executor import ScoringExecutor, QueueFullError
 
 app = FastAPI(title="CryptoAML ML Service", version="1.0.0")
 
@@ -17,6 +19,37 @@ app.add_middleware(
 )
 
 analyzer = RiskAnalyzer()
+analyzer_ready = False
+
+def warmup():
+    """Exercita o analisador antes de aceitar tráfego (no master, antes do fork)"""
+    global analyzer_ready
+    analyzer.analyze_transaction(
+        tx_hash="warmup",
+        from_address="0x0000000000000000000000000000000000000000",
+        to_address="0x0000000000000000000000000000000000000001",
+        amount=1.0,
+        blockchain="ETHEREUM"
+    )
+    analyzer.analyze_wallet(
+        address="0x0000000000000000000000000000000000000000",
+        blockchain="ETHEREUM",
+        transactions=[{'amount': 1.0, 'hash': 'warmup'}]
+    )
+    analyzer_ready = True
+
+warmup()
+
+# Pool de processos para o scoring de carteiras (criado em cada worker, após o fork)
+scoring_executor = ScoringExecutor()
+
+@app.on_event("startup")
+def start_scoring_pool():
+    scoring_executor.start()
+
+@app.on_event("shutdown")
+def stop_scoring_pool():
+    scoring_executor.shutdown()
 
 class Transaction(BaseModel):
     hash: str
@@ -50,12 +83,14 @@ def read_root():
 @app.post("/analyze/wallet", response_model=AnalysisResponse)
 async def analyze_wallet(request: WalletAnalysisRequest):
     try:
-        result = analyzer.analyze_wallet(
+        result = await scoring_executor.analyze_wallet(
             address=request.address,
             blockchain=request.blockchain,
             transactions=[t.dict() for t in request.transactions]
         )
         return result
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -73,6 +108,16 @@ async def analyze_transaction(request: TransactionAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return scoring_executor.render_prometheus()
+
+@app.get("/ready")
+def readiness_check():
+    if not analyzer_ready:
+        raise HTTPException(status_code=503, detail="warming up")
+    return {"ready": True}
+
 @app.get("/health")
 def health_check():
     try:
@@ -0,0 +1 @@
+# ML engine module
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""
+Esquema de features do modelo AML
+Compartilhado entre o serviço (extração) e o treinamento offline (manifesto)
+"""
+
+# Ordem das colunas da matriz (N, 5) gerada por AMLRiskModel.extract_features_batch
+FEATURE_SCHEMA = [
+    'amount_normalized',
+    'high_value_flag',
+    'round_amount_flag',
+    'from_address_length',
+    'flags_count'
+]
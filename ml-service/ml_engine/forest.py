@@ -0,0 +1,220 @@
+"""
+Motor de Inferência Compilado para Florestas de Decisão
+Achata um RandomForestClassifier treinado em arrays NumPy contíguos e avalia
+todas as árvores de um lote em operações vetorizadas, sem passar pelo sklearn
+"""
+
+import numpy as np
+from typing import Dict, Optional
+
+# Nós folha do sklearn usam -1 como filho
+TREE_LEAF = -1
+
+# Limite de folhas por árvore para a avaliação por vetores de bits (uint64)
+BITVECTOR_MAX_LEAVES = 64
+
+
+class CompiledForest:
+    """Floresta achatada em arrays contíguos
+
+    Dois layouts são mantidos:
+
+    * travessia: ``feature``, ``threshold``, ``children`` e ``value`` com todos
+      os nós de todas as árvores em um único espaço de índices. Folhas apontam
+      para si mesmas, então ``max_depth`` iterações levam cada linha à sua folha.
+    * vetores de bits (QuickScorer): cada nó interno guarda os bits das folhas
+      da sua subárvore esquerda. As folhas eliminadas são o OR desses bits nos
+      nós cuja condição é falsa, e a folha de saída é o menor bit restante.
+      Isso custa um número fixo de operações NumPy independente da
+      profundidade. Só é usado quando todas as árvores têm até 64 folhas.
+    """
+
+    TRAVERSAL_ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+    BITVECTOR_ARRAYS = ('node_feature', 'node_threshold', 'node_left_leaves',
+                        'tree_node_offsets', 'leaf_value', 'tree_leaf_offsets')
+
+    def __init__(self, arrays: Dict[str, np.ndarray], max_depth: int,
+                 n_features: int, classes):
+        self.arrays = arrays
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']  # [2 * nó] = esquerda, [2 * nó + 1] = direita
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.classes = np.asarray(classes)
+        self.n_trees = len(self.roots)
+        self.use_bitvectors = all(name in arrays for name in self.BITVECTOR_ARRAYS)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        """Compila um RandomForestClassifier (ou árvore única) já treinado"""
+        estimators = getattr(model, 'estimators_', [model])
+        trees = [estimator.tree_ for estimator in estimators]
+        n_classes = len(model.classes_)
+
+        arrays = _flatten_trees(trees, n_classes)
+        bitvectors = _build_bitvectors(trees, arrays)
+        if bitvectors is not None:
+            arrays.update(bitvectors)
+
+        return cls(
+            arrays,
+            max_depth=max(tree.max_depth for tree in trees),
+            n_features=model.n_features_in_,
+            classes=model.classes_
+        )
+
+    def _prepare_input(self, X: np.ndarray) -> np.ndarray:
+        # O sklearn converte a entrada para float32 antes de comparar com os thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input of shape (n, {self.n_features}), got {X.shape}")
+        return X
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Retorna o índice global da folha de cada (linha, árvore) por travessia"""
+        X = self._prepare_input(X)
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        nodes = np.tile(self.roots, n_rows)
+        row_base = np.repeat(np.arange(n_rows, dtype=np.intp) * self.n_features, self.n_trees)
+
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_base + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def _exit_leaves(self, X: np.ndarray) -> np.ndarray:
+        """Índice da folha de saída de cada (linha, árvore) por vetores de bits"""
+        arrays = self.arrays
+        # Layout (nós, linhas): cada redução por árvore percorre memória contígua
+        false_nodes = X.T[arrays['node_feature']] > arrays['node_threshold'][:, None]
+        eliminated = np.bitwise_or.reduceat(
+            false_nodes * arrays['node_left_leaves'][:, None],
+            arrays['tree_node_offsets'], axis=0
+        )
+
+        remaining = ~eliminated
+        lowest_bit = remaining & (eliminated + np.uint64(1))
+        leaf_rank = np.frexp(lowest_bit.astype(np.float64))[1] - 1
+        return (arrays['tree_leaf_offsets'][:, None] + leaf_rank).T
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Probabilidades por classe, equivalentes a RandomForestClassifier.predict_proba"""
+        if self.use_bitvectors:
+            leaves = self._exit_leaves(self._prepare_input(X))
+            return self.arrays['leaf_value'][:, leaves].mean(axis=2).T
+
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    def get_stats(self) -> Dict:
+        return {
+            'n_trees': self.n_trees,
+            'n_nodes': len(self.feature),
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+            'bitvector_evaluation': self.use_bitvectors
+        }
+
+
+def _normalized_leaf_values(tree, n_classes: int) -> np.ndarray:
+    """Mesma normalização de DecisionTreeClassifier.predict_proba"""
+    proba = tree.value[:, 0, :n_classes].astype(np.float64)
+    normalizer = proba.sum(axis=1, keepdims=True)
+    normalizer[normalizer == 0.0] = 1.0
+    return proba / normalizer
+
+
+def _flatten_trees(trees, n_classes: int) -> Dict[str, np.ndarray]:
+    node_counts = np.array([tree.node_count for tree in trees], dtype=np.intp)
+    roots = np.zeros(len(trees), dtype=np.intp)
+    roots[1:] = np.cumsum(node_counts)[:-1]
+    total_nodes = int(node_counts.sum())
+
+    feature = np.zeros(total_nodes, dtype=np.intp)
+    threshold = np.zeros(total_nodes, dtype=np.float64)
+    children = np.zeros(2 * total_nodes, dtype=np.intp)
+    value = np.zeros((total_nodes, n_classes), dtype=np.float64)
+
+    for tree, offset in zip(trees, roots):
+        end = offset + tree.node_count
+        local_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == TREE_LEAF
+
+        feature[offset:end] = np.where(is_leaf, 0, tree.feature)
+        threshold[offset:end] = np.where(is_leaf, 0.0, tree.threshold)
+        children[2 * offset:2 * end:2] = offset + np.where(is_leaf, local_ids, tree.children_left)
+        children[2 * offset + 1:2 * end:2] = offset + np.where(is_leaf, local_ids, tree.children_right)
+        value[offset:end] = _normalized_leaf_values(tree, n_classes)
+
+    return {
+        'feature': feature,
+        'threshold': threshold,
+        'children': children,
+        'value': value,
+        'roots': roots
+    }
+
+
+def _build_bitvectors(trees, arrays: Dict[str, np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+    """Monta o layout QuickScorer; retorna None se alguma árvore tiver folhas demais"""
+    node_feature, node_threshold, node_left_leaves = [], [], []
+    tree_node_offsets, tree_leaf_offsets, leaf_rows = [], [], []
+    leaf_total = 0
+
+    for tree, root in zip(trees, arrays['roots']):
+        left, right = tree.children_left, tree.children_right
+
+        # Numera as folhas da esquerda para a direita (travessia em ordem)
+        leaf_rank = {}
+        first_leaf = np.zeros(tree.node_count, dtype=np.intp)
+        last_leaf = np.zeros(tree.node_count, dtype=np.intp)
+        stack = [(0, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if left[node] == TREE_LEAF:
+                first_leaf[node] = last_leaf[node] = leaf_rank[node] = len(leaf_rank)
+            elif expanded:
+                first_leaf[node] = first_leaf[left[node]]
+                last_leaf[node] = last_leaf[right[node]]
+            else:
+                stack.extend([(node, True), (right[node], False), (left[node], False)])
+
+        if len(leaf_rank) > BITVECTOR_MAX_LEAVES:
+            return None
+
+        tree_node_offsets.append(len(node_feature))
+        internal_nodes = [node for node in range(tree.node_count) if left[node] != TREE_LEAF]
+        for node in internal_nodes:
+            left_child = left[node]
+            span = int(last_leaf[left_child] - first_leaf[left_child] + 1)
+            left_bits = ((1 << span) - 1) << int(first_leaf[left_child])
+            node_feature.append(tree.feature[node])
+            node_threshold.append(tree.threshold[node])
+            node_left_leaves.append(left_bits)
+
+        if not internal_nodes:
+            # Árvore de folha única: nó neutro que nunca elimina folhas
+            node_feature.append(0)
+            node_threshold.append(np.inf)
+            node_left_leaves.append(0)
+
+        ordered_leaves = sorted(leaf_rank, key=leaf_rank.get)
+        leaf_rows.extend(root + node for node in ordered_leaves)
+        tree_leaf_offsets.append(leaf_total)
+        leaf_total += len(ordered_leaves)
+
+    return {
+        'node_feature': np.array(node_feature, dtype=np.intp),
+        'node_threshold': np.array(node_threshold, dtype=np.float64),
+        'node_left_leaves': np.array(node_left_leaves, dtype=np.uint64),
+        'tree_node_offsets': np.array(tree_node_offsets, dtype=np.intp),
+        'leaf_value': np.ascontiguousarray(arrays['value'][np.array(leaf_rows, dtype=np.intp)].T),
+        'tree_leaf_offsets': np.array(tree_leaf_offsets, dtype=np.intp)
+    }
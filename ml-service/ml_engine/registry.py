@@ -0,0 +1,154 @@
+"""
+Registro Versionado de Modelos
+Armazena florestas compiladas como artefatos versionados (arrays .npy planos +
+manifesto) que são abertos com memory-map, para que vários workers
+compartilhem a mesma cópia no page cache em vez de desserializar um pickle
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ml_engine.forest import CompiledForest
+
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+
+
+class ModelRegistryError(Exception):
+    """Erro ao publicar ou carregar um artefato de modelo"""
+
+
+class ModelRegistry:
+    """Diretório de artefatos versionados
+
+    Layout::
+
+        <root>/CURRENT                  versão ativa
+        <root>/<versão>/manifest.json   hash, esquema de features, data de treino
+        <root>/<versão>/<array>.npy     arrays da CompiledForest
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv('AML_MODEL_DIR', 'models')
+
+    def publish(self, engine: CompiledForest, feature_schema: List[str],
+                trained_at: Optional[datetime] = None, metadata: Optional[Dict] = None,
+                activate: bool = True) -> Dict:
+        """Grava uma nova versão do modelo e, opcionalmente, a torna ativa"""
+        if len(feature_schema) != engine.n_features:
+            raise ModelRegistryError(
+                f"Feature schema has {len(feature_schema)} columns, model expects {engine.n_features}"
+            )
+
+        trained_at = trained_at or datetime.now(timezone.utc)
+        array_info = {}
+        combined = hashlib.sha256()
+        for name in sorted(engine.arrays):
+            array = np.ascontiguousarray(engine.arrays[name])
+            digest = hashlib.sha256(array.tobytes()).hexdigest()
+            combined.update(f"{name}:{digest}".encode())
+            array_info[name] = {'sha256': digest, 'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+        model_hash = combined.hexdigest()
+        version = f"{trained_at.strftime('%Y%m%d%H%M%S')}-{model_hash[:8]}"
+        manifest = {
+            'version': version,
+            'sha256': model_hash,
+            'feature_schema': list(feature_schema),
+            'trained_at': trained_at.isoformat(),
+            'published_at': datetime.now(timezone.utc).isoformat(),
+            'n_features': engine.n_features,
+            'max_depth': engine.max_depth,
+            'classes': engine.classes.tolist(),
+            'arrays': array_info,
+            'metadata': metadata or {}
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        target_dir = os.path.join(self.root, version)
+        if os.path.exists(target_dir):
+            raise ModelRegistryError(f"Model version already exists: {version}")
+
+        # Escreve em um diretório temporário e renomeia: leitores nunca veem artefatos parciais
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            for name in array_info:
+                np.save(os.path.join(staging_dir, f"{name}.npy"), np.ascontiguousarray(engine.arrays[name]))
+            with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(staging_dir, target_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+
+        return manifest
+
+    def activate(self, version: str):
+        """Aponta CURRENT para uma versão publicada (troca atômica)"""
+        if not os.path.exists(os.path.join(self.root, version, MANIFEST_FILE)):
+            raise ModelRegistryError(f"Unknown model version: {version}")
+
+        pointer_tmp = os.path.join(self.root, f".{CURRENT_FILE}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(self.root, CURRENT_FILE))
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def list_versions(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            entry for entry in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, entry, MANIFEST_FILE))
+        )
+
+    def get_manifest(self, version: Optional[str] = None) -> Dict:
+        version = version or self.current_version()
+        if not version:
+            raise ModelRegistryError(f"No active model in {self.root}")
+
+        try:
+            with open(os.path.join(self.root, version, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ModelRegistryError(f"Unknown model version: {version}")
+
+    def load(self, version: Optional[str] = None, mmap: bool = True,
+             verify: bool = False) -> Tuple[CompiledForest, Dict]:
+        """Abre uma versão (a ativa por padrão) com os arrays em memory-map somente leitura"""
+        manifest = self.get_manifest(version)
+        version_dir = os.path.join(self.root, manifest['version'])
+
+        arrays = {}
+        for name, info in manifest['arrays'].items():
+            array = np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r' if mmap else None)
+            if list(array.shape) != info['shape'] or str(array.dtype) != info['dtype']:
+                raise ModelRegistryError(f"Array {name} does not match manifest of {manifest['version']}")
+            if verify and hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest() != info['sha256']:
+                raise ModelRegistryError(f"Array {name} failed hash verification in {manifest['version']}")
+            # Vista ndarray simples sobre o mesmo mapeamento (evita o overhead da subclasse memmap)
+            arrays[name] = np.asarray(array)
+
+        engine = CompiledForest(
+            arrays,
+            max_depth=manifest['max_depth'],
+            n_features=manifest['n_features'],
+            classes=manifest['classes']
+        )
+        return engine, manifest
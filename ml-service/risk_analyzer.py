@@ -1,6 +1,10 @@
 import numpy as np
 from typing import List, Dict
 from datetime import datetime, timedelta
+from indicators.matcher import get_shared_matcher
+
+# Categoria dos indicadores de mixer no matcher compartilhado
+MIXER_CATEGORY = 'mixer'
 
 class RiskAnalyzer:
     """
@@ -22,6 +26,11 @@ class RiskAnalyzer:
         'CRITICAL': 100
     }
     
+    def __init__(self):
+        # Todas as listas de indicadores compartilham um único autômato por processo
+        self._matcher = get_shared_matcher()
+        self._matcher.add_substrings(MIXER_CATEGORY, self.KNOWN_MIXERS)
+    
     def analyze_wallet(self, address: str, blockchain: str, transactions: List[Dict]) -> Dict:
         """Analisa o risco de uma carteira baseado em seu histórico"""
         
@@ -134,8 +143,7 @@ class RiskAnalyzer:
     
     def _is_mixer_address(self, address: str) -> bool:
         """Verifica se o endereço pertence a um mixer conhecido"""
-        address_lower = address.lower()
-        return any(mixer in address_lower for mixer in self.KNOWN_MIXERS)
+        return self._matcher.matches(address, MIXER_CATEGORY)
     
     def _has_suspicious_pattern(self, tx_hash: str) -> bool:
         """Verifica padrões suspeitos no hash da transação"""
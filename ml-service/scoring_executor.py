@@ -0,0 +1,143 @@
+"""
+Camada de execução para o scoring de carteiras
+Despacha o trabalho pesado de CPU para um ProcessPoolExecutor limitado, para
+que o event loop do FastAPI continue atendendo outras requisições
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from risk_analyzer import RiskAnalyzer
+
+# Instância do analisador em cada processo do pool (criada pelo initializer)
+_worker_analyzer: Optional[RiskAnalyzer] = None
+
+
+def _init_worker():
+    global _worker_analyzer
+    _worker_analyzer = RiskAnalyzer()
+
+
+def _analyze_wallet(address: str, blockchain: str, transactions: List[Dict]) -> Dict:
+    return _worker_analyzer.analyze_wallet(
+        address=address,
+        blockchain=blockchain,
+        transactions=transactions
+    )
+
+
+class QueueFullError(Exception):
+    """A fila do pool de scoring está cheia (backpressure -> HTTP 429)"""
+
+
+def _default_pool_size() -> int:
+    # Divide os núcleos entre os workers do gunicorn para não haver oversubscription
+    cores = os.cpu_count() or 1
+    server_workers = int(os.getenv('ML_WORKERS', '1'))
+    return max(1, cores // max(1, server_workers))
+
+
+class ScoringExecutor:
+    """Pool de processos limitado com fila de tamanho fixo
+
+    Deve ser usado a partir de um único event loop: o contador de pendências
+    só é alterado dentro do loop e não precisa de lock.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 inline_max_transactions: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv('ML_SCORING_WORKERS', _default_pool_size()))
+        self.max_pending = max_pending or int(os.getenv('ML_SCORING_QUEUE', self.max_workers * 4))
+        # Carteiras pequenas custam menos que o IPC do pool e são avaliadas inline
+        if inline_max_transactions is None:
+            inline_max_transactions = int(os.getenv('ML_INLINE_WALLET_MAX_TX', '50'))
+        self.inline_max_transactions = inline_max_transactions
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inline_analyzer = RiskAnalyzer()
+        self._pending = 0
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'inline': 0
+        }
+
+    def start(self):
+        """Cria o pool (chamar no processo que vai atender requisições, após o fork)"""
+        if self._pool is None:
+            # forkserver evita herdar threads do processo servidor
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=_init_worker
+            )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def analyze_wallet(self, address: str, blockchain: str, transactions: List[Dict]) -> Dict:
+        if len(transactions) <= self.inline_max_transactions:
+            self.stats['inline'] += 1
+            return self._inline_analyzer.analyze_wallet(
+                address=address,
+                blockchain=blockchain,
+                transactions=transactions
+            )
+
+        if self._pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise QueueFullError(f"Scoring queue full ({self._pending}/{self.max_pending})")
+
+        self.start()
+        self._pending += 1
+        self.stats['submitted'] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, _analyze_wallet, address, blockchain, transactions)
+            self.stats['completed'] += 1
+            return result
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending
+
+    def get_metrics(self) -> Dict:
+        return {
+            'queue_depth': self._pending,
+            'queue_capacity': self.max_pending,
+            'pool_workers': self.max_workers,
+            **self.stats
+        }
+
+    def render_prometheus(self) -> str:
+        """Métricas no formato de exposição de texto do Prometheus"""
+        lines = [
+            '# HELP ml_scoring_queue_depth Wallet scoring jobs queued or running in the process pool',
+            '# TYPE ml_scoring_queue_depth gauge',
+            f'ml_scoring_queue_depth {self._pending}',
+            '# HELP ml_scoring_queue_capacity Maximum pending wallet scoring jobs before HTTP 429',
+            '# TYPE ml_scoring_queue_capacity gauge',
+            f'ml_scoring_queue_capacity {self.max_pending}',
+            '# HELP ml_scoring_pool_workers Processes in the wallet scoring pool',
+            '# TYPE ml_scoring_pool_workers gauge',
+            f'ml_scoring_pool_workers {self.max_workers}',
+        ]
+        for name, value in self.stats.items():
+            lines.extend([
+                f'# HELP ml_scoring_{name}_total Wallet scoring jobs {name}',
+                f'# TYPE ml_scoring_{name}_total counter',
+                f'ml_scoring_{name}_total {value}',
+            ])
+        return '\n'.join(lines) + '\n'
@@ -5,8 +5,10 @@ Implementa múltiplas camadas de proteção contra cópia e engenharia reversa
 
 import hashlib
 import hmac
+import logging
 import os
 import sys
+import threading
 import time
 import psutil
 import platform
@@ -20,11 +22,27 @@ import json
 class AntiTamperingSystem:
     """Sistema de proteção contra tampering e cópia não autorizada"""
     
-    def __init__(self):
+    # Arquivos cujo hash é verificado em tempo de execução
+    CRITICAL_FILES = (
+        'app.py',
+        'risk_analyzer.py',
+        'compliance/regulatory_engine.py',
+        'advanced_ml/graph_neural_network.py'
+    )
+    
+    KDF_ITERATIONS = 100000
+    KDF_SALT = b'aml_crypto_salt_2024'
+    
+    def __init__(self, keystore_path: Optional[str] = None):
         self._hardware_fingerprint = self._generate_hardware_fingerprint()
         self._code_integrity_hashes = self._calculate_code_integrity()
         self._runtime_checks_active = True
-        self._obfuscation_key = self._derive_obfuscation_key()
+        self._keystore_path = keystore_path or os.getenv(
+            'AML_KEYSTORE_PATH', os.path.join(os.path.expanduser('~'), '.aml', 'keystore.json')
+        )
+        self._obfuscation_key = self._load_or_derive_obfuscation_key()
+        # Contexto Fernet reutilizado entre chamadas (recriado só quando a chave muda)
+        self._fernet: Optional[Fernet] = None
         
     def _generate_hardware_fingerprint(self) -> str:
         """Gera fingerprint único do hardware"""
@@ -54,16 +72,9 @@ class AntiTamperingSystem:
     
     def _calculate_code_integrity(self) -> Dict[str, str]:
         """Calcula hashes de integridade dos arquivos críticos"""
-        critical_files = [
-            'app.py',
-            'risk_analyzer.py',
-            'compliance/regulatory_engine.py',
-            'advanced_ml/graph_neural_network.py'
-        ]
-        
         integrity_hashes = {}
         
-        for file_path in critical_files:
+        for file_path in self.CRITICAL_FILES:
             try:
                 if os.path.exists(file_path):
                     with open(file_path, 'rb') as f:
@@ -78,17 +89,47 @@ class AntiTamperingSystem:
     def _derive_obfuscation_key(self) -> bytes:
         """Deriva chave de ofuscação baseada no hardware"""
         password = self._hardware_fingerprint.encode()
-        salt = b'aml_crypto_salt_2024'
         
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
-            salt=salt,
-            iterations=100000,
+            salt=self.KDF_SALT,
+            iterations=self.KDF_ITERATIONS,
         )
         
         return base64.urlsafe_b64encode(kdf.derive(password))
     
+    def _keystore_binding(self) -> str:
+        """Identifica fingerprint e parâmetros da KDF sem gravar o fingerprint em si"""
+        binding = f"{self._hardware_fingerprint}|{self.KDF_SALT.hex()}|{self.KDF_ITERATIONS}"
+        return hashlib.sha256(binding.encode()).hexdigest()
+    
+    def _load_or_derive_obfuscation_key(self) -> bytes:
+        """Chave do keystore local se ele pertence a este hardware; senão deriva (PBKDF2) e grava"""
+        binding = self._keystore_binding()
+        try:
+            with open(self._keystore_path, encoding='utf-8') as f:
+                stored = json.load(f)
+            key = stored['key'].encode()
+            if hmac.compare_digest(stored.get('binding', ''), binding) and len(base64.urlsafe_b64decode(key)) == 32:
+                return key
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            pass
+        
+        key = self._derive_obfuscation_key()
+        try:
+            directory = os.path.dirname(os.path.abspath(self._keystore_path))
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            staging = f"{self._keystore_path}.{os.getpid()}.tmp"
+            # Criado já com 0600: a chave nunca fica legível por outros usuários
+            fd = os.open(staging, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'binding': binding, 'key': key.decode()}, f)
+            os.replace(staging, self._keystore_path)
+        except OSError as e:
+            logging.warning(f"Could not write keystore {self._keystore_path}: {e}")
+        return key
+    
     def validate_execution_environment(self) -> Dict[str, bool]:
         """Valida ambiente de execução para detectar debugging/análise"""
         checks = {
@@ -174,11 +215,20 @@ class AntiTamperingSystem:
         # Se a execução for muito lenta, pode indicar debugging
         return execution_time < 0.1
     
+    def _cipher(self) -> Fernet:
+        fernet = self._fernet
+        if fernet is None:
+            fernet = self._fernet = Fernet(self._obfuscation_key)
+        return fernet
+    
+    def derive_subkey(self, purpose: str) -> bytes:
+        """Chave específica de um uso (ex.: etiquetas de IDs) derivada da chave de ofuscação"""
+        return hmac.new(self._obfuscation_key, purpose.encode(), hashlib.sha256).digest()
+    
     def obfuscate_sensitive_data(self, data: str) -> str:
         """Ofusca dados sensíveis usando criptografia"""
         try:
-            fernet = Fernet(self._obfuscation_key)
-            encrypted_data = fernet.encrypt(data.encode())
+            encrypted_data = self._cipher().encrypt(data.encode())
             return base64.urlsafe_b64encode(encrypted_data).decode()
         except Exception:
             return data
@@ -186,9 +236,8 @@ class AntiTamperingSystem:
     def deobfuscate_sensitive_data(self, obfuscated_data: str) -> str:
         """Desofusca dados sensíveis"""
         try:
-            fernet = Fernet(self._obfuscation_key)
             encrypted_data = base64.urlsafe_b64decode(obfuscated_data.encode())
-            decrypted_data = fernet.decrypt(encrypted_data)
+            decrypted_data = self._cipher().decrypt(encrypted_data)
             return decrypted_data.decode()
         except Exception:
             return obfuscated_data
@@ -250,6 +299,7 @@ class AntiTamperingSystem:
         
         # Limpar dados sensíveis da memória
         self._obfuscation_key = b'0' * 32
+        self._fernet = None
         self._hardware_fingerprint = '0' * 64
         
         # Log do evento (sem expor detalhes)
@@ -299,9 +349,22 @@ class CodeObfuscator:
             dummy_crypto_function()
             dummy_network_function()
 
-# Instância global do sistema de proteção
-_protection_system = AntiTamperingSystem()
+# Instância global do sistema de proteção, criada no primeiro uso (fingerprint, hashes e KDF
+# ficam fora do import)
+_protection_system: Optional[AntiTamperingSystem] = None
+_protection_lock = threading.Lock()
 
 def get_protection_system() -> AntiTamperingSystem:
     """Retorna instância do sistema de proteção"""
-    return _protection_system
\ No newline at end of file
+    global _protection_system
+    if _protection_system is None:
+        with _protection_lock:
+            if _protection_system is None:
+                _protection_system = AntiTamperingSystem()
+    return _protection_system
+
+def start_protection_warmup() -> threading.Thread:
+    """Constrói o sistema de proteção numa thread enquanto o restante da inicialização prossegue"""
+    thread = threading.Thread(target=get_protection_system, name='protection-warmup', daemon=True)
+    thread.start()
+    return thread
\ No newline at end of file
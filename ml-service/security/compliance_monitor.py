@@ -226,6 +226,12 @@ class ComplianceMonitor:
         
         logging.info("Compliance monitoring started")
     
+    def resume_after_fork(self):
+        """Recria a thread de monitoramento em um worker pré-forkado (threads não sobrevivem ao fork)"""
+        if self.monitoring_active and (self.monitor_thread is None or not self.monitor_thread.is_alive()):
+            self.monitor_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
+            self.monitor_thread.start()
+    
     def stop_monitoring(self):
         """Para monitoramento"""
         self.monitoring_active = False
@@ -0,0 +1,116 @@
+"""
+Serviço de Identificadores
+Gera IDs ordenáveis e à prova de adulteração para análises e requisições,
+no estilo ULID/Snowflake: 48 bits de tempo (ms), 16 bits de worker, 32 bits
+de sequência e uma etiqueta HMAC-SHA256 truncada (64 bits), codificados em
+base32 Crockford (32 caracteres). Ordem lexicográfica = ordem temporal e
+sem criptografia por ID. Worker e início da sequência aleatórios por
+processo tornam colisões entre réplicas improváveis; AML_WORKER_ID distinto
+por processo as elimina.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import itertools
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+CROCKFORD_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+RFC4648_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+# Mesmo valor por posição: base32 da stdlib + tradução = Crockford (que preserva a ordem)
+_TO_CROCKFORD = str.maketrans(RFC4648_ALPHABET, CROCKFORD_ALPHABET)
+_FROM_CROCKFORD = str.maketrans(CROCKFORD_ALPHABET, RFC4648_ALPHABET)
+
+ID_LENGTH = 32  # 160 bits / 5
+TAG_BYTES = 8
+
+
+class InvalidIdentifier(ValueError):
+    """ID malformado ou com etiqueta que não confere"""
+
+
+def _encode(raw: bytes) -> str:
+    return base64.b32encode(raw).decode('ascii').translate(_TO_CROCKFORD)
+
+
+def _decode(identifier: str) -> bytes:
+    if len(identifier) != ID_LENGTH:
+        raise InvalidIdentifier(f"Identifier must have {ID_LENGTH} characters")
+    try:
+        return base64.b32decode(identifier.upper().translate(_FROM_CROCKFORD))
+    except (binascii.Error, ValueError):
+        raise InvalidIdentifier("Invalid identifier encoding") from None
+
+
+class IDService:
+    """Gerador de IDs ``tempo | worker | sequência | etiqueta``
+
+    O worker vem de AML_WORKER_ID ou é sorteado (16 bits) por processo; a
+    sequência é um contador por processo que começa num valor aleatório de
+    32 bits. Os dois são refeitos quando o PID muda (workers pré-forkados
+    herdam o objeto do master). PIDs não servem de worker: réplicas em
+    contêineres repetem os mesmos PIDs pequenos. Dois IDs do mesmo processo
+    no mesmo milissegundo diferem pela sequência.
+    """
+
+    def __init__(self, key: bytes, worker_id: Optional[int] = None):
+        # Estado HMAC com a chave já processada; cada etiqueta parte de uma cópia
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+        self._fixed_worker = worker_id
+        self._pid: Optional[int] = None
+        self._worker = 0
+        self._sequence = itertools.count(secrets.randbits(32))
+        self._fork_lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> int:
+        pid = os.getpid()
+        if pid != self._pid:
+            with self._fork_lock:
+                if self._fixed_worker is not None:
+                    self._worker = self._fixed_worker & 0xFFFF
+                else:
+                    configured = os.getenv('AML_WORKER_ID')
+                    self._worker = (int(configured) if configured else secrets.randbits(16)) & 0xFFFF
+                # Um filho não continua a sequência do processo pai
+                self._sequence = itertools.count(secrets.randbits(32))
+                self._pid = pid
+        return self._worker
+
+    def _tag(self, body: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(body)
+        return mac.digest()[:TAG_BYTES]
+
+    def new_id(self) -> str:
+        worker = self.worker_id
+        # next() de itertools.count é atômico sob o GIL
+        sequence = next(self._sequence) & 0xFFFFFFFF
+        timestamp_ms = int(time.time() * 1000) & 0xFFFFFFFFFFFF
+        body = ((timestamp_ms << 48) | (worker << 32) | sequence).to_bytes(12, 'big')
+        return _encode(body + self._tag(body))
+
+    def parse(self, identifier: str) -> Dict:
+        """Campos do ID; InvalidIdentifier se a etiqueta não confere (ID forjado ou alterado)"""
+        raw = _decode(identifier)
+        body, tag = raw[:12], raw[12:]
+        if not hmac.compare_digest(tag, self._tag(body)):
+            raise InvalidIdentifier("Identifier tag mismatch")
+        value = int.from_bytes(body, 'big')
+        return {
+            'timestamp_ms': value >> 48,
+            'worker_id': (value >> 32) & 0xFFFF,
+            'sequence': value & 0xFFFFFFFF
+        }
+
+    def verify(self, identifier: str) -> bool:
+        try:
+            self.parse(identifier)
+            return True
+        except InvalidIdentifier:
+            return False
@@ -0,0 +1,120 @@
+"""
+Monitor de Integridade em Segundo Plano
+Executa a verificação completa do AntiTamperingSystem (hash dos arquivos
+críticos, varredura de processos, fingerprint de hardware, teste de timing)
+numa thread, em intervalo configurável e imediatamente quando um arquivo
+crítico muda, e publica o veredito em cache. O caminho das requisições só lê
+esse veredito, sem custo de verificação por transação.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from security.anti_tampering import AntiTamperingSystem
+
+
+class IntegrityMonitor:
+    """Veredito de integridade recalculado em segundo plano
+
+    O veredito é uma tupla imutável ``(íntegro, verificado_em)`` trocada por
+    atribuição simples, então leitores nunca veem um estado parcial. Se a
+    thread parar (ex.: processo pré-forkado sem ``resume_after_fork``), um
+    veredito mais velho que ``max_age`` é refeito na própria leitura.
+
+    Mudanças de arquivo são detectadas por ``os.stat`` (mtime, tamanho,
+    inode) a cada ``watch_interval`` segundos: sem dependência de inotify e
+    barato mesmo com intervalo curto.
+    """
+
+    def __init__(self, protection_system: AntiTamperingSystem, interval: float = 60.0,
+                 watch_interval: float = 2.0, max_age: Optional[float] = None):
+        self.protection_system = protection_system
+        self.interval = interval
+        self.watch_interval = min(watch_interval, interval)
+        self.max_age = max_age if max_age is not None else interval * 3
+        self._verdict: Optional[Tuple[bool, float]] = None
+        self._check_lock = threading.Lock()
+        self._file_state: Dict[str, Optional[Tuple]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'checks': 0, 'file_triggered_checks': 0, 'stale_reads': 0,
+                      'failures': 0, 'last_check_seconds': 0.0}
+
+    def check_now(self) -> bool:
+        """Executa a verificação completa e publica o veredito"""
+        with self._check_lock:
+            started = time.time()
+            try:
+                intact = self.protection_system.runtime_protection_check()
+            except Exception as e:
+                logging.error(f"Integrity check failed to run: {e}")
+                intact = False
+            finished = time.time()
+            self._verdict = (intact, finished)
+            self.stats['checks'] += 1
+            self.stats['last_check_seconds'] = round(finished - started, 4)
+            if not intact:
+                self.stats['failures'] += 1
+            return intact
+
+    def is_intact(self) -> bool:
+        """Veredito em cache (leitura de uma tupla); refeito na hora só se estiver velho demais"""
+        verdict = self._verdict
+        if verdict is None or time.time() - verdict[1] > self.max_age:
+            self.stats['stale_reads'] += 1
+            return self.check_now()
+        return verdict[0]
+
+    def _stat_files(self) -> Dict[str, Optional[Tuple]]:
+        state = {}
+        for path in self.protection_system.CRITICAL_FILES:
+            try:
+                info = os.stat(path)
+                state[path] = (info.st_mtime_ns, info.st_size, info.st_ino)
+            except OSError:
+                state[path] = None
+        return state
+
+    def start(self):
+        """Verifica agora e passa a verificar em segundo plano"""
+        self._stop.clear()
+        self._file_state = self._stat_files()
+        self.check_now()
+        self._start_thread()
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._monitor_loop, name='integrity-monitor', daemon=True)
+        self._thread.start()
+
+    def _monitor_loop(self):
+        next_check = time.time() + self.interval
+        while not self._stop.wait(self.watch_interval):
+            state = self._stat_files()
+            changed = state != self._file_state
+            self._file_state = state
+            if changed:
+                self.stats['file_triggered_checks'] += 1
+            if changed or time.time() >= next_check:
+                self.check_now()
+                next_check = time.time() + self.interval
+
+    def resume_after_fork(self):
+        """Recria a thread de verificação em um worker pré-forkado (threads não sobrevivem ao fork)"""
+        self._check_lock = threading.Lock()
+        if self._thread is not None and not self._stop.is_set() and not self._thread.is_alive():
+            self._start_thread()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> Dict:
+        verdict = self._verdict
+        return {
+            'intact': verdict[0] if verdict else None,
+            'last_check': verdict[1] if verdict else None,
+            'interval': self.interval,
+            **self.stats
+        }
@@ -0,0 +1,259 @@
+"""
+Limitação de Taxa Atômica
+Cada verificação é uma única ida ao Redis: um script Lua decide e registra
+o consumo de forma atômica, então workers concorrentes não ultrapassam o
+limite. Dois algoritmos:
+
+- ``gcra`` (Generic Cell Rate Algorithm): uma chave por identificador com o
+  "theoretical arrival time"; ``limit`` requisições por ``window`` segundos,
+  com rajadas de até ``limit``.
+- ``sliding_log``: log das ocorrências num sorted set; exatamente ``limit``
+  ocorrências em qualquer janela de ``window`` segundos (bloqueio de conta).
+
+O relógio é o do servidor Redis (``TIME``), comum a todos os workers. Na
+frente do Redis há um balde de tokens local por processo: uma ida ao Redis
+concede um lote de tokens que atende as próximas requisições do mesmo
+identificador sem rede, e uma negação fica em cache até o próximo token
+liberado. Tokens não usados voltam ao Redis na renovação seguinte.
+"""
+
+import logging
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import redis
+
+# Retorno dos scripts: {concedidos, restantes, ms até o limite zerar, ms até o próximo token}
+GCRA_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local interval = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local window = interval * limit
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+tat = math.max(tat - refund * interval, now)
+local available = math.floor((window - (tat - now)) / interval + 1e-9)
+local granted = math.min(requested, available)
+if granted > 0 then
+    tat = tat + granted * interval
+end
+if granted > 0 or refund > 0 then
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.max(1, math.ceil(tat - now)))
+end
+local retry_after = 0
+if granted < 1 then
+    retry_after = math.max(0, math.ceil(tat + interval - window - now))
+end
+return {granted, available - granted, math.ceil(tat - now), retry_after}
+"""
+
+SLIDING_LOG_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local granted = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    count = count + 1
+    granted = 1
+end
+local reset_after = 0
+local retry_after = 0
+if count > 0 then
+    local newest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+    reset_after = tonumber(newest[2]) + window - now
+    if granted == 0 then
+        local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+        retry_after = math.max(0, tonumber(oldest[2]) + window - now)
+    end
+end
+return {granted, limit - count, reset_after, retry_after}
+"""
+
+ALGORITHMS = ('gcra', 'sliding_log')
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Decisão de uma verificação, com os dados dos headers X-RateLimit-*"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # segundos até a cota voltar ao total
+    retry_after: float = 0.0  # segundos até a próxima requisição ser aceita (negadas)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(max(0, self.remaining)),
+            'X-RateLimit-Reset': str(int(-(-self.reset_after // 1)))
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, int(-(-self.retry_after // 1))))
+        return headers
+
+
+class _LocalBucket:
+    """Tokens concedidos pelo Redis a este processo para um identificador"""
+    __slots__ = ('tokens', 'remaining', 'reset_at', 'expires_at', 'blocked_until')
+
+    def __init__(self, tokens: int, remaining: int, reset_at: float, expires_at: float, blocked_until: float):
+        self.tokens = tokens
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.expires_at = expires_at
+        self.blocked_until = blocked_until
+
+
+class RateLimiter:
+    """Limitador de taxa atômico no Redis com um balde de tokens local na frente
+
+    ``local_lease`` é o maior lote de tokens pedido por ida ao Redis (0
+    desliga a camada local); o lote efetivo é no máximo 1/20 do limite,
+    então poucos tokens ficam presos num worker. Tokens locais valem por
+    ``local_ttl`` segundos; os não usados são devolvidos na renovação.
+
+    Sem suporte a Lua no servidor (scripts desabilitados, fakeredis sem
+    lupa), cai para um log deslizante numa transação MULTI/EXEC: ainda uma
+    ida ao Redis por verificação aceita, com lote local de 1 token.
+    """
+
+    def __init__(self, redis_client, prefix: str, algorithm: str = 'gcra', local_lease: int = 0,
+                 local_ttl: float = 1.0, max_local_keys: int = 100000):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown rate limit algorithm: {algorithm}")
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.algorithm = algorithm
+        self.local_lease = local_lease
+        self.local_ttl = local_ttl
+        self.max_local_keys = max_local_keys
+        self._script = redis_client.register_script(GCRA_SCRIPT if algorithm == 'gcra' else SLIDING_LOG_SCRIPT)
+        self.scripting = True
+        self._buckets: Dict[str, _LocalBucket] = {}
+        self._lock = threading.Lock()
+        self.stats = {'checks': 0, 'redis_calls': 0, 'local_hits': 0, 'local_denials': 0, 'denied': 0}
+
+    def key(self, identifier: str) -> str:
+        return f"{self.prefix}:{identifier}"
+
+    def hit(self, identifier: str, limit: int, window: float) -> RateLimitResult:
+        """Consome uma unidade da cota de ``identifier``"""
+        key = self.key(identifier)
+        now = time.monotonic()
+        refund = 0
+        with self._lock:
+            self.stats['checks'] += 1
+            bucket = self._buckets.get(key) if self.local_lease else None
+            if bucket is not None:
+                if now < bucket.expires_at and bucket.tokens > 0:
+                    bucket.tokens -= 1
+                    self.stats['local_hits'] += 1
+                    return RateLimitResult(True, limit, bucket.remaining + bucket.tokens,
+                                           max(0.0, bucket.reset_at - now))
+                if now < bucket.blocked_until:
+                    self.stats['local_denials'] += 1
+                    self.stats['denied'] += 1
+                    return RateLimitResult(False, limit, 0, max(0.0, bucket.reset_at - now),
+                                           bucket.blocked_until - now)
+                # Lote vencido: os tokens restantes voltam ao Redis nesta ida
+                refund = bucket.tokens
+                del self._buckets[key]
+
+        lease = max(1, min(self.local_lease, limit // 20)) if self.local_lease else 1
+        granted, remaining, reset_ms, retry_ms = self._acquire(key, limit, window, lease, refund)
+        result = RateLimitResult(granted > 0, limit, remaining + max(0, granted - 1),
+                                 reset_ms / 1000, retry_ms / 1000)
+        with self._lock:
+            self.stats['redis_calls'] += 1
+            if not result.allowed:
+                self.stats['denied'] += 1
+            if self.local_lease:
+                self._store_bucket(key, granted, remaining, time.monotonic(), result)
+        return result
+
+    def _store_bucket(self, key: str, granted: int, remaining: int, now: float, result: RateLimitResult):
+        # Chamado com self._lock adquirida
+        if len(self._buckets) >= self.max_local_keys:
+            self._prune(now)
+        bucket = self._buckets.get(key)
+        if bucket is not None and bucket.tokens > 0:
+            # Outra thread renovou o mesmo identificador ao mesmo tempo: soma os lotes
+            bucket.tokens += max(0, granted - 1)
+            bucket.remaining = remaining
+            return
+        self._buckets[key] = _LocalBucket(
+            tokens=max(0, granted - 1),
+            remaining=remaining,
+            reset_at=now + result.reset_after,
+            expires_at=now + self.local_ttl,
+            blocked_until=now + result.retry_after if not result.allowed else 0.0
+        )
+
+    def _prune(self, now: float):
+        expired = [key for key, bucket in self._buckets.items()
+                   if now >= bucket.expires_at and now >= bucket.blocked_until]
+        for key in expired:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_local_keys:
+            self._buckets.clear()
+
+    def _acquire(self, key: str, limit: int, window: float, lease: int, refund: int) -> Tuple[int, int, int, int]:
+        window_ms = int(window * 1000)
+        if self.scripting:
+            try:
+                if self.algorithm == 'gcra':
+                    args = [window_ms / limit, limit, lease, refund]
+                else:
+                    args = [window_ms, limit, secrets.token_hex(8)]
+                return tuple(int(value) for value in self._script(keys=[key], args=args))
+            except redis.ResponseError as e:
+                if 'unknown command' not in str(e).lower():
+                    raise
+                logging.warning(f"Redis server does not run Lua scripts ({e}): "
+                                f"rate limiting with MULTI/EXEC sliding log")
+                self.scripting = False
+        return self._acquire_pipelined(key, limit, window_ms)
+
+    def _acquire_pipelined(self, key: str, limit: int, window_ms: int) -> Tuple[int, int, int, int]:
+        """Log deslizante numa transação; a entrada de uma tentativa negada é removida em seguida"""
+        now = int(time.time() * 1000)
+        member = secrets.token_hex(8)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.zremrangebyscore(key, '-inf', now - window_ms)
+        pipe.zadd(key, {member: now})
+        pipe.pexpire(key, window_ms)
+        pipe.zcard(key)
+        pipe.zrange(key, 0, 0, withscores=True)
+        count, oldest = pipe.execute()[3:]
+        if count > limit:
+            self.redis_client.zrem(key, member)
+            retry_after = max(0, int(oldest[0][1]) + window_ms - now) if oldest else 0
+            return 0, 0, window_ms, retry_after
+        return 1, limit - count, window_ms, 0
+
+    def reset(self, identifier: str):
+        """Zera a cota (no Redis e no cache local deste processo)"""
+        key = self.key(identifier)
+        with self._lock:
+            self._buckets.pop(key, None)
+        self.redis_client.delete(key)
+
+    def get_stats(self) -> Dict:
+        return {
+            'algorithm': self.algorithm,
+            'scripting': self.scripting,
+            'local_keys': len(self._buckets),
+            **self.stats
+        }
@@ -10,23 +10,102 @@ import time
 import hashlib
 import hmac
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, jsonify, g, make_response
 from typing import Dict, List, Optional, Callable
 import redis
 import logging
+import os
+import threading
 from datetime import datetime, timedelta
 import re
 
+from security.rate_limiter import RateLimiter, RateLimitResult
+
+# Padrões compilados uma vez por processo (validação de entrada e de senha)
+SQL_INJECTION_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"(\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|EXEC|UNION)\b)",
+    r"(\b(OR|AND)\s+\d+\s*=\s*\d+)",
+    r"(--|#|/\*|\*/)",
+    r"(\bUNION\s+SELECT\b)",
+    r"(\'\s*(OR|AND)\s*\'\w*\'\s*=\s*\'\w*\')"
+)]
+XSS_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"<script[^>]*>.*?</script>",
+    r"javascript:",
+    r"on\w+\s*=",
+    r"<iframe[^>]*>",
+    r"<object[^>]*>",
+    r"<embed[^>]*>"
+)]
+COMMAND_INJECTION_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"[;&|`$(){}[\]\\]",
+    r"\b(cat|ls|pwd|whoami|id|uname|ps|netstat|ifconfig)\b",
+    r"(&&|\|\|)",
+    r"(\$\(|\`)"
+)]
+COMMON_PASSWORD_PATTERNS = [re.compile(pattern) for pattern in (
+    r'123456', r'password', r'qwerty', r'admin',
+    r'(.)\1{3,}',  # Repetição de caracteres
+    r'(012|123|234|345|456|567|678|789|890)',  # Sequências
+)]
+
+# Estado compartilhado pelo processo: um pool de conexões Redis e um segredo JWT estável
+_redis_pool: Optional[redis.ConnectionPool] = None
+_jwt_secret: Optional[str] = None
+_security_context: Optional['SecureAPIManager'] = None
+_context_lock = threading.Lock()
+
+
+def get_redis_pool() -> redis.ConnectionPool:
+    """Pool único para REDIS_URL (o redis-py recria as conexões sozinho após um fork)"""
+    global _redis_pool
+    if _redis_pool is None:
+        with _context_lock:
+            if _redis_pool is None:
+                _redis_pool = redis.ConnectionPool.from_url(
+                    os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                    decode_responses=True,
+                    max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+                )
+    return _redis_pool
+
+
+def get_jwt_secret() -> str:
+    """AML_JWT_SECRET; sem ela, um segredo aleatório gerado uma vez por processo
+
+    Com preload_app o segredo gerado no master é herdado por todos os
+    workers; processos independentes precisam de AML_JWT_SECRET para
+    aceitar os tokens uns dos outros.
+    """
+    global _jwt_secret
+    if _jwt_secret is None:
+        with _context_lock:
+            if _jwt_secret is None:
+                _jwt_secret = os.getenv('AML_JWT_SECRET')
+                if not _jwt_secret:
+                    logging.warning("AML_JWT_SECRET not set: using a random per-process JWT secret")
+                    _jwt_secret = secrets.token_urlsafe(32)
+    return _jwt_secret
+
+
 class SecureAPIManager:
     """Gerenciador de API segura com controles de certificação"""
     
-    def __init__(self, redis_client=None):
-        self.redis_client = redis_client or redis.Redis(decode_responses=True)
-        self.jwt_secret = secrets.token_urlsafe(32)
+    def __init__(self, redis_client=None, jwt_secret: Optional[str] = None):
+        self.redis_client = redis_client or redis.Redis(connection_pool=get_redis_pool())
+        self.jwt_secret = jwt_secret or get_jwt_secret()
+        self._hmac_key = self.jwt_secret.encode()
         self.rate_limit_window = 3600  # 1 hora
         self.max_requests_per_hour = 1000
         self.failed_login_threshold = 5
         self.account_lockout_duration = 1800  # 30 minutos
+        # Uma ida atômica ao Redis por verificação; as requisições passam antes pelo balde local
+        self.request_limiter = RateLimiter(
+            self.redis_client, 'rate_limit', algorithm='gcra',
+            local_lease=int(os.getenv('AML_RATE_LIMIT_LOCAL_LEASE', '10')),
+            local_ttl=float(os.getenv('AML_RATE_LIMIT_LOCAL_TTL', '1.0'))
+        )
+        self.login_limiter = RateLimiter(self.redis_client, 'failed_logins', algorithm='sliding_log')
         
     def generate_secure_token(self, user_id: str, permissions: List[str]) -> str:
         """Gera token JWT seguro"""
@@ -93,52 +172,27 @@ class SecureAPIManager:
     
     def _check_common_patterns(self, password: str) -> bool:
         """Verifica padrões comuns fracos"""
-        common_patterns = [
-            r'123456', r'password', r'qwerty', r'admin',
-            r'(.)\1{3,}',  # Repetição de caracteres
-            r'(012|123|234|345|456|567|678|789|890)',  # Sequências
-        ]
-        
         password_lower = password.lower()
-        return any(re.search(pattern, password_lower) for pattern in common_patterns)
+        return any(pattern.search(password_lower) for pattern in COMMON_PASSWORD_PATTERNS)
     
-    def rate_limit_check(self, identifier: str, limit: int = None, window: int = None) -> bool:
-        """Rate limiting (SOC 2 compliance)"""
+    def rate_limit_status(self, identifier: str, limit: int = None, window: int = None) -> RateLimitResult:
+        """Rate limiting (SOC 2 compliance) com cota restante e reset para os headers X-RateLimit-*"""
         limit = limit or self.max_requests_per_hour
         window = window or self.rate_limit_window
-        
-        key = f"rate_limit:{identifier}"
-        current = self.redis_client.get(key)
-        
-        if current is None:
-            self.redis_client.setex(key, window, 1)
-            return True
-        
-        if int(current) >= limit:
-            return False
-        
-        self.redis_client.incr(key)
-        return True
+        return self.request_limiter.hit(identifier, limit, window)
+    
+    def rate_limit_check(self, identifier: str, limit: int = None, window: int = None) -> bool:
+        """Rate limiting (SOC 2 compliance)"""
+        return self.rate_limit_status(identifier, limit, window).allowed
     
     def track_failed_login(self, identifier: str) -> bool:
-        """Rastreia tentativas de login falhadas"""
-        key = f"failed_login:{identifier}"
-        current = self.redis_client.get(key)
-        
-        if current is None:
-            self.redis_client.setex(key, self.account_lockout_duration, 1)
-            return True
-        
-        failed_count = int(current)
-        if failed_count >= self.failed_login_threshold:
-            return False  # Conta bloqueada
-        
-        self.redis_client.incr(key)
-        return True
+        """Rastreia tentativas de login falhadas (False = conta bloqueada)"""
+        return self.login_limiter.hit(identifier, self.failed_login_threshold,
+                                      self.account_lockout_duration).allowed
     
     def reset_failed_login(self, identifier: str):
         """Reset contador de login falhado após sucesso"""
-        self.redis_client.delete(f"failed_login:{identifier}")
+        self.login_limiter.reset(identifier)
     
     def log_security_event(self, event_type: str, user_id: str, details: Dict):
         """Log de eventos de segurança (auditoria)"""
@@ -185,47 +239,23 @@ class SecureAPIManager:
     
     def _check_sql_injection(self, value: str) -> bool:
         """Detecta possível injeção SQL"""
-        sql_patterns = [
-            r"(\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|EXEC|UNION)\b)",
-            r"(\b(OR|AND)\s+\d+\s*=\s*\d+)",
-            r"(--|#|/\*|\*/)",
-            r"(\bUNION\s+SELECT\b)",
-            r"(\'\s*(OR|AND)\s*\'\w*\'\s*=\s*\'\w*\')"
-        ]
-        
         value_upper = value.upper()
-        return any(re.search(pattern, value_upper, re.IGNORECASE) for pattern in sql_patterns)
+        return any(pattern.search(value_upper) for pattern in SQL_INJECTION_PATTERNS)
     
     def _check_xss(self, value: str) -> bool:
         """Detecta possível XSS"""
-        xss_patterns = [
-            r"<script[^>]*>.*?</script>",
-            r"javascript:",
-            r"on\w+\s*=",
-            r"<iframe[^>]*>",
-            r"<object[^>]*>",
-            r"<embed[^>]*>"
-        ]
-        
-        return any(re.search(pattern, value, re.IGNORECASE) for pattern in xss_patterns)
+        return any(pattern.search(value) for pattern in XSS_PATTERNS)
     
     def _check_command_injection(self, value: str) -> bool:
         """Detecta possível injeção de comando"""
-        cmd_patterns = [
-            r"[;&|`$(){}[\]\\]",
-            r"\b(cat|ls|pwd|whoami|id|uname|ps|netstat|ifconfig)\b",
-            r"(&&|\|\|)",
-            r"(\$\(|\`)"
-        ]
-        
-        return any(re.search(pattern, value, re.IGNORECASE) for pattern in cmd_patterns)
+        return any(pattern.search(value) for pattern in COMMAND_INJECTION_PATTERNS)
     
     def generate_csrf_token(self, session_id: str) -> str:
         """Gera token CSRF"""
         timestamp = str(int(time.time()))
         message = f"{session_id}:{timestamp}"
         signature = hmac.new(
-            self.jwt_secret.encode(),
+            self._hmac_key,
             message.encode(),
             hashlib.sha256
         ).hexdigest()
@@ -245,7 +275,7 @@ class SecureAPIManager:
             # Verificar assinatura
             message = f"{session_id}:{timestamp_str}"
             expected_signature = hmac.new(
-                self.jwt_secret.encode(),
+                self._hmac_key,
                 message.encode(),
                 hashlib.sha256
             ).hexdigest()
@@ -255,6 +285,22 @@ class SecureAPIManager:
         except (ValueError, TypeError):
             return False
 
+def get_security_context() -> SecureAPIManager:
+    """Gerenciador compartilhado por todos os decoradores e rotas do processo"""
+    global _security_context
+    if _security_context is None:
+        manager = SecureAPIManager()
+        with _context_lock:
+            if _security_context is None:
+                _security_context = manager
+    return _security_context
+
+
+def set_security_context(manager: Optional[SecureAPIManager]):
+    """Injeta o gerenciador usado pelos decoradores (None volta ao padrão no próximo uso)"""
+    global _security_context
+    _security_context = manager
+
 # Decoradores de segurança
 
 def require_auth(permissions: List[str] = None):
@@ -267,8 +313,7 @@ def require_auth(permissions: List[str] = None):
                 return jsonify({'error': 'Authentication required'}), 401
             
             token = auth_header.split(' ')[1]
-            secure_api = SecureAPIManager()
-            payload = secure_api.validate_token(token)
+            payload = get_security_context().validate_token(token)
             
             if not payload:
                 return jsonify({'error': 'Invalid or expired token'}), 401
@@ -294,11 +339,13 @@ def rate_limit(limit: int = 100, window: int = 3600):
             if hasattr(g, 'current_user'):
                 identifier = g.current_user.get('user_id', identifier)
             
-            secure_api = SecureAPIManager()
-            if not secure_api.rate_limit_check(identifier, limit, window):
-                return jsonify({'error': 'Rate limit exceeded'}), 429
-            
-            return f(*args, **kwargs)
+            status = get_security_context().rate_limit_status(identifier, limit, window)
+            if not status.allowed:
+                response = make_response(jsonify({'error': 'Rate limit exceeded'}), 429)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.headers.update(status.headers())
+            return response
         
         return decorated_function
     return decorator
@@ -309,8 +356,7 @@ def validate_input():
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if request.is_json:
-                secure_api = SecureAPIManager()
-                errors = secure_api.validate_input_sanitization(request.json)
+                errors = get_security_context().validate_input_sanitization(request.json)
                 
                 if errors:
                     return jsonify({'error': 'Input validation failed', 'details': errors}), 400
@@ -331,8 +377,7 @@ def require_csrf():
             if not csrf_token or not session_id:
                 return jsonify({'error': 'CSRF token required'}), 400
             
-            secure_api = SecureAPIManager()
-            if not secure_api.validate_csrf_token(csrf_token, session_id):
+            if not get_security_context().validate_csrf_token(csrf_token, session_id):
                 return jsonify({'error': 'Invalid CSRF token'}), 400
             
             return f(*args, **kwargs)
@@ -0,0 +1,49 @@
+"""
+Ponto de entrada de produção dos serviços de ML
+Executa o serviço escolhido sob gunicorn com workers pré-forkados.
+
+Uso:
+    python serve.py app                     # Flask (app.py)
+    python serve.py advanced                # Flask (advanced_app.py)
+    python serve.py main                    # FastAPI (main.py) com workers uvicorn
+    python serve.py app --workers 8 --threads 4 --bind 0.0.0.0:8000
+"""
+
+import argparse
+import os
+import sys
+
+SERVICES = {
+    'app': ('app:app', None),
+    'advanced': ('advanced_app:app', None),
+    'main': ('main:app', 'uvicorn.workers.UvicornWorker'),
+}
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run an ML service under gunicorn')
+    parser.add_argument('service', choices=sorted(SERVICES), nargs='?', default=os.getenv('ML_SERVICE', 'app'))
+    parser.add_argument('--workers', type=int, help='Worker processes (default: $ML_WORKERS or CPU count)')
+    parser.add_argument('--threads', type=int, help='Threads per worker (default: $ML_THREADS or 1)')
+    parser.add_argument('--bind', help='Bind address (default: $ML_BIND or 0.0.0.0:8000)')
+    args = parser.parse_args(argv)
+
+    target, worker_class = SERVICES[args.service]
+    overrides = {
+        'ML_WORKERS': args.workers,
+        'ML_THREADS': args.threads,
+        'ML_BIND': args.bind,
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+    if worker_class:
+        os.environ['ML_WORKER_CLASS'] = worker_class
+
+    os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', CONFIG_FILE, target])
+
+
+if __name__ == '__main__':
+    main()
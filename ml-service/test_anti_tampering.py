@@ -0,0 +1,36 @@
+import os
+import stat
+from unittest.mock import patch
+
+from security import anti_tampering
+from security.anti_tampering import AntiTamperingSystem
+
+
+def test_keystore_skips_kdf_on_restart(tmp_path):
+    keystore = str(tmp_path / 'keys' / 'keystore.json')
+    first = AntiTamperingSystem(keystore_path=keystore)
+    assert stat.S_IMODE(os.stat(keystore).st_mode) == 0o600
+
+    with patch.object(AntiTamperingSystem, '_derive_obfuscation_key', side_effect=AssertionError('KDF ran')):
+        second = AntiTamperingSystem(keystore_path=keystore)
+    assert second._obfuscation_key == first._obfuscation_key
+    assert second.deobfuscate_sensitive_data(first.obfuscate_sensitive_data('secret')) == 'secret'
+
+
+def test_keystore_bound_to_fingerprint(tmp_path):
+    keystore = str(tmp_path / 'keystore.json')
+    original = AntiTamperingSystem(keystore_path=keystore)
+    with patch.object(AntiTamperingSystem, '_generate_hardware_fingerprint', return_value='f' * 64):
+        moved = AntiTamperingSystem(keystore_path=keystore)
+    assert moved._obfuscation_key != original._obfuscation_key
+    assert moved._obfuscation_key == moved._derive_obfuscation_key()
+
+
+def test_protection_system_built_lazily_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(anti_tampering, '_protection_system', None)
+    monkeypatch.setenv('AML_KEYSTORE_PATH', str(tmp_path / 'keystore.json'))
+    with patch.object(AntiTamperingSystem, '__init__', autospec=True, return_value=None) as init:
+        anti_tampering.start_protection_warmup().join()
+        system = anti_tampering.get_protection_system()
+        assert anti_tampering.get_protection_system() is system
+    assert init.call_count == 1
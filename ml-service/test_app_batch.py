@@ -0,0 +1,48 @@
+import numpy as np
+
+from app import app, model
+
+
+def _transactions():
+    return [
+        {'amount': 0.5, 'fromAddress': '0x' + 'a' * 40, 'flags': []},
+        {'amount': 12000, 'fromAddress': '0x1234', 'flags': ['MIXER']},
+        {'amount': '75000', 'fromAddress': '0x' + 'b' * 40, 'flags': ['A', 'B']},
+        {'amount': 999.99},
+        {},
+    ]
+
+
+def test_batch_scores_match_single_transaction_scores():
+    transactions = _transactions()
+    batch = model.predict_batch(transactions)
+    assert batch == [model.predict(tx) for tx in transactions]
+
+    single_rows = np.vstack([model.extract_features(tx) for tx in transactions])
+    np.testing.assert_array_equal(model.extract_features_batch(transactions), single_rows)
+
+
+def test_batch_endpoint():
+    client = app.test_client()
+    response = client.post('/analyze/transactions/batch', json={'transactions': _transactions()})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 5
+    assert body['results'] == model.predict_batch(_transactions())
+
+
+def test_batch_endpoint_empty_and_malformed():
+    client = app.test_client()
+    empty = client.post('/analyze/transactions/batch', json={'transactions': []})
+    assert empty.status_code == 200 and empty.get_json() == {'results': [], 'count': 0}
+
+    assert client.post('/analyze/transactions/batch', json={'transactions': {'amount': 1}}).status_code == 400
+
+    not_objects = client.post('/analyze/transactions/batch', json={'transactions': [{'amount': 1}, 'tx', 3]})
+    assert not_objects.status_code == 400
+    assert not_objects.get_json()['invalid_indices'] == [1, 2]
+
+    bad_amount = client.post('/analyze/transactions/batch', json={'transactions': [{'amount': 'abc'}]})
+    assert bad_amount.status_code == 400
+    bad_flags = client.post('/analyze/transactions/batch', json={'transactions': [{'amount': 1, 'flags': None}]})
+    assert bad_flags.status_code == 400
@@ -0,0 +1,66 @@
+import json
+import time
+
+import pandas as pd
+
+from advanced_ml.graph_snapshot import GraphSnapshotter
+from backfill import backfill, main
+from indicators.entity_index import iter_entity_file
+
+
+def _rows(n, start=1700000000):
+    return [{'from_address': f'0x{i % 13:02x}', 'to_address': f'0x{(i * 5 + 1) % 13:02x}',
+             'value': float(i + 1), 'block_timestamp': start + i * 60, 'transaction_hash': f'0xh{i}'}
+            for i in range(n)]
+
+
+def test_backfill_csv_and_jsonl_into_snapshot(tmp_path):
+    csv_rows = _rows(300)
+    csv_rows[7]['value'] = 'n/a'
+    csv_rows[8]['from_entity'] = 'binance'
+    pd.DataFrame(csv_rows).to_csv(tmp_path / 'a.csv', index=False)
+    with open(tmp_path / 'b.jsonl', 'w') as f:
+        for row in _rows(50, start=1700100000):
+            f.write(json.dumps({'fromAddress': row['from_address'], 'toAddress': row['to_address'],
+                                'amount': row['value'], 'timestamp': row['block_timestamp'],
+                                'hash': row['transaction_hash'] + 'j'}) + '\n')
+
+    snapshot_dir = str(tmp_path / 'graph')
+    report = backfill([str(tmp_path / 'a.csv'), str(tmp_path / 'b.jsonl')], snapshot_dir, workers=2,
+                      chunk_bytes=1024, entity_output=str(tmp_path / 'entities.csv'))
+    assert report['tasks'] > 3
+    assert report['rows'] == 349 and report['skipped_rows'] == 1
+    assert report['inserted_edges'] == 349
+
+    store = GraphSnapshotter(snapshot_dir).load()
+    assert store.number_of_edges() == 349
+    assert store.number_of_nodes() == 13
+    # A mesma ordem e os mesmos agregados de inserções individuais
+    edge = store.out_edge_ids(store.node_id('0x00')).tolist()[0]
+    assert store.edge_data(edge)['amount'] == 1.0
+    assert store.tx_hash(edge) == '0xh0'
+    count, mean, _ = store.out_amount_stats(store.node_id('0x01'))
+    expected = [r['value'] for r in csv_rows if r['from_address'] == '0x01' and r['value'] != 'n/a']
+    expected += [r['value'] for r in _rows(50, start=1700100000) if r['from_address'] == '0x01']
+    assert count == len(expected) and abs(mean - sum(expected) / len(expected)) < 1e-9
+    assert list(iter_entity_file(str(tmp_path / 'entities.csv')))[0][:2] == ('0x08', 'binance')
+
+    # Uma segunda carga acrescenta ao snapshot existente
+    report = backfill([str(tmp_path / 'b.jsonl')], snapshot_dir, workers=1)
+    assert report['previous_edges'] == 349 and report['graph_edges'] == 399
+
+
+def test_retention_override_keeps_history_and_reports_drops(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('AML_GRAPH_RETENTION_DAYS', '30')
+    # 90 dias de histórico, um dia por linha
+    start = int(time.time()) - 90 * 86400
+    pd.DataFrame([dict(row, block_timestamp=start + i * 86400) for i, row in enumerate(_rows(90))]) \
+        .to_csv(tmp_path / 'history.csv', index=False)
+
+    assert main([str(tmp_path / 'history.csv'), '--snapshot-dir', str(tmp_path / 'default'), '--workers', '1']) == 0
+    output = capsys.readouterr()
+    assert 'inserted 31 edges' in output.out or 'inserted 30 edges' in output.out
+    assert 'fell outside the 30-day window' in output.err
+
+    report = backfill([str(tmp_path / 'history.csv')], str(tmp_path / 'full'), workers=1, retention_days=0)
+    assert report['inserted_edges'] == 90 and report['dropped_by_retention'] == 0
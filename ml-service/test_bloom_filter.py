@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+from indicators.bloom import BloomFilter
+from indicators.entity_index import EntityIndexManager
+from indicators.entity_table import EntityTable
+
+
+def test_no_false_negatives_and_bounded_fpr():
+    members = [f'0x{i:040x}' for i in range(20000)]
+    bloom = BloomFilter.build(members, false_positive_rate=0.01)
+
+    assert all(address in bloom for address in members)
+    false_positives = sum(f'bc1q{i:038x}' in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+    assert 0.005 < bloom.estimated_false_positive_rate() < 0.02
+
+    bloom.add('1NewAddress')
+    assert '1NewAddress' in bloom
+
+
+def test_save_and_mmap_load(tmp_path):
+    path = str(tmp_path / 'entities.bloom')
+    bloom = BloomFilter.build(['a', 'b', 'c'], fingerprint=b'sources-v1')
+    bloom.save(path)
+
+    loaded = BloomFilter.load(path)
+    assert loaded.num_bits == bloom.num_bits and loaded.count == 3
+    assert 'a' in loaded and 'c' in loaded
+    assert loaded.fingerprint.rstrip(b'\0') == b'sources-v1'
+
+
+def test_entity_index_prefilter(tmp_path):
+    (tmp_path / 'list.csv').write_text('address,entity_id,jurisdictions\n0xAAA,entity_a,KP;IR\n')
+    filter_path = str(tmp_path / 'entities.bloom')
+    manager = EntityIndexManager(sources=[str(tmp_path)], seed={'builtin': ['1Builtin']},
+                                 filter_path=filter_path)
+
+    # Sem dicionário no processo: filtro e tabela em mmap
+    assert manager.index.address_to_entity is None
+    assert manager.lookup('0xaaa') == 'entity_a'
+    assert manager.lookup('1Builtin') == 'builtin'
+    assert manager.lookup('0xbbb') is None
+    assert manager.index.get_entity('entity_a')['jurisdictions'] == ('KP', 'IR')
+    stats = manager.get_stats()
+    assert stats['prefilter']['items'] == 2 and stats['prefilter']['size_bytes'] > 0
+    assert stats['shared_table']['addresses'] == 2 and stats['addresses'] == 2
+
+    # Mesmas fontes: os arquivos existentes são reaproveitados sem ler as fontes
+    with patch('indicators.entity_index.build_entity_index', side_effect=AssertionError):
+        other_worker = EntityIndexManager(sources=[str(tmp_path)], seed={'builtin': ['1Builtin']},
+                                          filter_path=filter_path)
+    assert other_worker.index.prefilter.fingerprint == manager.index.prefilter.fingerprint
+    assert other_worker.lookup('0xAAA') == 'entity_a'
+
+    (tmp_path / 'more.csv').write_text('address,entity_id\n0xBBB,entity_b\n')
+    manager.reload()
+    assert manager.lookup('0xbbb') == 'entity_b'
+
+
+def test_entity_table_resolves_hash_collisions(tmp_path):
+    path = str(tmp_path / 'entities.table')
+    addresses = {f'0x{i:040x}': f'entity_{i % 3}' for i in range(1000)}
+    EntityTable.write(path, addresses, {'entity_0': {}, 'entity_1': {}, 'entity_2': {}}, [])
+    table = EntityTable.load(path)
+
+    assert len(table) == 1000
+    assert all(table.get(address) == entity_id for address, entity_id in addresses.items())
+    assert table.get('0xmissing') is None
+    # Hash igual, endereço diferente: não é atribuído
+    assert table.get('0xmissing', table.keys[0].item()) is None
+    assert table.get(f'0x{7:040x}') is table.get(f'0x{4:040x}')
@@ -0,0 +1,131 @@
+import random
+import threading
+from unittest.mock import patch
+
+import networkx as nx
+
+from advanced_ml.clustering import ClusterIndex
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+def _is_mixer(address):
+    return 'mixer' in address
+
+
+def _reference_clusters(store):
+    graph = nx.Graph()
+    graph.add_nodes_from(store.nodes)
+    for src, dst, amount in zip(store.src.tolist(), store.dst.tolist(), store.amount.tolist()):
+        graph.add_edge(store.address(src), store.address(dst))
+    clusters = {}
+    for component in nx.connected_components(graph):
+        members = frozenset(component)
+        volume = sum(amount for src, amount in zip(store.src.tolist(), store.amount.tolist())
+                     if store.address(src) in members)
+        clusters[members] = (len(members), round(volume, 6), sum(_is_mixer(a) for a in members))
+    return clusters
+
+
+def _index_clusters(store, index):
+    groups = {}
+    for address in store.nodes:
+        root = index.cluster(store.node_id(address))[0]
+        groups.setdefault(root, set()).add(address)
+    result = {}
+    for root, members in groups.items():
+        _, size, volume, mixers = index.cluster(root)
+        result[frozenset(members)] = (size, round(volume, 6), mixers)
+    return result
+
+
+def test_incremental_union_find_matches_connected_components():
+    rng = random.Random(3)
+    store = TransactionGraphStore(chunk_size=16)
+    index = ClusterIndex(store, _is_mixer)
+    for i in range(400):
+        a = f'mixer{rng.randrange(5)}' if i % 37 == 0 else f'0x{rng.randrange(300):04x}'
+        b = f'0x{rng.randrange(300):04x}'
+        amount = rng.uniform(1, 100)
+        index.add_edge(store.add_node(a), store.add_node(b), amount)
+        store.add_transaction(a, b, amount, 1000 + i, f'tx{i}')
+
+    expected = _reference_clusters(store)
+    assert _index_clusters(store, index) == expected
+    assert index.cluster_count == len(expected)
+
+    rebuilt = ClusterIndex.from_store(store, _is_mixer)
+    assert _index_clusters(store, rebuilt) == expected
+
+
+def test_eviction_rebuilds_clusters():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    gnn.graph.retention_seconds = 100
+    gnn.graph.bucket_seconds = 10
+    # Ponte antiga liga dois grupos; depois que ela sai pela retenção, os grupos se separam
+    gnn.add_transaction(TransactionEdge('a1', 'b1', 50.0, 0, 'bridge', []))
+    for i in range(20):
+        gnn.add_transaction(TransactionEdge(f'a{i % 3}', f'a{(i + 1) % 3}', 10.0, 50 + i, f'a{i}', []))
+        gnn.add_transaction(TransactionEdge(f'b{i % 3}', 'tornado_mixer', 5.0, 50 + i, f'b{i}', []))
+    joined = gnn.analyze_address_clustering(['a0', 'b0'])['clusters']
+    assert len(joined) == 1 and joined[0]['size'] == 7 and joined[0]['mixer_count'] == 1
+
+    gnn.add_transaction(TransactionEdge('a0', 'a1', 10.0, 140, 'late', []))
+    gnn.graph.wait_for_compaction()
+    gnn.cluster_index.wait_for_rebuild()
+    assert gnn.cluster_index.stats['rebuilds'] >= 1
+    assert gnn.analyze_address_clustering(['a0', 'b0'])['total_clusters'] == 0
+    split = gnn.analyze_address_clustering(['a0', 'a1', 'a2'])['clusters'][0]
+    assert split['size'] == 3 and split['total_volume'] == 210.0 and split['risk_score'] == 15
+
+
+def test_cluster_risk_does_not_saturate_on_a_giant_component():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    # Um hub liga 200 endereços num só componente
+    for i in range(200):
+        gnn.add_transaction(TransactionEdge('hub', f'w{i}', 1.0, 1000 + i, f'tx{i}', []))
+    cluster = gnn.analyze_address_clustering(['w1', 'w2'])['clusters'][0]
+    assert cluster['size'] == 201
+    assert cluster['risk_score'] == 10
+
+
+def test_background_rebuild_replays_edges_added_meanwhile():
+    lock = threading.RLock()
+    store = TransactionGraphStore(chunk_size=16)
+    index = ClusterIndex(store, _is_mixer, lock=lock)
+    rng = random.Random(11)
+
+    def add(a, b):
+        with lock:
+            amount = rng.uniform(1, 100)
+            index.add_edge(store.add_node(a), store.add_node(b), amount)
+            store.add_transaction(a, b, amount, 1000, f'tx{a}{b}')
+
+    for i in range(100):
+        add(f'0x{rng.randrange(60):04x}', f'0x{rng.randrange(60):04x}')
+    released = threading.Event()
+    computing = threading.Event()
+    components = ClusterIndex._components
+
+    def slow_components(*args):
+        computing.set()
+        assert released.wait(5)
+        return components(*args)
+
+    with patch.object(ClusterIndex, '_components', staticmethod(slow_components)):
+        with lock:
+            index.schedule_rebuild()
+        assert computing.wait(5)
+        # Fora da trava durante o cálculo: as arestas novas entram e são reaplicadas na troca
+        for i in range(50):
+            target = f'mixer{rng.randrange(3)}' if i % 10 == 0 else f'0x{rng.randrange(90):04x}'
+            add(f'0x{rng.randrange(90):04x}', target)
+        released.set()
+        index.wait_for_rebuild()
+
+    assert index.stats['rebuilds'] == 1 and index.stats['replayed_edges'] == 50
+    expected = _reference_clusters(store)
+    assert _index_clusters(store, index) == expected
+    assert index.cluster_count == len(expected)
@@ -0,0 +1,69 @@
+import random
+import time
+from unittest.mock import patch
+
+import networkx as nx
+
+from advanced_ml.cycle_detection import find_cycles_through
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+def _store(edges):
+    store = TransactionGraphStore(chunk_size=8)
+    for i, (src, dst, amount, timestamp) in enumerate(edges):
+        store.add_transaction(src, dst, amount, timestamp, f'tx{i}')
+    return store
+
+
+def test_matches_simple_cycles_without_time_limits():
+    rng = random.Random(1)
+    edges = [(f'n{rng.randrange(10)}', f'n{rng.randrange(10)}', 1.0, i) for i in range(35)]
+    store = _store(edges)
+    reference = nx.DiGraph([(src, dst) for src, dst, _, _ in edges])
+
+    for address in reference.nodes():
+        expected = {tuple(c) for c in nx.simple_cycles(reference) if address in c and 2 <= len(c) <= 5}
+        found = find_cycles_through(store, address, max_length=5, max_cycles=10000)
+        assert not found['truncated']
+        assert {tuple(sorted(store.address(n) for n in c['nodes'])) for c in found['cycles']} == \
+            {tuple(sorted(c)) for c in expected}
+        assert len(found['cycles']) == len(expected)
+
+
+def test_time_order_window_and_retention():
+    store = _store([
+        ('a', 'b', 100.0, 10), ('b', 'c', 98.0, 20), ('c', 'a', 95.0, 30),  # ciclo válido
+        ('a', 'd', 100.0, 10), ('d', 'a', 50.0, 15),                         # retenção baixa
+        ('a', 'e', 100.0, 50), ('e', 'a', 99.0, 40),                         # volta antes de sair
+        ('a', 'f', 100.0, 10), ('f', 'a', 100.0, 10000),                     # fora da janela
+    ])
+    found = find_cycles_through(store, 'a', time_window=3600, retention_threshold=0.9)
+    assert [[store.address(n) for n in c['nodes']] for c in found['cycles']] == [['a', 'b', 'c']]
+    assert found['cycles'][0]['amount_retention'] == 0.95
+
+    untimed = find_cycles_through(store, 'a')
+    assert len(untimed['cycles']) == 4
+
+
+def test_hub_search_is_capped():
+    # Grafo completo de 40 nós: enumeração irrestrita de ciclos seria inviável
+    nodes = [f'h{i}' for i in range(40)]
+    store = _store([(u, v, 1.0, 0) for u in nodes for v in nodes if u != v])
+
+    started = time.time()
+    found = find_cycles_through(store, 'h0', max_length=8, max_cycles=1000, max_expansions=5000)
+    assert found['truncated']
+    assert time.time() - started < 2
+
+
+def test_gnn_round_tripping_uses_bounded_search():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    for i, (src, dst) in enumerate([('a', 'b'), ('b', 'a'), ('a', 'c')]):
+        gnn.add_transaction(TransactionEdge(src, dst, 100.0, 1000 + i, f'tx{i}', []))
+
+    result = gnn.detect_round_tripping('a')
+    assert [c['cycle_path'] for c in result['detected_cycles']] == [['a', 'b']]
+    assert result['max_risk_score'] == 70 and not result['truncated']
+    assert gnn.detect_round_tripping('unknown')['detected_cycles'] == []
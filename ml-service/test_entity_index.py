@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from blockchain_analysis.chain_intelligence import BlockchainType, ChainIntelligence
+from indicators.entity_index import EntityIndexManager, build_entity_index
+
+
+def _write_sources(tmp_path):
+    (tmp_path / 'ofac.csv').write_text(
+        'address,entity_id,entity_type,risk_level,jurisdictions\n'
+        '0xAbC0000000000000000000000000000000000001,lazarus,darknet,CRITICAL,KP;Unknown\n'
+        ',missing_address,wallet,LOW,\n'
+    )
+    (tmp_path / 'exchanges.jsonl').write_text(
+        json.dumps({'entity_id': 'kraken', 'entity_type': 'exchange',
+                    'addresses': ['bc1qkraken0', 'bc1qkraken1']}) + '\n'
+        'not json\n'
+    )
+
+
+def test_build_from_csv_and_jsonl(tmp_path):
+    _write_sources(tmp_path)
+    index = build_entity_index([str(tmp_path)], seed={'builtin': ['1BuiltinAddr']})
+
+    assert len(index) == 4
+    assert index.lookup('0xabc0000000000000000000000000000000000001') == 'lazarus'
+    assert index.lookup('bc1qkraken1') == 'kraken'
+    assert index.lookup('1BuiltinAddr') == 'builtin'
+    assert index.lookup('1builtinaddr') is None
+    assert index.get_entity('lazarus')['jurisdictions'] == ('KP', 'Unknown')
+    # entity_ids repetidos compartilham a mesma string
+    assert index.lookup('bc1qkraken0') is index.lookup('bc1qkraken1')
+
+
+def test_reload_swaps_index(tmp_path):
+    _write_sources(tmp_path)
+    manager = EntityIndexManager(sources=[str(tmp_path)])
+    old_index = manager.index
+    assert manager.lookup('0xdead') is None
+
+    (tmp_path / 'new.csv').write_text('address,entity_id\n0xDEAD,new_entity\n')
+    manager.reload_async().join()
+
+    assert manager.lookup('0xdead') == 'new_entity'
+    assert old_index.lookup('0xdead') is None
+    assert manager.get_stats()['reload_count'] == 1
+
+
+def test_chain_intelligence_attribution(tmp_path, monkeypatch):
+    _write_sources(tmp_path)
+    monkeypatch.setenv('AML_ENTITY_SOURCES', str(tmp_path))
+    with patch.object(ChainIntelligence, '_validate_license'):
+        intelligence = ChainIntelligence('test')
+
+    builtin = intelligence.analyze_address_attribution(
+        '0x12D66f87A04A9E220743712cE6d9bB1B5616B8Fc', BlockchainType.ETHEREUM)
+    assert builtin['entity_match'] == 'tornado_cash_mixer'
+    assert 'DIRECT_MATCH' in builtin['attribution_methods']
+
+    listed = intelligence.analyze_address_attribution('bc1qkraken0', BlockchainType.BITCOIN)
+    assert listed['entity_match'] == 'kraken'
+
+
+def test_watcher_resumes_after_fork(tmp_path):
+    _write_sources(tmp_path)
+    manager = EntityIndexManager(sources=[str(tmp_path)])
+    manager.start_watching(0.01)
+    # Estado do worker após o fork: a flag foi copiada, a thread do master não existe mais
+    manager._watch_thread = threading.Thread(target=lambda: None)
+    manager.resume_after_fork()
+    assert manager._watch_thread.is_alive()
+
+    (tmp_path / 'new.csv').write_text('address,entity_id\n0xDEAD,new_entity\n')
+    for _ in range(200):
+        if manager.lookup('0xdead'):
+            break
+        time.sleep(0.01)
+    manager.stop_watching()
+    assert manager.lookup('0xdead') == 'new_entity'
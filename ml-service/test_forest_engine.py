@@ -0,0 +1,55 @@
+import numpy as np
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+from ml_engine.forest import CompiledForest
+
+
+def _sample_features(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    features = rng.random((n_rows, 5)) * [3, 1, 1, 50, 4]
+    features[:, 1:3] = np.round(features[:, 1:3])
+    return features
+
+
+def test_parity_with_trained_forest():
+    rng = np.random.default_rng(42)
+    X_train = rng.random((1000, 5))
+    y_train = (X_train[:, 0] * 100 > 50).astype(int)
+    model = RandomForestClassifier(n_estimators=100, random_state=42).fit(X_train, y_train)
+    engine = CompiledForest.from_sklearn(model)
+
+    X = np.vstack([X_train[:200], _sample_features(500)])
+    expected = model.predict_proba(X)
+
+    assert engine.use_bitvectors
+    np.testing.assert_allclose(engine.predict_proba(X), expected, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(engine.value[engine.apply(X)].mean(axis=1), expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+
+
+def test_parity_with_deep_trees_uses_traversal():
+    rng = np.random.default_rng(7)
+    X_train = rng.random((2000, 5))
+    y_train = rng.integers(0, 3, 2000)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X_train, y_train)
+    engine = CompiledForest.from_sklearn(model)
+
+    X = _sample_features(300, seed=3)
+    assert not engine.use_bitvectors
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_parity_with_shipped_model():
+    model = joblib.load('aml_model.pkl')
+    engine = CompiledForest.from_sklearn(model)
+
+    X = _sample_features(1000, seed=1)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(engine.predict_proba(X[:1]), model.predict_proba(X[:1]), rtol=0, atol=1e-12)
+
+
+if __name__ == "__main__":
+    test_parity_with_trained_forest()
+    test_parity_with_deep_trees_uses_traversal()
+    test_parity_with_shipped_model()
+    print("Paridade com sklearn verificada")
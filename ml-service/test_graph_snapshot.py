@@ -0,0 +1,105 @@
+import os
+import random
+from unittest.mock import patch
+
+import numpy as np
+
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_snapshot import GraphSnapshotter, read_edge_log
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+def _transactions(n_nodes, n_edges, seed=0, start=1700000000):
+    rng = random.Random(seed)
+    return [
+        (f'0x{rng.randrange(n_nodes):04x}', f'0x{rng.randrange(n_nodes):04x}',
+         rng.uniform(1, 500), start + i * 60, f'tx{seed}-{i}', ['flag'] if i % 17 == 0 else None)
+        for i in range(n_edges)
+    ]
+
+
+def _assert_same_graph(restored, original):
+    assert restored.number_of_nodes() == original.number_of_nodes()
+    assert restored.number_of_edges() == original.number_of_edges()
+    assert restored.number_of_pairs() == original.number_of_pairs()
+    np.testing.assert_array_equal(restored.src, original.src)
+    np.testing.assert_array_equal(restored.amount, original.amount)
+    for address in original.nodes:
+        node = original.node_id(address)
+        assert restored.node_id(address) == node
+        assert restored.out_edge_ids(node).tolist() == original.out_edge_ids(node).tolist()
+        assert restored.in_edge_ids(node).tolist() == original.in_edge_ids(node).tolist()
+        assert restored.out_amount_stats(node) == original.out_amount_stats(node)
+        for neighbor in original.successors(address):
+            assert restored[address][neighbor] == original[address][neighbor]
+
+
+def test_snapshot_roundtrip_with_pending_edges_and_evictions(tmp_path):
+    store = TransactionGraphStore(chunk_size=16, max_edges=300)
+    for record in _transactions(40, 500):
+        store.add_transaction(*record)
+    assert store.get_stats()['pending_edges'] > 0
+    assert store.get_stats()['evictions'] > 0
+
+    snapshotter = GraphSnapshotter(str(tmp_path))
+    manifest = snapshotter.save(store)
+    assert manifest['edges'] == store.number_of_edges()
+
+    restored = GraphSnapshotter(str(tmp_path)).load(chunk_size=16, max_edges=300)
+    _assert_same_graph(restored, store)
+
+    # O grafo restaurado continua aceitando arestas sem alterar os arquivos do snapshot
+    for record in _transactions(40, 50, seed=1, start=1800000000):
+        restored.add_transaction(*record)
+        store.add_transaction(*record)
+    _assert_same_graph(restored, store)
+    again = GraphSnapshotter(str(tmp_path)).load(chunk_size=16, max_edges=300)
+    assert again.number_of_edges() == manifest['edges']
+
+
+def test_edge_log_replay_and_truncated_tail(tmp_path):
+    store = TransactionGraphStore(chunk_size=16)
+    snapshotter = GraphSnapshotter(str(tmp_path))
+    records = _transactions(30, 120)
+    for record in records[:80]:
+        store.add_transaction(*record)
+    snapshotter.save(store)
+    for record in records[80:]:
+        store.add_transaction(*record)
+        snapshotter.log_transaction(*record)
+    snapshotter.stop()
+
+    # Simula uma queda no meio da escrita do último registro
+    log_path = os.path.join(str(tmp_path), 'edges-000001.log')
+    with open(log_path, 'ab') as f:
+        f.write(b'\x00' * 10)
+
+    reloaded = GraphSnapshotter(str(tmp_path))
+    restored = reloaded.load(chunk_size=16)
+    assert reloaded.stats['restored_edges'] == 80
+    assert reloaded.stats['replayed_edges'] == 40
+    _assert_same_graph(restored, store)
+    assert len(list(read_edge_log(log_path))) == 40
+    assert os.path.getsize(log_path) == list(read_edge_log(log_path))[-1][0]
+
+
+def test_gnn_warm_restart(tmp_path):
+    directory = str(tmp_path)
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+        gnn.enable_persistence(directory, interval=3600)
+        for record in _transactions(20, 60):
+            gnn.add_transaction(TransactionEdge(*record[:5], risk_flags=record[5] or []))
+        gnn.persistence.save(gnn.graph)
+        for record in _transactions(20, 10, seed=2, start=1700100000):
+            gnn.add_transaction(TransactionEdge(*record[:5], risk_flags=record[5] or []))
+        expected = gnn.comprehensive_analysis('0x0001')
+        gnn.persistence.stop()
+
+        restarted = GraphNeuralNetwork('test')
+        restarted.enable_persistence(directory, interval=3600)
+
+    assert restarted.persistence.stats['replayed_edges'] == 10
+    assert restarted.graph.number_of_edges() == 70
+    assert restarted.comprehensive_analysis('0x0001') == expected
+    restarted.persistence.stop()
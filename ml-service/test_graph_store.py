@@ -0,0 +1,243 @@
+import random
+import threading
+import time
+from unittest.mock import patch
+
+import networkx as nx
+import numpy as np
+
+from advanced_ml import graph_store
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+def _random_transactions(n_nodes, n_edges, seed=0):
+    rng = random.Random(seed)
+    return [
+        TransactionEdge(f'0x{rng.randrange(n_nodes):04x}', f'0x{rng.randrange(n_nodes):04x}',
+                        amount=rng.choice([100.0, 95.0, 90.25, rng.uniform(1, 500)]),
+                        timestamp=1700000000 + i, tx_hash=f'tx{i}', risk_flags=[])
+        for i in range(n_edges)
+    ]
+
+
+def _gnn():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    gnn.graph.chunk_size = 7
+    return gnn
+
+
+def test_adjacency_matches_digraph():
+    store = TransactionGraphStore(chunk_size=5)
+    reference = nx.DiGraph()
+    for tx in _random_transactions(30, 200):
+        store.add_transaction(tx.from_addr, tx.to_addr, tx.amount, tx.timestamp, tx.tx_hash)
+        reference.add_edge(tx.from_addr, tx.to_addr, amount=tx.amount, timestamp=tx.timestamp)
+
+    assert store.number_of_nodes() == reference.number_of_nodes()
+    assert store.number_of_edges() == 200
+    assert store.get_stats()['pending_edges'] < 5
+    for node in reference.nodes():
+        assert list(store.successors(node)) == list(reference.successors(node))
+        assert sorted(store.predecessors(node)) == sorted(reference.predecessors(node))
+        for neighbor in reference.successors(node):
+            assert store[node][neighbor]['amount'] == reference[node][neighbor]['amount']
+            assert store[node][neighbor]['timestamp'] == reference[node][neighbor]['timestamp']
+        assert store.reachable(node) == {store.node_id(n) for n in nx.descendants(reference, node) | {node}}
+
+
+def test_node_transactions_and_hashes():
+    store = TransactionGraphStore(chunk_size=2)
+    store.add_transaction('a', 'b', 1.0, 1, '0xaa', ['HIGH_VALUE'])
+    store.add_transaction('b', 'c', 2.0, 2, '0xbb')
+    store.add_transaction('c', 'a', 3.0, 3, '0xcc')
+
+    assert store.nodes['a']['transactions'] == ['0xaa', '0xcc']
+    assert store['a']['b']['risk_flags'] == ['HIGH_VALUE']
+    assert 'c' in store['b'] and 'a' not in store['b']
+    assert set(store.subgraph(['a', 'b']).edges()) == {('a', 'b')}
+
+
+def test_repeated_transfers_are_aggregated():
+    store_gnn = _gnn()
+    # 12 transferências iguais para apenas 3 destinos: DiGraph veria só 3 arestas
+    for i in range(12):
+        store_gnn.add_transaction(TransactionEdge('hub', f'mule{i % 3}', 100.0, 1000 + i, f'tx{i}', []))
+    store_gnn.add_transaction(TransactionEdge('mule0', 'mule1', 40.0, 2000, 'tx12', []))
+
+    smurfing = store_gnn.detect_smurfing_pattern('hub')
+    assert smurfing['detected'] and smurfing['transaction_count'] == 12
+    assert smurfing['total_amount'] == 1200.0
+
+    pair = store_gnn.graph.pair_stats('hub', 'mule1')
+    assert pair['count'] == 4 and pair['total_amount'] == 400.0
+    assert (pair['first_timestamp'], pair['last_timestamp']) == (1001, 1010)
+    assert store_gnn.graph['hub']['mule1']['tx_hash'] == 'tx10'
+    assert store_gnn.graph.number_of_pairs() == 4
+
+    # Volume do cluster inteiro (inclui hub->mule2), mantido pelo índice union-find
+    clusters = store_gnn.analyze_address_clustering(['hub', 'mule0', 'mule1'])
+    assert clusters['clusters'][0]['total_volume'] == 1240.0
+    assert clusters['clusters'][0]['size'] == 4
+
+
+def test_time_window_eviction_compacts_graph():
+    store = TransactionGraphStore(chunk_size=16, retention_seconds=100, bucket_seconds=10)
+    transactions = _random_transactions(40, 300, seed=5)
+    for i, tx in enumerate(transactions):
+        store.add_transaction(tx.from_addr, tx.to_addr, tx.amount, i, tx.tx_hash,
+                              ['FLAG'] if i % 50 == 0 else None)
+
+    cutoff = (299 - 100) // 10 * 10
+    survivors = [(i, tx) for i, tx in enumerate(transactions) if i >= cutoff]
+    assert store.number_of_edges() == len(survivors)
+    assert store.timestamp.min() == cutoff
+    stats = store.get_stats()
+    assert stats['evictions'] > 0 and stats['evicted_edges'] == 300 - len(survivors)
+
+    reference = nx.MultiDiGraph()
+    for i, tx in survivors:
+        reference.add_edge(tx.from_addr, tx.to_addr, amount=tx.amount)
+    assert set(store.nodes) == set(reference.nodes())
+    for node in reference.nodes():
+        assert sorted(store.successors(node)) == sorted(set(reference.successors(node)))
+        node_id = store.node_id(node)
+        amounts = [d['amount'] for _, _, d in reference.out_edges(node, data=True)]
+        count, mean, _ = store.out_amount_stats(node_id)
+        assert count == len(amounts) and np.isclose(mean, np.mean(amounts) if amounts else 0.0)
+        for neighbor in set(reference.successors(node)):
+            pair = store.pair_stats(node, neighbor)
+            assert pair['count'] == reference.number_of_edges(node, neighbor)
+    assert store.nodes[survivors[0][1].from_addr]['transactions'][0] == survivors[0][1].tx_hash
+
+    # IDs liberados são reaproveitados por endereços novos
+    free_before = store.get_stats()['free_node_ids']
+    store.add_transaction('0xnew_a', '0xnew_b', 1.0, 300, 'new')
+    assert store.get_stats()['free_node_ids'] == max(0, free_before - 2)
+
+
+def test_edge_budget_keeps_newest():
+    store = TransactionGraphStore(max_edges=50)
+    for i in range(200):
+        edge = store.add_transaction(f'a{i % 7}', f'b{i % 11}', 1.0, i, f'tx{i}')
+        assert store.tx_hash(edge) == f'tx{i}'
+    assert 45 <= store.number_of_edges() <= 50
+    assert store.timestamp.min() == 200 - store.number_of_edges()
+
+
+def test_gnn_cache_invalidated_on_eviction():
+    gnn = _gnn()
+    gnn.graph.retention_seconds = 3600
+    gnn.add_transaction(TransactionEdge('a', 'b', 10.0, 0, 'tx0', []))
+    gnn.add_transaction(TransactionEdge('b', 'a', 10.0, 10, 'tx1', []))
+    assert gnn.comprehensive_analysis('a')['round_tripping']['detected_cycles']
+
+    gnn.add_transaction(TransactionEdge('c', 'd', 10.0, 10 * 86400, 'tx2', []))
+    gnn.graph.wait_for_compaction()
+    assert 'a' not in gnn.graph
+    assert gnn.get_stats()['pattern_cache']['full_invalidations'] == 1
+    assert gnn.get_stats()['nodes'] == 2
+
+
+def test_client_timestamps_cannot_move_the_retention_window():
+    now = int(time.time())
+    store = TransactionGraphStore(retention_seconds=30 * 86400)
+    for i in range(1000):
+        store.add_transaction(f'a{i % 50}', f'b{i % 70}', 1.0, now - i, f'tx{i}')
+
+    # Dez anos no futuro: recusada, o grafo e a janela continuam intactos
+    assert store.add_transaction('x', 'y', 1.0, now + 10 * 365 * 86400, 'future') is None
+    assert store.number_of_edges() == 1000 and 'x' not in store
+    assert store.add_transaction('a0', 'b0', 1.0, now, 'fresh') is not None
+
+    # Já fora da janela: recusada sem compactar (nem chamar listeners de evicção)
+    evictions = []
+    store.add_eviction_listener(lambda: evictions.append(1))
+    for i in range(20):
+        assert store.add_transaction('a1', 'b1', 1.0, 0, f'stale{i}') is None
+    stats = store.get_stats()
+    assert evictions == [] and stats['evictions'] == 0
+    assert stats['rejected_future'] == 1 and stats['rejected_stale'] == 20
+    assert store.number_of_edges() == 1001
+
+
+def test_gnn_skips_rejected_transactions():
+    gnn = _gnn()
+    now = int(time.time())
+    added = gnn.add_transactions([TransactionEdge('a', 'b', 1.0, now, 'ok', []),
+                                  TransactionEdge('c', 'd', 1.0, now + 86400, 'future', [])])
+    assert added == 1
+    assert 'c' not in gnn.graph and gnn.cluster_index.get_stats()['clusters'] == 1
+
+
+def test_invalid_fields_leave_columns_aligned():
+    store = TransactionGraphStore()
+    store.add_transaction('a', 'b', 1.0, 1, '0xaa')
+    for args in [('a', 'b', 2.0, 2, 123), ('a', 'b', 'abc', 2, '0xbb'), ('a', 7, 2.0, 2, '0xbb'),
+                 ('a', 'b', 2.0, 'later', '0xbb')]:
+        try:
+            store.add_transaction(*args)
+        except (TypeError, ValueError):
+            pass
+        else:
+            raise AssertionError(f'accepted {args!r}')
+    store.add_transaction('a', 'c', '3.5', '3', '0xcc')
+
+    assert store.number_of_edges() == 2 and len(store._tx_hashes) == 2 and store._tx_id.size == 2
+    assert store.nodes['a']['transactions'] == ['0xaa', '0xcc']
+    assert store['a']['c']['amount'] == 3.5
+
+
+def test_background_compaction_replays_edges_inserted_meanwhile():
+    lock = threading.RLock()
+    store = TransactionGraphStore(chunk_size=16, retention_seconds=100, bucket_seconds=10, max_clock_skew=None)
+    store.enable_background_compaction(lock)
+    reference = TransactionGraphStore(chunk_size=16, retention_seconds=100, bucket_seconds=10, max_clock_skew=None)
+    transactions = _random_transactions(40, 200, seed=9)
+    released = threading.Event()
+    computing = threading.Event()
+    build = graph_store._compacted_state
+
+    def slow_build(*args):
+        if threading.current_thread() is threading.main_thread():
+            return build(*args)  # compactação síncrona do grafo de referência
+        computing.set()
+        assert released.wait(5)
+        return build(*args)
+
+    def add(i, tx):
+        flags = ['FLAG'] if i % 7 == 0 else None
+        with lock:
+            store.add_transaction(tx.from_addr, tx.to_addr, tx.amount, i, tx.tx_hash, flags)
+        reference.add_transaction(tx.from_addr, tx.to_addr, tx.amount, i, tx.tx_hash, flags)
+
+    with patch.object(graph_store, '_compacted_state', slow_build):
+        for i, tx in enumerate(transactions[:111]):
+            add(i, tx)
+        # O cálculo roda fora da trava: as inserções seguem enquanto ele não termina
+        assert computing.wait(5)
+        for i, tx in enumerate(transactions[111:], start=111):
+            add(i, tx)
+        assert store.get_stats()['evictions'] == 0
+        released.set()
+        store.wait_for_compaction()
+    stats = store.get_stats()
+    assert stats['background_compactions'] == 1 and stats['evictions'] == 1
+
+    with lock:
+        store.evict()
+    reference.evict()
+    assert store.number_of_edges() == reference.number_of_edges()
+    for column in ('src', 'dst', 'amount', 'timestamp'):
+        assert np.array_equal(getattr(store, column), getattr(reference, column))
+    assert set(store.nodes) == set(reference.nodes)
+    for node in reference.nodes:
+        assert store.nodes[node]['transactions'] == reference.nodes[node]['transactions']
+        assert sorted(store.successors(node)) == sorted(reference.successors(node))
+        assert sorted(store.predecessors(node)) == sorted(reference.predecessors(node))
+        assert np.allclose(store.out_amount_stats(store.node_id(node)),
+                           reference.out_amount_stats(reference.node_id(node)))
+        for neighbor in reference.successors(node):
+            assert store.pair_stats(node, neighbor) == reference.pair_stats(node, neighbor)
+            assert store[node][neighbor]['risk_flags'] == reference[node][neighbor]['risk_flags']
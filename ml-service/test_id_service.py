@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from security.id_service import IDService, InvalidIdentifier
+
+
+def test_ids_sort_by_time_and_carry_worker_and_sequence():
+    service = IDService(b'k' * 32, worker_id=7)
+    first = service.new_id()
+    time.sleep(0.002)
+    second = service.new_id()
+    assert len(first) == 32 and first < second
+
+    fields = service.parse(second)
+    assert fields['worker_id'] == 7
+    assert fields['sequence'] == service.parse(first)['sequence'] + 1
+    assert abs(fields['timestamp_ms'] - time.time() * 1000) < 5000
+
+
+def test_ids_unique_across_threads_and_workers():
+    workers = [IDService(b'k' * 32, worker_id=worker) for worker in (1, 2)]
+    ids = []
+
+    def generate(service):
+        ids.extend(service.new_id() for _ in range(2000))
+
+    threads = [threading.Thread(target=generate, args=(service,)) for service in workers * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 8000
+
+
+def test_tampered_or_foreign_ids_are_rejected():
+    service = IDService(b'k' * 32, worker_id=1)
+    identifier = service.new_id()
+    tampered = identifier[:10] + ('0' if identifier[10] != '0' else '1') + identifier[11:]
+    assert service.verify(identifier)
+    assert not service.verify(tampered)
+    assert not IDService(b'x' * 32).verify(identifier)
+    with pytest.raises(InvalidIdentifier):
+        service.parse('not-an-id')
+
+
+def test_replicas_without_worker_id_do_not_collide(monkeypatch):
+    monkeypatch.delenv('AML_WORKER_ID', raising=False)
+    # Réplicas em contêineres: mesmo PID, mesma chave, mesmos milissegundos
+    replicas = [IDService(b'k' * 32) for _ in range(2)]
+    ids = [[service.new_id() for _ in range(2000)] for service in replicas]
+    assert not set(ids[0]) & set(ids[1])
+    fields = [service.parse(batch[0]) for service, batch in zip(replicas, ids)]
+    assert (fields[0]['worker_id'], fields[0]['sequence']) != (fields[1]['worker_id'], fields[1]['sequence'])
+
+    # Após um fork, o filho sorteia worker e sequência de novo
+    service = replicas[0]
+    before = service.parse(service.new_id())
+    service._pid = None
+    after = service.parse(service.new_id())
+    assert (after['worker_id'], after['sequence']) != (before['worker_id'], before['sequence'] + 1)
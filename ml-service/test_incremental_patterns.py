@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+
+
+def _gnn():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        return GraphNeuralNetwork('test')
+
+
+def _add(gnn, src, dst, amount, timestamp):
+    gnn.add_transaction(TransactionEdge(src, dst, amount, timestamp, f'{src}-{dst}-{timestamp}', []))
+
+
+def test_running_out_stats():
+    gnn = _gnn()
+    amounts = [10.0, 12.5, 7.25, 30.0, 12.5]
+    for i, amount in enumerate(amounts):
+        _add(gnn, 'a', f'b{i % 2}', amount, i)
+
+    count, mean, variance = gnn.graph.out_amount_stats(gnn.graph.node_id('a'))
+    assert count == 5
+    assert np.isclose(mean, np.mean(amounts)) and np.isclose(variance, np.var(amounts))
+
+
+def test_cached_results_match_full_recompute():
+    cached, fresh = _gnn(), _gnn()
+    edges = [('a', 'b', 100.0), ('b', 'c', 95.0), ('c', 'd', 90.0), ('d', 'a', 88.0),
+             ('x', 'y', 10.0), ('c', 'a', 90.0), ('e', 'a', 5.0), ('y', 'x', 10.0)]
+    addresses = ['a', 'b', 'c', 'd', 'x', 'y', 'e']
+    for step, (src, dst, amount) in enumerate(edges):
+        _add(cached, src, dst, amount, 1000 + step)
+        _add(fresh, src, dst, amount, 1000 + step)
+        fresh.pattern_cache.invalidate_all()
+        for address in addresses:
+            if address in fresh.graph:
+                assert cached.comprehensive_analysis(address) == fresh.comprehensive_analysis(address)
+
+    assert cached.pattern_cache.stats['hits'] > 0
+
+
+def test_unrelated_edges_keep_cache():
+    gnn = _gnn()
+    _add(gnn, 'a', 'b', 100.0, 1)
+    _add(gnn, 'b', 'a', 99.0, 2)
+    gnn.comprehensive_analysis('a')
+    invalidated = gnn.pattern_cache.stats['invalidated']
+
+    # Aresta em outro componente: 'a' não alcança 'x', o cache de 'a' continua válido
+    _add(gnn, 'x', 'y', 5.0, 3)
+    gnn.comprehensive_analysis('a')
+    assert gnn.pattern_cache.stats['invalidated'] == invalidated
+    assert gnn.pattern_cache.stats['hits'] == 2
+
+    # Aresta saindo de um nó alcançável por 'a' suja 'a'
+    _add(gnn, 'b', 'z', 1.0, 4)
+    gnn.comprehensive_analysis('a')
+    assert gnn.pattern_cache.stats['invalidated'] > invalidated
+
+
+def test_insert_does_not_walk_hub_predecessors():
+    gnn = _gnn()
+    for i in range(2000):
+        _add(gnn, f's{i}', 'hub', 1.0, i)
+    for i in range(2000):
+        gnn.comprehensive_analysis(f's{i}')
+
+    # Inserção a partir do hub: O(1), nada é percorrido nem descartado até a leitura
+    calls = []
+    original = gnn.graph.predecessor_ids
+    gnn.graph.predecessor_ids = lambda node: calls.append(node) or original(node)
+    _add(gnn, 'hub', 'out', 1.0, 5000)
+    assert calls == [] and gnn.pattern_cache.get_stats()['cached_path_patterns'] == 2000
+
+    invalidated = gnn.pattern_cache.stats['invalidated']
+    gnn.comprehensive_analysis('s7')
+    # Só o resultado de caminhos: o smurfing de 's7' depende apenas das saídas dele
+    assert gnn.pattern_cache.stats['invalidated'] == invalidated + 1
+
+
+def test_wide_frontier_is_not_cached():
+    gnn = _gnn()
+    gnn.pattern_cache.max_frontier = 10
+    for i in range(20):
+        _add(gnn, 'a', f'b{i}', 1.0, i)
+    gnn.comprehensive_analysis('a')
+    stats = gnn.pattern_cache.get_stats()
+    assert stats['cached_path_patterns'] == 0 and stats['uncached_wide'] == 1
+    assert stats['cached_smurfing'] == 1
@@ -0,0 +1,60 @@
+import random
+from indicators.matcher import IndicatorMatcher
+from risk_analyzer import RiskAnalyzer
+
+
+def test_matches_same_as_substring_scan():
+    rng = random.Random(0)
+    alphabet = '0123456789abcdef'
+    mixers = {''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 6))) for _ in range(300)}
+    bridges = {''.join(rng.choice(alphabet) for _ in range(rng.randint(3, 8))) for _ in range(300)}
+
+    matcher = IndicatorMatcher()
+    matcher.add_substrings('mixer', mixers)
+    matcher.add_substrings('bridge', bridges)
+
+    for _ in range(500):
+        address = '0x' + ''.join(rng.choice(alphabet) for _ in range(40))
+        expected = set()
+        if any(pattern in address for pattern in mixers):
+            expected.add('mixer')
+        if any(pattern in address for pattern in bridges):
+            expected.add('bridge')
+        assert matcher.match(address) == expected
+
+
+def test_overlapping_patterns_and_case():
+    matcher = IndicatorMatcher()
+    matcher.add_substrings('mixer', ['tornado', 'nado'])
+    matcher.add_substrings('bridge', ['ado'])
+
+    assert matcher.match('0xTORNADOcash') == {'mixer', 'bridge'}
+    assert matcher.match('0xnad') == set()
+    assert not matcher.matches('', 'mixer')
+
+
+def test_exact_addresses_and_recompile():
+    matcher = IndicatorMatcher()
+    matcher.add_addresses('sanctioned', ['0x12D66f87A04A9E220743712cE6d9bB1B5616B8Fc'])
+    assert matcher.matches('0x12d66f87a04a9e220743712ce6d9bb1b5616b8fc', 'sanctioned')
+    assert not matcher.matches('0x12d66f87a04a9e220743712ce6d9bb1b5616b8fc00', 'sanctioned')
+
+    matcher.add_substrings('mixer', ['66f87'])
+    assert matcher.match('0x12d66f87a04a9e220743712ce6d9bb1b5616b8fc') == {'sanctioned', 'mixer'}
+
+
+def test_load_directory(tmp_path):
+    (tmp_path / 'mixer.txt').write_text('# mixers\nblender\n\nsinbad\n')
+    (tmp_path / 'mixer.addresses.txt').write_text('0xabc123\n')
+    matcher = IndicatorMatcher()
+
+    assert matcher.load_directory(str(tmp_path)) == 3
+    assert matcher.matches('0xBLENDERio', 'mixer')
+    assert matcher.matches('0xabc123', 'mixer')
+    assert matcher.exact_addresses('mixer') == ['0xabc123']
+
+
+def test_risk_analyzer_uses_shared_matcher():
+    analyzer = RiskAnalyzer()
+    assert analyzer._is_mixer_address('0x1MIXER123')
+    assert not analyzer._is_mixer_address('0x1234567890')
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from advanced_ml.graph_neural_network import GraphNeuralNetwork
+from advanced_ml.ingestion import IngestionError, TransactionIngestor, main, transaction_from_dict
+
+
+def _gnn():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        return GraphNeuralNetwork('test')
+
+
+def _line(i, src=None, dst=None):
+    return json.dumps({'fromAddress': src or f'0x{i % 7:02x}', 'toAddress': dst or f'0x{(i + 1) % 7:02x}',
+                       'amount': 10.0 + i, 'timestamp': 1700000000 + i, 'hash': f'tx{i}'}).encode() + b'\n'
+
+
+def test_file_ingestion_batches_and_skips_bad_lines(tmp_path):
+    path = tmp_path / 'transactions.ndjson'
+    path.write_bytes(b''.join(_line(i) for i in range(25)) + b'not json\n' + _line(25).rstrip())
+    gnn = _gnn()
+    ingestor = TransactionIngestor(gnn, batch_size=10, max_delay=1.0)
+
+    async def scenario():
+        batcher = asyncio.create_task(ingestor.run())
+        await ingestor.ingest_file(str(path), chunk_size=64)
+        ingestor.stop()
+        await batcher
+
+    asyncio.run(scenario())
+    stats = ingestor.get_stats()
+    assert gnn.graph.number_of_edges() == 26
+    assert stats['ingested'] == 26 and stats['parse_errors'] == 1
+    assert stats['batches'] == 3
+    assert stats['latest_timestamp'] == 1700000025
+    assert stats['queue_depth'] == 0
+
+
+def test_partial_batch_flushed_after_max_delay():
+    gnn = _gnn()
+    ingestor = TransactionIngestor(gnn, batch_size=10000, max_delay=0.02)
+
+    async def scenario():
+        batcher = asyncio.create_task(ingestor.run())
+        for i in range(3):
+            await ingestor.put_line(_line(i))
+        await asyncio.sleep(0.2)
+        assert gnn.graph.number_of_edges() == 3
+        ingestor.stop()
+        await batcher
+
+    asyncio.run(scenario())
+    assert ingestor.stats['batches'] == 1
+
+
+def test_unix_socket_backpressure(tmp_path):
+    gnn = _gnn()
+    insert = gnn.add_transactions
+
+    def slow_insert(edges):
+        time.sleep(0.01)
+        return insert(edges)
+
+    gnn.add_transactions = slow_insert
+    ingestor = TransactionIngestor(gnn, batch_size=8, max_delay=0.001, max_pending=16)
+    socket_path = str(tmp_path / 'ingest.sock')
+
+    async def scenario():
+        batcher = asyncio.create_task(ingestor.run())
+        await ingestor.serve_unix(socket_path)
+        _, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(b''.join(_line(i) for i in range(200)))
+        await writer.drain()
+        writer.close()
+        while ingestor.stats['ingested'] < 200:
+            await asyncio.sleep(0.01)
+        ingestor.stop()
+        await batcher
+
+    asyncio.run(asyncio.wait_for(scenario(), 10))
+    assert gnn.graph.number_of_edges() == 200
+    assert ingestor.stats['backpressure_waits'] > 0
+    assert ingestor.stats['last_batch_size'] <= 8
+
+
+def test_transaction_fields_are_coerced_or_rejected():
+    edge = transaction_from_dict({'amount': '2.5', 'timestamp': '1700000000', 'flags': None}, default_from='0xwallet')
+    assert (edge.from_addr, edge.to_addr, edge.amount, edge.timestamp, edge.risk_flags) == \
+        ('0xwallet', '', 2.5, 1700000000, [])
+    assert isinstance(transaction_from_dict({'amount': 1, 'timestamp': 1700000000.9}, '0xw').timestamp, int)
+
+    for bad in ({'amount': 1, 'timestamp': 'yesterday'}, {'amount': 'ten'}, {'amount': 1, 'timestamp': float('inf')},
+                {'amount': 1, 'flags': 5}, 'not an object'):
+        with pytest.raises(IngestionError):
+            transaction_from_dict(bad, default_from='0xwallet')
+    # Sem carteira de referência os endereços e o valor são obrigatórios
+    with pytest.raises(IngestionError):
+        transaction_from_dict({'toAddress': '0xb', 'amount': 1})
+
+
+def test_cli_refuses_a_graph_the_api_cannot_see(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv('AML_GRAPH_SHARD_SOCKETS', raising=False)
+    monkeypatch.delenv('AML_GRAPH_SNAPSHOT_DIR', raising=False)
+    path = tmp_path / 'transactions.ndjson'
+    path.write_bytes(_line(0))
+    with pytest.raises(SystemExit):
+        main(['--file', str(path)])
+    assert 'AML_GRAPH_SHARD_SOCKETS' in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        main(['--file', str(path), '--standalone'])
+    assert 'AML_GRAPH_SNAPSHOT_DIR' in capsys.readouterr().err
@@ -0,0 +1,51 @@
+import os
+import time
+
+from security.integrity_monitor import IntegrityMonitor
+
+
+class _Protection:
+    def __init__(self, files):
+        self.CRITICAL_FILES = files
+        self.calls = 0
+        self.intact = True
+
+    def runtime_protection_check(self):
+        self.calls += 1
+        return self.intact
+
+
+def test_requests_read_cached_verdict(tmp_path):
+    protection = _Protection([str(tmp_path / 'app.py')])
+    monitor = IntegrityMonitor(protection, interval=3600, watch_interval=3600)
+    monitor.start()
+    for _ in range(1000):
+        assert monitor.is_intact()
+    assert protection.calls == 1
+    monitor.stop()
+
+
+def test_file_change_triggers_check_and_stale_verdict_is_refreshed(tmp_path):
+    critical = tmp_path / 'app.py'
+    critical.write_text('original')
+    protection = _Protection([str(critical)])
+    monitor = IntegrityMonitor(protection, interval=3600, watch_interval=0.01)
+    monitor.start()
+    assert monitor.is_intact()
+
+    protection.intact = False
+    critical.write_text('tampered!')
+    deadline = time.time() + 5
+    while monitor.is_intact() and time.time() < deadline:
+        time.sleep(0.01)
+    assert not monitor.is_intact()
+    assert monitor.get_stats()['file_triggered_checks'] >= 1
+    monitor.stop()
+
+    # Sem a thread (ex.: após fork), um veredito velho é refeito na leitura
+    stale = IntegrityMonitor(protection, interval=3600, max_age=0)
+    protection.intact = True
+    stale.check_now()
+    calls = protection.calls
+    assert stale.is_intact()
+    assert protection.calls == calls + 1
@@ -0,0 +1,88 @@
+import random
+import time
+from unittest.mock import patch
+
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_store import TransactionGraphStore
+from advanced_ml.layering import find_layering_chains
+
+
+def _store(edges):
+    store = TransactionGraphStore(chunk_size=8)
+    for i, (src, dst, amount, timestamp) in enumerate(edges):
+        store.add_transaction(src, dst, amount, timestamp, f'tx{i}')
+    return store
+
+
+def _brute_force(edges, start, max_depth, window):
+    """Enumeração recursiva de todos os caminhos (referência)"""
+    chains = []
+
+    def walk(node, path, prev_amount, arrived_at, deadline):
+        if len(path) - 1 >= max_depth:
+            return
+        for src, dst, amount, ts in edges:
+            if src != node or (arrived_at is not None and not arrived_at <= ts <= deadline):
+                continue
+            hop_deadline = ts + window if deadline is None else deadline
+            expected = prev_amount * 0.95
+            if len(path) + 1 >= 3 and prev_amount > 0 and abs(amount - expected) / expected < 0.1:
+                chains.append(path + [dst])
+            walk(dst, path + [dst], amount, ts, hop_deadline)
+
+    walk(start, [start], 0.0, None, None)
+    return chains
+
+
+def test_matches_brute_force_enumeration():
+    rng = random.Random(7)
+    edges = [(f'n{rng.randrange(6)}', f'n{rng.randrange(6)}', rng.choice([100.0, 95.0, 90.0, 86.0, 40.0]),
+              rng.randrange(0, 100)) for _ in range(30)]
+    store = _store(edges)
+
+    for start in {src for src, _, _, _ in edges}:
+        expected = _brute_force(edges, start, max_depth=4, window=60)
+        found = find_layering_chains(store, start, max_depth=4, max_time_window=60,
+                                     max_paths=10 ** 6, max_chains=10 ** 6)
+        assert found['chain_count'] == len(expected)
+        assert sorted(tuple(store.address(n) for n in c) for c, _ in found['chains']) == \
+            sorted(tuple(c) for c in expected)
+
+
+def test_hops_must_be_time_ordered_within_window():
+    store = _store([('a', 'b', 100.0, 10), ('b', 'c', 95.0, 20), ('c', 'd', 90.0, 30),
+                    ('c', 'e', 90.0, 15), ('c', 'f', 90.0, 5000)])
+    found = find_layering_chains(store, 'a', max_time_window=3600)
+    assert [tuple(store.address(n) for n in c) for c, _ in found['chains']] == \
+        [('a', 'b', 'c', 'd'), ('a', 'b', 'c')]
+
+
+def test_dense_graph_is_memoized_and_capped():
+    # Camadas completas 10x10: 10^5 caminhos distintos até a profundidade 5
+    layers = [[f'l{depth}_{i}' for i in range(10)] for depth in range(6)]
+    edges = [('src', node, 100.0, 0) for node in layers[0]]
+    for depth in range(5):
+        edges += [(u, v, 100.0 * 0.95 ** (depth + 1), depth + 1) for u in layers[depth] for v in layers[depth + 1]]
+    store = _store(edges)
+
+    started = time.time()
+    found = find_layering_chains(store, 'src', max_depth=5, max_time_window=3600)
+    assert found['chain_count'] == 10 ** 2 + 10 ** 3 + 10 ** 4 + 10 ** 5
+    assert found['explored_paths'] <= 10 + 100 * 4
+    assert len(found['chains'][0][0]) == 6
+    assert time.time() - started < 2
+
+    capped = find_layering_chains(store, 'src', max_depth=5, max_time_window=3600, max_paths=50)
+    assert capped['truncated'] and capped['explored_paths'] == 50
+
+
+def test_gnn_layering_report():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    for i, (src, dst, amount) in enumerate([('a', 'b', 100.0), ('b', 'c', 95.0), ('c', 'd', 90.0)]):
+        gnn.add_transaction(TransactionEdge(src, dst, amount, 1000 + i, f'tx{i}', []))
+
+    result = gnn.detect_layering_pattern('a')
+    assert result['chain_count'] == 2 and not result['truncated']
+    assert result['detected_chains'][0]['path'] == ['a', 'b', 'c', 'd']
+    assert result['max_risk_score'] == 60
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from ml_engine.features import FEATURE_SCHEMA
+from ml_engine.forest import CompiledForest
+from ml_engine.registry import ModelRegistry, ModelRegistryError
+
+
+def _trained_engine(seed):
+    rng = np.random.default_rng(seed)
+    X_train = rng.random((300, 5))
+    y_train = (X_train[:, 0] > 0.5).astype(int)
+    model = RandomForestClassifier(n_estimators=10, random_state=seed).fit(X_train, y_train)
+    return model, CompiledForest.from_sklearn(model)
+
+
+def test_publish_and_load_memory_mapped(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model, engine = _trained_engine(seed=1)
+
+    manifest = registry.publish(engine, FEATURE_SCHEMA, metadata={'source': 'test'})
+    assert registry.current_version() == manifest['version']
+
+    loaded, loaded_manifest = registry.load(verify=True)
+    assert loaded_manifest['feature_schema'] == FEATURE_SCHEMA
+    assert loaded_manifest['sha256'] == manifest['sha256']
+    assert isinstance(loaded.arrays['value'].base, np.memmap)
+
+    X = np.random.default_rng(2).random((50, 5))
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_activate_switches_versions(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    first = registry.publish(_trained_engine(seed=1)[1], FEATURE_SCHEMA)
+    second = registry.publish(_trained_engine(seed=3)[1], FEATURE_SCHEMA, activate=False)
+
+    assert registry.current_version() == first['version']
+    registry.activate(second['version'])
+    assert registry.load()[1]['version'] == second['version']
+    assert registry.list_versions() == sorted([first['version'], second['version']])
+
+
+def test_verify_detects_tampered_arrays(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    manifest = registry.publish(_trained_engine(seed=1)[1], FEATURE_SCHEMA)
+
+    path = os.path.join(str(tmp_path), manifest['version'], 'threshold.npy')
+    threshold = np.load(path)
+    threshold[0] += 1.0
+    np.save(path, threshold)
+
+    with pytest.raises(ModelRegistryError):
+        registry.load(verify=True)
+
+
+def test_rejects_mismatched_feature_schema(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    with pytest.raises(ModelRegistryError):
+        registry.publish(_trained_engine(seed=1)[1], FEATURE_SCHEMA[:3])
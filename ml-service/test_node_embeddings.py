@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from advanced_ml.embeddings import NODE_FEATURES, compute_embeddings
+from advanced_ml.graph_neural_network import GraphNeuralNetwork, TransactionEdge
+from advanced_ml.graph_store import TransactionGraphStore
+
+
+def test_embeddings_aggregate_neighbor_features():
+    # a -> b -> c, a -> c; c é mixer
+    src = np.array([0, 1, 0], dtype=np.int32)
+    dst = np.array([1, 2, 2], dtype=np.int32)
+    amount = np.array([10.0, 10.0, 30.0])
+    timestamp = np.array([100, 200, 400], dtype=np.int64)
+    mixer = np.array([0, 0, 1], dtype=np.int8)
+
+    embeddings = compute_embeddings(src, dst, amount, timestamp, mixer, 3, hops=2, batch_size=2)
+    width = len(NODE_FEATURES)
+    mixer_column = NODE_FEATURES.index('mixer')
+    assert embeddings.shape == (3, width * 5)
+    # Metade das transferências de a vai para o mixer; todas as de b
+    assert embeddings[0, width + mixer_column] == 0.5
+    assert embeddings[1, width + mixer_column] == 1.0
+    # Dois saltos: a -> b -> c
+    assert embeddings[0, 2 * width + mixer_column] == 0.5
+    # Intervalo médio entre os envios de a: 300s
+    assert np.isclose(embeddings[0, NODE_FEATURES.index('out_interval')], np.log1p(300))
+    # Origens de c, em média
+    assert np.isclose(embeddings[2, 3 * width + NODE_FEATURES.index('out_degree')],
+                      (np.log1p(2) + np.log1p(1)) / 2)
+
+
+def test_gnn_neighborhood_risk_from_cached_embeddings():
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    for i in range(5):
+        gnn.add_transaction(TransactionEdge(f'0xuser{i}', '0xtornado_pool', 10.0, 1000 + i, f'tx{i}', []))
+    gnn.add_transaction(TransactionEdge('0xclean', '0xother', 10.0, 2000, 'tx-clean', []))
+
+    # Antes do primeiro cálculo o componente vale 0
+    assert gnn.comprehensive_analysis('0xuser0')['neighborhood_risk_score'] == 0
+
+    assert gnn.node_embeddings.refresh()
+    assert not gnn.node_embeddings.refresh()
+    exposed = gnn.comprehensive_analysis('0xuser0')
+    assert exposed['neighborhood_risk_score'] >= 60
+    assert exposed['overall_risk_score'] >= exposed['neighborhood_risk_score']
+    assert 'MIXER_NEIGHBORHOOD' in exposed['risk_factors']
+    assert gnn.comprehensive_analysis('0xclean')['neighborhood_risk_score'] == 0
+    assert gnn.get_stats()['embeddings']['embedded_nodes'] == gnn.graph.node_capacity
+
+
+def test_eviction_discards_embeddings():
+    store = TransactionGraphStore(chunk_size=4, max_edges=20)
+    with patch.object(GraphNeuralNetwork, '_validate_license'):
+        gnn = GraphNeuralNetwork('test')
+    gnn._attach_graph(store)
+    for i in range(10):
+        gnn.add_transaction(TransactionEdge(f'0x{i}', '0xmixer', 1.0, 1000 + i, f'tx{i}', []))
+    gnn.node_embeddings.refresh()
+    assert gnn.node_embeddings.risk is not None
+
+    for i in range(20):
+        gnn.add_transaction(TransactionEdge(f'0xnew{i}', f'0xnew{i + 1}', 1.0, 2000 + i, f'txn{i}', []))
+    store.wait_for_compaction()
+    assert store.get_stats()['evictions'] > 0
+    assert gnn.node_embeddings.risk is None
+    assert gnn.node_embeddings.refresh()
@@ -0,0 +1,113 @@
+import threading
+
+import fakeredis
+import pytest
+import redis
+
+from security.rate_limiter import RateLimiter, RateLimitResult
+from security.secure_api import SecureAPIManager
+
+
+def _lua_redis():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    try:
+        client.eval('return 1', 0)
+    except redis.ResponseError:
+        pytest.skip('fakeredis without Lua support (install lupa)')
+    return client
+
+
+class CountingLimiter(RateLimiter):
+    """Conta as idas ao Redis"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquires = []
+
+    def _acquire(self, key, limit, window, lease, refund):
+        self.acquires.append((lease, refund))
+        return super()._acquire(key, limit, window, lease, refund)
+
+
+def test_gcra_script_enforces_limit_atomically_across_threads():
+    client = _lua_redis()
+    limiter = RateLimiter(client, 'rl', algorithm='gcra')
+    results = []
+
+    def worker():
+        for _ in range(10):
+            results.append(limiter.hit('user', 25, 60))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(result.allowed for result in results) == 25
+    denied = next(result for result in results if not result.allowed)
+    assert denied.remaining == 0 and 0 < denied.retry_after <= 60 / 25 + 0.01
+    assert limiter.get_stats()['scripting'] is True
+
+
+def test_gcra_script_reports_quota_and_refunds_unused_lease():
+    client = _lua_redis()
+    limiter = CountingLimiter(client, 'rl', algorithm='gcra', local_lease=10, local_ttl=0.0)
+    first = limiter.hit('user', 200, 100)
+    assert first.allowed and first.remaining == 199
+    assert 0 < first.reset_after <= 100 * 10 / 200 + 0.01
+    # Lote vencido (ttl 0): os 9 tokens não usados voltam na próxima ida
+    second = limiter.hit('user', 200, 100)
+    assert limiter.acquires == [(10, 0), (10, 9)]
+    assert second.remaining == 198
+
+
+def test_sliding_log_script_locks_and_resets():
+    client = _lua_redis()
+    limiter = RateLimiter(client, 'failed', algorithm='sliding_log')
+    assert all(limiter.hit('alice', 3, 60).allowed for _ in range(3))
+    blocked = limiter.hit('alice', 3, 60)
+    assert not blocked.allowed and 59 <= blocked.retry_after <= 60
+    assert client.zcard('failed:alice') == 3
+    limiter.reset('alice')
+    assert limiter.hit('alice', 3, 60).allowed
+
+
+def test_local_bucket_absorbs_burst_and_caches_denial():
+    limiter = CountingLimiter(fakeredis.FakeRedis(decode_responses=True), 'rl', local_lease=10)
+    grants = iter([(5, 95, 2500, 0), (0, 0, 3000, 800)])
+    limiter._acquire = lambda *args: (limiter.acquires.append(args[3:]), next(grants))[1]
+
+    served = [limiter.hit('user', 100, 60) for _ in range(5)]
+    assert all(result.allowed for result in served)
+    assert [result.remaining for result in served] == [99, 98, 97, 96, 95]
+    assert limiter.acquires == [(5, 0)]  # lote limitado a 1/20 do limite
+
+    denied = [limiter.hit('user', 100, 60) for _ in range(3)]
+    assert not any(result.allowed for result in denied)
+    assert len(limiter.acquires) == 2
+    assert denied[-1].headers()['Retry-After'] == '1'
+    stats = limiter.get_stats()
+    assert stats['local_hits'] == 4 and stats['local_denials'] == 2 and stats['redis_calls'] == 2
+
+
+def test_pipelined_fallback_without_lua():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    limiter = RateLimiter(client, 'rl', algorithm='gcra', local_lease=10)
+    limiter.scripting = False  # o que acontece quando o servidor recusa EVALSHA
+    assert [limiter.hit('user', 3, 60).allowed for _ in range(5)] == [True, True, True, False, False]
+    assert client.zcard('rl:user') == 3
+    headers = limiter.hit('user', 3, 60).headers()
+    assert headers['X-RateLimit-Remaining'] == '0' and 'Retry-After' in headers
+
+
+def test_failed_login_lockout():
+    manager = SecureAPIManager(redis_client=fakeredis.FakeRedis(decode_responses=True), jwt_secret='s')
+    assert all(manager.track_failed_login('bob') for _ in range(manager.failed_login_threshold))
+    assert manager.track_failed_login('bob') is False
+    manager.reset_failed_login('bob')
+    assert manager.track_failed_login('bob') is True
+
+
+def test_headers_round_up_seconds():
+    headers = RateLimitResult(True, 10, 4, 2.2).headers()
+    assert headers == {'X-RateLimit-Limit': '10', 'X-RateLimit-Remaining': '4', 'X-RateLimit-Reset': '3'}
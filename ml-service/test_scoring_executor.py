@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from scoring_executor import ScoringExecutor, QueueFullError
+
+
+def _transactions(count):
+    return [{'amount': 10.0 + i % 3, 'hash': f'tx{i}'} for i in range(count)]
+
+
+def test_large_wallet_runs_in_pool_and_matches_inline():
+    executor = ScoringExecutor(max_workers=1, max_pending=2, inline_max_transactions=5)
+    transactions = _transactions(60)
+
+    async def run():
+        return await executor.analyze_wallet('0x1234567890', 'ETHEREUM', transactions)
+
+    try:
+        result = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    expected = executor._inline_analyzer.analyze_wallet('0x1234567890', 'ETHEREUM', transactions)
+    assert result == expected
+    assert executor.stats['completed'] == 1
+    assert executor.queue_depth == 0
+
+
+def test_rejects_when_queue_is_full():
+    executor = ScoringExecutor(max_workers=1, max_pending=1, inline_max_transactions=0)
+
+    async def run():
+        first = asyncio.ensure_future(executor.analyze_wallet('0x1', 'ETHEREUM', _transactions(10)))
+        await asyncio.sleep(0)
+        assert executor.queue_depth == 1
+        with pytest.raises(QueueFullError):
+            await executor.analyze_wallet('0x2', 'ETHEREUM', _transactions(10))
+        await first
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert executor.stats['rejected'] == 1
+    assert 'ml_scoring_queue_depth 0' in executor.render_prometheus()
+
+
+def test_small_wallet_stays_inline():
+    executor = ScoringExecutor(max_workers=1, inline_max_transactions=50)
+    asyncio.run(executor.analyze_wallet('0x1', 'ETHEREUM', _transactions(3)))
+    assert executor.stats['inline'] == 1
+    assert executor._pool is None
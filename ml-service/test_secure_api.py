@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import fakeredis
+import jwt
+import pytest
+from flask import Flask, jsonify
+
+from security import secure_api
+from security.secure_api import SecureAPIManager, get_security_context, rate_limit, require_auth, validate_input
+
+
+@pytest.fixture
+def context(monkeypatch):
+    manager = SecureAPIManager(redis_client=fakeredis.FakeRedis(decode_responses=True), jwt_secret='test-secret')
+    monkeypatch.setattr(secure_api, '_security_context', manager)
+    return manager
+
+
+def _app():
+    app = Flask(__name__)
+
+    @app.route('/protected', methods=['POST'])
+    @require_auth(['analyze'])
+    @rate_limit(limit=100, window=60)
+    @validate_input()
+    def protected():
+        return jsonify({'ok': True})
+
+    return app
+
+
+def test_decorators_share_one_context(context):
+    token = context.generate_secure_token('analyst', ['analyze'])
+    client = _app().test_client()
+    # Nenhum decorador cria um gerenciador (nem conexão Redis) por requisição
+    with patch.object(SecureAPIManager, '__init__', side_effect=AssertionError('new manager per request')):
+        for remaining in (99, 98, 97):
+            response = client.post('/protected', json={'address': '0xabc'},
+                                   headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 200
+            assert response.headers['X-RateLimit-Limit'] == '100'
+            assert response.headers['X-RateLimit-Remaining'] == str(remaining)
+        assert client.post('/protected', json={'address': '<script>x</script>'},
+                           headers={'Authorization': f'Bearer {token}'}).status_code == 400
+    assert context.request_limiter.get_stats()['checks'] == 4
+
+
+def test_default_context_uses_shared_pool_and_stable_secret(monkeypatch):
+    monkeypatch.setattr(secure_api, '_security_context', None)
+    monkeypatch.setattr(secure_api, '_redis_pool', None)
+    monkeypatch.setattr(secure_api, '_jwt_secret', None)
+    monkeypatch.setenv('REDIS_URL', 'redis://localhost:6390/2')
+    monkeypatch.setenv('AML_JWT_SECRET', 'from-env')
+
+    context = get_security_context()
+    assert get_security_context() is context
+    other = SecureAPIManager()
+    assert other.redis_client.connection_pool is context.redis_client.connection_pool
+    assert context.redis_client.connection_pool.connection_kwargs['db'] == 2
+    assert other.jwt_secret == context.jwt_secret == 'from-env'
+    # Tokens emitidos por um gerenciador valem em qualquer outro do processo
+    assert jwt.decode(context.generate_secure_token('u', []), other.jwt_secret, algorithms=['HS256'])['user_id'] == 'u'
@@ -0,0 +1,87 @@
+"""
+Treinamento offline do modelo AML
+Treina (ou importa um pickle legado), compila a floresta e publica uma nova
+versão no registro de modelos. O serviço apenas carrega a versão ativa.
+
+Uso:
+    python train_model.py                          # treina com dados sintéticos
+    python train_model.py --from-pickle aml_model.pkl
+    python train_model.py --list
+    python train_model.py --activate <versão>
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from ml_engine.features import FEATURE_SCHEMA
+from ml_engine.forest import CompiledForest
+from ml_engine.registry import ModelRegistry, ModelRegistryError
+
+
+def train_synthetic_model(n_samples: int, n_estimators: int, seed: int) -> RandomForestClassifier:
+    """Treina o modelo simples com dados sintéticos (substituir por dados reais)"""
+    rng = np.random.RandomState(seed)
+    X_train = rng.rand(n_samples, len(FEATURE_SCHEMA))
+    y_train = (X_train[:, 0] * 100 > 50).astype(int)  # Regra simples
+
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=seed)
+    model.fit(X_train, y_train)
+    return model
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Train and publish the AML risk model')
+    parser.add_argument('--registry', help='Model registry directory (default: $AML_MODEL_DIR or ./models)')
+    parser.add_argument('--from-pickle', help='Publish an existing joblib/pickle model instead of training')
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--estimators', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-activate', action='store_true', help='Publish without switching CURRENT')
+    parser.add_argument('--list', action='store_true', help='List published versions')
+    parser.add_argument('--activate', metavar='VERSION', help='Switch the active version')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.registry)
+
+    try:
+        if args.list:
+            current = registry.current_version()
+            for version in registry.list_versions():
+                print(f"{'*' if version == current else ' '} {version}")
+            return 0
+
+        if args.activate:
+            registry.activate(args.activate)
+            print(f"Active model: {args.activate}")
+            return 0
+
+        if args.from_pickle:
+            model = joblib.load(args.from_pickle)
+            metadata = {'source': args.from_pickle}
+        else:
+            model = train_synthetic_model(args.samples, args.estimators, args.seed)
+            metadata = {'source': 'synthetic', 'samples': args.samples, 'seed': args.seed}
+
+        metadata['n_estimators'] = len(getattr(model, 'estimators_', [model]))
+        manifest = registry.publish(
+            CompiledForest.from_sklearn(model),
+            FEATURE_SCHEMA,
+            trained_at=datetime.now(timezone.utc),
+            metadata=metadata,
+            activate=not args.no_activate
+        )
+    except ModelRegistryError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Published model {manifest['version']} (sha256 {manifest['sha256'][:16]}...) to {registry.root}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())